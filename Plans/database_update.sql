@@ -294,3 +294,25 @@ CREATE INDEX idx_service_items_category ON service_items(category);
 -- 服务项目价格表索引
 CREATE INDEX idx_service_item_prices_item ON service_item_prices(service_item_id);
 CREATE INDEX idx_service_item_prices_date ON service_item_prices(effective_date, expire_date);
+
+-- 11. 菜单缓存版本号：菜单或其菜品变化时递增，用于多进程间的缓存失效
+ALTER TABLE menus
+ADD COLUMN version INT NOT NULL DEFAULT 1 COMMENT '缓存版本号';
+
+-- 12. 食材和菜品图片：保存按内容哈希存储的图片，经 /api/media/<hash> 访问
+ALTER TABLE ingredients
+ADD COLUMN image_hash VARCHAR(64) COMMENT '图片内容哈希';
+
+ALTER TABLE dishes
+ADD COLUMN image_hash VARCHAR(64) COMMENT '图片内容哈希';
+
+-- 13. 采购订单备注：自动补货生成的采购单记录来源
+ALTER TABLE purchase_orders
+ADD COLUMN notes TEXT COMMENT '备注';
+
+-- 14. 采购收货：记录每个采购项目的已入库数量和采购单的到货时间
+ALTER TABLE purchase_order_items
+ADD COLUMN received_quantity DECIMAL(10,2) NOT NULL DEFAULT 0 COMMENT '已入库数量';
+
+ALTER TABLE purchase_orders
+ADD COLUMN delivered_at DATETIME COMMENT '全部到货时间';
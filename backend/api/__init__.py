@@ -13,6 +13,10 @@ from .employees import employees_bp
 from .financial import financial_bp
 from .mother_baby import mother_baby_bp
 from .system import system_bp
+from .kitchen import kitchen_bp
+from .search import search_bp
+from .customers import customers_bp
+from .media import media_bp
 
 api_bp.register_blueprint(auth_bp, url_prefix='/auth')
 api_bp.register_blueprint(users_bp, url_prefix='/users')
@@ -25,3 +29,7 @@ api_bp.register_blueprint(employees_bp, url_prefix='/employees')
 api_bp.register_blueprint(financial_bp, url_prefix='/financial')
 api_bp.register_blueprint(mother_baby_bp, url_prefix='/mother-baby')
 api_bp.register_blueprint(system_bp, url_prefix='/system')
+api_bp.register_blueprint(kitchen_bp, url_prefix='/kitchen')
+api_bp.register_blueprint(search_bp, url_prefix='/search')
+api_bp.register_blueprint(customers_bp, url_prefix='/customers')
+api_bp.register_blueprint(media_bp, url_prefix='/media')
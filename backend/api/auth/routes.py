@@ -6,6 +6,7 @@ from app import db
 from models.user import User
 from models.customer import Customer
 from models.employee import Employee
+from services.compatibility import compatibility_matrix
 
 @auth_bp.route('/login', methods=['POST'])
 def login():
@@ -83,6 +84,8 @@ def register():
         db.session.add(profile)
     
     db.session.commit()
+    if data['role'] == 'customer':
+        compatibility_matrix.update_customer(profile)
     
     return jsonify({'message': '注册成功'}), 201
 
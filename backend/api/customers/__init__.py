@@ -0,0 +1,5 @@
+from flask import Blueprint
+
+customers_bp = Blueprint('customers', __name__)
+
+from . import routes
@@ -0,0 +1,92 @@
+from flask import request, jsonify
+from flask_jwt_extended import jwt_required
+from .. import customers_bp
+from ...models.customer import Customer
+from ...services.compatibility import compatibility_matrix
+from ...services.restriction_index import restriction_index, iter_bits
+from ... import db
+
+# 允许通过接口修改的客户字段
+CUSTOMER_FIELDS = ('name', 'age', 'gender', 'contact', 'delivery_date', 'check_in_date',
+                   'check_out_date', 'dietary_restrictions', 'preferences', 'status')
+
+def _parse_ids(value):
+    return [int(item_id) for item_id in value.split(',') if item_id.strip()]
+
+def _candidate_bits():
+    # dish_ids=1,2,3 限定候选菜品（如某个菜单中的菜品），默认全部在售菜品；
+    # 只取索引中已有的菜品，不按客户端传入的任意ID构造位集
+    if request.args.get('dish_ids'):
+        restriction_index.ensure_fresh()
+        return restriction_index.known_bits(_parse_ids(request.args['dish_ids']))
+    return None
+
+@customers_bp.route('/<int:customer_id>', methods=['GET'])
+@jwt_required()
+def get_customer(customer_id):
+    customer = Customer.query.get(customer_id)
+    if not customer:
+        return jsonify({'error': '客户不存在'}), 404
+    
+    return jsonify(customer.to_dict()), 200
+
+@customers_bp.route('/<int:customer_id>', methods=['PUT'])
+@jwt_required()
+def update_customer(customer_id):
+    data = request.get_json()
+    customer = Customer.query.get(customer_id)
+    if not customer:
+        return jsonify({'error': '客户不存在'}), 404
+    
+    # 更新客户信息
+    for key, value in data.items():
+        if key in CUSTOMER_FIELDS:
+            setattr(customer, key, value)
+    
+    db.session.commit()
+    compatibility_matrix.update_customer(customer)
+    return jsonify(customer.to_dict()), 200
+
+@customers_bp.route('/<int:customer_id>/safe-dishes', methods=['GET'])
+@jwt_required()
+def get_safe_dishes(customer_id):
+    try:
+        dish_bits = _candidate_bits()
+    except ValueError:
+        return jsonify({'error': '菜品ID格式错误'}), 400
+    
+    compatibility_matrix.ensure_fresh()
+    safe_bits = compatibility_matrix.safe_bits(customer_id, dish_bits)
+    if safe_bits is None:
+        return jsonify({'error': '客户不存在'}), 404
+    
+    safe_dishes = [{'id': dish_id, 'name': name} for dish_id, name in restriction_index.dish_names(safe_bits)]
+    return jsonify({
+        'customer_id': customer_id,
+        'safe_dishes': safe_dishes,
+        'safe_count': len(safe_dishes)
+    }), 200
+
+@customers_bp.route('/safe-dishes', methods=['GET'])
+@jwt_required()
+def get_safe_dishes_bulk():
+    # customer_ids=1,2,3 指定客户，默认全部在住（active）客户
+    try:
+        dish_bits = _candidate_bits()
+        customer_ids = _parse_ids(request.args['customer_ids']) if request.args.get('customer_ids') else None
+    except ValueError:
+        return jsonify({'error': 'ID格式错误'}), 400
+    
+    compatibility_matrix.ensure_fresh()
+    if customer_ids is None:
+        customer_ids = compatibility_matrix.customer_ids()
+    
+    customers = []
+    for customer_id in customer_ids:
+        safe_bits = compatibility_matrix.safe_bits(customer_id, dish_bits)
+        if safe_bits is None:
+            customers.append({'customer_id': customer_id, 'error': '客户不存在'})
+        else:
+            customers.append({'customer_id': customer_id, 'safe_dish_ids': list(iter_bits(safe_bits))})
+    
+    return jsonify({'customers': customers}), 200
@@ -1,7 +1,14 @@
+from decimal import Decimal, InvalidOperation
 from flask import request, jsonify
 from flask_jwt_extended import jwt_required
 from .. import dishes_bp
-from ...models.dish import Dish
+from ...models.dish import Dish, DishIngredient
+from ...models.ingredient import Ingredient
+from ...models.customer import Customer
+from ...services import menu_cache
+from ...services.restriction_index import restriction_index, split_restrictions, iter_bits
+from ...services.search_index import search_index
+from ...services.images import ImageError, store_image
 from ... import db
 
 @dishes_bp.route('', methods=['GET'])
@@ -50,6 +57,8 @@ def create_dish():
     
     db.session.add(dish)
     db.session.commit()
+    restriction_index.update_dish(dish)
+    search_index.update('dish', dish)
     return jsonify(dish.to_dict()), 201
 
 @dishes_bp.route('/<int:dish_id>', methods=['PUT'])
@@ -65,7 +74,12 @@ def update_dish(dish_id):
         if hasattr(dish, key):
             setattr(dish, key, value)
     
+    # 使包含该菜品的菜单缓存失效
+    menu_cache.invalidate_menus_with_dish(dish_id)
+    
     db.session.commit()
+    restriction_index.update_dish(dish)
+    search_index.update('dish', dish)
     return jsonify(dish.to_dict()), 200
 
 @dishes_bp.route('/<int:dish_id>', methods=['DELETE'])
@@ -75,10 +89,33 @@ def delete_dish(dish_id):
     if not dish:
         return jsonify({'error': '菜品不存在'}), 404
     
+    menu_cache.invalidate_menus_with_dish(dish_id)
+    DishIngredient.query.filter_by(dish_id=dish_id).delete(synchronize_session=False)
     db.session.delete(dish)
     db.session.commit()
+    restriction_index.remove_dish(dish_id)
+    search_index.remove('dish', dish_id)
     return jsonify({'message': '菜品删除成功'}), 200
 
+@dishes_bp.route('/<int:dish_id>/image', methods=['POST'])
+@jwt_required()
+def upload_dish_image(dish_id):
+    # 上传菜品图片（字段名 file），内容相同的图片只保存一份
+    dish = Dish.query.get(dish_id)
+    if not dish:
+        return jsonify({'error': '菜品不存在'}), 404
+    if 'file' not in request.files:
+        return jsonify({'error': '请上传图片'}), 400
+    
+    try:
+        dish.image_hash = store_image(request.files['file'].stream)
+    except ImageError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    menu_cache.invalidate_menus_with_dish(dish_id)
+    db.session.commit()
+    return jsonify(dish.to_dict()), 200
+
 @dishes_bp.route('/categories', methods=['GET'])
 @jwt_required()
 def get_categories():
@@ -86,32 +123,166 @@ def get_categories():
     categories = db.session.query(Dish.category).distinct().all()
     return jsonify([category[0] for category in categories]), 200
 
+def _recipe_items(dish_id):
+    rows = db.session.query(DishIngredient, Ingredient.name, Ingredient.unit) \
+        .join(Ingredient, Ingredient.id == DishIngredient.ingredient_id) \
+        .filter(DishIngredient.dish_id == dish_id) \
+        .order_by(DishIngredient.id) \
+        .all()
+    items = []
+    for recipe_item, ingredient_name, ingredient_unit in rows:
+        item = recipe_item.to_dict()
+        item['ingredient_name'] = ingredient_name
+        item['unit'] = recipe_item.unit or ingredient_unit
+        items.append(item)
+    return items
+
+@dishes_bp.route('/<int:dish_id>/recipe', methods=['GET'])
+@jwt_required()
+def get_recipe(dish_id):
+    if not db.session.query(Dish.id).filter(Dish.id == dish_id).scalar():
+        return jsonify({'error': '菜品不存在'}), 404
+    
+    return jsonify({'dish_id': dish_id, 'items': _recipe_items(dish_id)}), 200
+
+def _parse_recipe_item(item):
+    # 返回 (食材ID, 每份用量, 单位)，不合法时抛出 ValueError
+    if not isinstance(item, dict) or not item.get('ingredient_id') or item.get('quantity') is None:
+        raise ValueError('配方食材需提供食材ID和用量')
+    try:
+        ingredient_id = int(item['ingredient_id'])
+        quantity = Decimal(str(item['quantity']))
+    except (InvalidOperation, TypeError, ValueError):
+        raise ValueError('配方食材ID或用量格式错误')
+    if not quantity.is_finite() or (item.get('unit') is not None and not isinstance(item['unit'], str)):
+        raise ValueError('配方食材ID或用量格式错误')
+    if quantity <= 0:
+        raise ValueError('用量必须大于0')
+    return ingredient_id, quantity, item.get('unit')
+
+@dishes_bp.route('/<int:dish_id>/recipe', methods=['PUT'])
+@jwt_required()
+def update_recipe(dish_id):
+    # 以 items 整体替换菜品配方：[{ingredient_id, quantity（每份用量）, unit（可选）}]
+    data = request.get_json()
+    if not data or not isinstance(data.get('items'), list):
+        return jsonify({'error': '请提供配方食材列表'}), 400
+    if not db.session.query(Dish.id).filter(Dish.id == dish_id).scalar():
+        return jsonify({'error': '菜品不存在'}), 404
+    
+    items = {}
+    try:
+        for item in data['items']:
+            ingredient_id, quantity, unit = _parse_recipe_item(item)
+            items[ingredient_id] = {'quantity': quantity, 'unit': unit}
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # 一次查询校验食材是否存在
+    if items:
+        found = {row[0] for row in db.session.query(Ingredient.id).filter(Ingredient.id.in_(list(items)))}
+        missing = sorted(set(items) - found)
+        if missing:
+            return jsonify({'error': f'食材不存在：{missing}'}), 400
+    
+    DishIngredient.query.filter_by(dish_id=dish_id).delete(synchronize_session=False)
+    if items:
+        db.session.execute(DishIngredient.__table__.insert(), [{
+            'dish_id': dish_id,
+            'ingredient_id': ingredient_id,
+            'quantity': item['quantity'],
+            'unit': item['unit']
+        } for ingredient_id, item in items.items()])
+    db.session.commit()
+    
+    return jsonify({'dish_id': dish_id, 'items': _recipe_items(dish_id)}), 200
+
+def _parse_dish_ids(dish_ids):
+    # 菜品ID可为整数或数字字符串，统一转换为整数
+    if not isinstance(dish_ids, list):
+        raise ValueError('dish_ids 必须为列表')
+    return [int(dish_id) for dish_id in dish_ids]
+
+def _restricted_dishes(tokens, dish_ids, dish_bits):
+    # 按请求中的菜品顺序输出受限菜品
+    matches = restriction_index.find_restricted(tokens, dish_bits)
+    restricted_dishes = []
+    for dish_id in dish_ids:
+        if dish_id in matches:
+            dish_name, restriction = matches.pop(dish_id)
+            restricted_dishes.append({
+                'dish_id': dish_id,
+                'dish_name': dish_name,
+                'restriction': restriction
+            })
+    return restricted_dishes
+
 @dishes_bp.route('/check-restrictions', methods=['POST'])
 @jwt_required()
 def check_restrictions():
     data = request.get_json()
-    if not data or not data.get('dish_ids') or not data.get('dietary_restrictions'):
+    if not data:
         return jsonify({'error': '请提供菜品ID列表和饮食禁忌'}), 400
     
-    dish_ids = data['dish_ids']
-    restrictions = data['dietary_restrictions'].split(',')
+    restriction_index.ensure_fresh()
     
-    restricted_dishes = []
+    # 批量模式：一次检查多个客户
+    if data.get('customers') or data.get('customer_ids'):
+        return _check_restrictions_batch(data)
     
-    for dish_id in dish_ids:
-        dish = Dish.query.get(dish_id)
-        if dish and dish.restrictions:
-            dish_restrictions = dish.restrictions.split(',')
-            for restriction in restrictions:
-                if restriction.strip() in dish_restrictions:
-                    restricted_dishes.append({
-                        'dish_id': dish.id,
-                        'dish_name': dish.name,
-                        'restriction': restriction.strip()
-                    })
-                    break
+    if not data.get('dish_ids') or not data.get('dietary_restrictions'):
+        return jsonify({'error': '请提供菜品ID列表和饮食禁忌'}), 400
+    
+    try:
+        dish_ids = _parse_dish_ids(data['dish_ids'])
+    except (TypeError, ValueError):
+        return jsonify({'error': '菜品ID格式错误'}), 400
+    tokens = split_restrictions(data['dietary_restrictions'])
+    restricted_dishes = _restricted_dishes(tokens, dish_ids, restriction_index.known_bits(dish_ids))
     
     return jsonify({
         'restricted_dishes': restricted_dishes,
         'has_restrictions': len(restricted_dishes) > 0
     }), 200
+
+def _check_restrictions_batch(data):
+    # 未指定菜品时检查全部在售菜品
+    dish_ids = data.get('dish_ids')
+    if dish_ids:
+        try:
+            dish_ids = _parse_dish_ids(dish_ids)
+        except (TypeError, ValueError):
+            return jsonify({'error': '菜品ID格式错误'}), 400
+        dish_bits = restriction_index.known_bits(dish_ids)
+    else:
+        dish_bits = restriction_index.active_bits()
+        dish_ids = sorted(iter_bits(dish_bits))
+    
+    # 客户可直接提供禁忌，或只提供客户ID由系统读取（一次查询）
+    entries = list(data.get('customers') or [])
+    entries.extend({'customer_id': customer_id} for customer_id in data.get('customer_ids') or [])
+    lookup_ids = [entry['customer_id'] for entry in entries
+                  if entry.get('customer_id') and 'dietary_restrictions' not in entry]
+    stored = {}
+    if lookup_ids:
+        rows = db.session.query(Customer.id, Customer.dietary_restrictions).filter(Customer.id.in_(lookup_ids)).all()
+        stored = {customer_id: restrictions for customer_id, restrictions in rows}
+    
+    results = []
+    for entry in entries:
+        customer_id = entry.get('customer_id')
+        if 'dietary_restrictions' in entry:
+            restrictions = entry['dietary_restrictions']
+        elif customer_id in stored:
+            restrictions = stored[customer_id]
+        else:
+            results.append({'customer_id': customer_id, 'error': '客户不存在'})
+            continue
+        restricted_dishes = _restricted_dishes(split_restrictions(restrictions), dish_ids, dish_bits)
+        results.append({
+            'customer_id': customer_id,
+            'restricted_dishes': restricted_dishes,
+            'has_restrictions': len(restricted_dishes) > 0
+        })
+    
+    return jsonify({'results': results}), 200
@@ -1,9 +1,18 @@
 from flask import request, jsonify
-from flask_jwt_extended import jwt_required
+from datetime import date
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from .. import financial_bp
 from ...models.financial import Transaction, Attendance, Workload, Salary, PurchaseOrder, PurchaseOrderItem, PaymentTransaction
+from ...models.user import User
+from ...services.replenishment import run_replenishment
+from ...services.goods_receipt import receive_purchase_orders
+from ...services.supplier_prices import record_prices
+from ...services.financial_rollups import summary, GRANULARITIES
+from ...tasks.stock_alerts import stock_alerts
 from ... import db
 
+MAX_BATCH_RECEIPTS = 200
+
 @financial_bp.route('/transactions', methods=['GET'])
 @jwt_required()
 def get_transactions():
@@ -29,6 +38,23 @@ def get_transactions():
         'description': t.description
     } for t in transactions]), 200
 
+@financial_bp.route('/summary', methods=['GET'])
+@jwt_required()
+def get_financial_summary():
+    # granularity=day|month，默认按月；from/to 默认为今年1月1日至今天
+    granularity = request.args.get('granularity', 'month')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': 'granularity 只能为 day 或 month'}), 400
+    try:
+        date_to = date.fromisoformat(request.args['to']) if request.args.get('to') else date.today()
+        date_from = date.fromisoformat(request.args['from']) if request.args.get('from') else date_to.replace(month=1, day=1)
+    except ValueError:
+        return jsonify({'error': '日期格式错误，应为YYYY-MM-DD'}), 400
+    if date_from > date_to:
+        return jsonify({'error': '开始日期不能晚于结束日期'}), 400
+    
+    return jsonify(summary(granularity, date_from, date_to)), 200
+
 @financial_bp.route('/workloads', methods=['GET'])
 @jwt_required()
 def get_workloads():
@@ -175,7 +201,8 @@ def get_purchase_orders():
         'order_date': po.order_date.isoformat() if po.order_date else None,
         'total_amount': po.total_amount,
         'status': po.status,
-        'notes': po.notes
+        'notes': po.notes,
+        'delivered_at': po.delivered_at.isoformat() if po.delivered_at else None
     } for po in purchase_orders]), 200
 
 @financial_bp.route('/purchase-orders', methods=['POST'])
@@ -191,8 +218,14 @@ def create_purchase_order():
         if 'subtotal' in item:
             total_amount += item['subtotal']
     
+    for item in data['items']:
+        if not item.get('ingredient_id') or not item.get('quantity') or not item.get('unit_price'):
+            return jsonify({'error': '采购项目信息不完整'}), 400
+    
     purchase_order = PurchaseOrder(
         supplier_id=data['supplier_id'],
+        order_date=data.get('order_date') or date.today(),
+        expected_delivery=data.get('expected_delivery'),
         total_amount=total_amount,
         status=data.get('status', 'pending'),
         notes=data.get('notes')
@@ -201,19 +234,23 @@ def create_purchase_order():
     db.session.add(purchase_order)
     db.session.flush()  # 获取采购订单ID但不提交事务
     
-    # 添加采购项目
-    for item in data['items']:
-        if not item.get('ingredient_id') or not item.get('quantity') or not item.get('unit_price'):
-            return jsonify({'error': '采购项目信息不完整'}), 400
-        
-        purchase_item = PurchaseOrderItem(
-            purchase_order_id=purchase_order.id,
-            ingredient_id=item['ingredient_id'],
-            quantity=item['quantity'],
-            unit_price=item['unit_price'],
-            subtotal=item.get('subtotal', item['quantity'] * item['unit_price'])
-        )
-        db.session.add(purchase_item)
+    # 批量添加采购项目
+    db.session.execute(PurchaseOrderItem.__table__.insert(), [{
+        'order_id': purchase_order.id,
+        'ingredient_id': item['ingredient_id'],
+        'quantity': item['quantity'],
+        'unit_price': item['unit_price'],
+        'subtotal': item.get('subtotal', item['quantity'] * item['unit_price'])
+    } for item in data['items']])
+    
+    # 采购单价同时记入供应商价格历史
+    record_prices([{
+        'supplier_id': purchase_order.supplier_id,
+        'ingredient_id': item['ingredient_id'],
+        'unit_price': item['unit_price'],
+        'observed_on': purchase_order.order_date,
+        'purchase_order_id': purchase_order.id
+    } for item in data['items']])
     
     db.session.commit()
     return jsonify({
@@ -224,3 +261,51 @@ def create_purchase_order():
         'status': purchase_order.status,
         'notes': purchase_order.notes
     }), 201
+
+@financial_bp.route('/purchase-orders/replenish', methods=['POST'])
+@jwt_required()
+def replenish_purchase_orders():
+    # 检查用户是否为管理员
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    if not user or user.role != 'admin':
+        return jsonify({'error': '无权限操作'}), 403
+    
+    # dry_run=1 时只返回补货计划，不生成采购单
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+    summary = run_replenishment(dry_run=dry_run)
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    return jsonify(summary), 200 if dry_run else 201
+
+def _receive(receipts):
+    results, errors = receive_purchase_orders(receipts, operator_id=get_jwt_identity())
+    if errors:
+        db.session.rollback()
+        return jsonify({'error': '收货失败', 'errors': errors}), 400
+    
+    db.session.commit()
+    stock_alerts.refresh(line['ingredient_id'] for result in results for line in result['lines'])
+    return jsonify({'message': '收货成功', 'purchase_orders': results}), 200
+
+@financial_bp.route('/purchase-orders/<int:purchase_order_id>/receive', methods=['POST'])
+@jwt_required()
+def receive_purchase_order(purchase_order_id):
+    # 不提供 items 时收取全部未到货数量；部分收货时 items 为 [{item_id 或 ingredient_id, quantity, expiry_date, lot_number}]
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': '请求格式错误'}), 400
+    return _receive([{'purchase_order_id': purchase_order_id, 'items': data.get('items')}])
+
+@financial_bp.route('/purchase-orders/receive', methods=['POST'])
+@jwt_required()
+def receive_purchase_orders_batch():
+    # receipts: [{purchase_order_id, items（可选）}]，全部成功或全部失败
+    data = request.get_json()
+    if not data or not isinstance(data.get('receipts'), list) or not data['receipts']:
+        return jsonify({'error': '请提供收货列表'}), 400
+    if len(data['receipts']) > MAX_BATCH_RECEIPTS:
+        return jsonify({'error': f'单次最多收货{MAX_BATCH_RECEIPTS}张采购单'}), 400
+    return _receive(data['receipts'])
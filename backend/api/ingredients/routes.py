@@ -1,16 +1,34 @@
 from flask import request, jsonify
-from flask_jwt_extended import jwt_required
+from flask_jwt_extended import jwt_required, get_jwt_identity
 import sys
 import os
+from datetime import date
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from . import ingredients_bp
-from models.ingredient import Ingredient
+from models.ingredient import Ingredient, IngredientForecast
+from models.user import User
 from models.supplier import Supplier
+from models.dish import DishIngredient
+from services.search_index import search_index
+from services.requirements import requirements_for_dates, requirements_for_orders
+from services.stock_ledger import StockError, parse_movement, apply_movement, apply_movements, list_movements
+from services.lots import aggregate, consume, receive_lots, pick, list_lots
+from services.forecasting import apply_suggestions
+from services.images import ImageError, store_image
+from tasks import forecast
+from tasks.stock_alerts import stock_alerts, ALERT_PRIORITIES
 from app import db
 
+MAX_BATCH_MOVEMENTS = 1000
+DEFAULT_MOVEMENT_PAGE_SIZE = 50
+MAX_MOVEMENT_PAGE_SIZE = 500
+# 允许通过接口修改的食材字段；库存余额只能经库存流水修改
+INGREDIENT_FIELDS = ('name', 'category', 'unit', 'minimum_stock', 'supplier_id', 'price', 'expiry_date',
+                     'nutrition_info', 'calories', 'restrictions', 'purchaser', 'origin')
+
 @ingredients_bp.route('', methods=['GET'])
 @jwt_required()
 def get_ingredients():
@@ -26,7 +44,9 @@ def get_ingredients():
     if supplier_id:
         query = query.filter_by(supplier_id=supplier_id)
     if low_stock:
-        query = query.filter(Ingredient.current_stock <= Ingredient.minimum_stock)
+        # 从内存告警集合取库存不足的食材，避免全表扫描
+        stock_alerts.ensure_scanned()
+        query = query.filter(Ingredient.id.in_(stock_alerts.ingredient_ids({'low_stock', 'out_of_stock'})))
     
     ingredients = query.all()
     return jsonify([ingredient.to_dict() for ingredient in ingredients]), 200
@@ -57,7 +77,7 @@ def create_ingredient():
         name=data['name'],
         category=data['category'],
         unit=data['unit'],
-        current_stock=data.get('current_stock', 0),
+        current_stock=0,
         minimum_stock=data.get('minimum_stock', 0),
         supplier_id=data.get('supplier_id'),
         price=data.get('price', 0),
@@ -70,7 +90,21 @@ def create_ingredient():
     )
     
     db.session.add(ingredient)
+    db.session.flush()  # 获取食材ID但不提交事务
+    
+    # 初始库存作为一条入库流水写入
+    if data.get('current_stock'):
+        try:
+            _, _, quantity = parse_movement({'type': 'in', 'quantity': data['current_stock']})
+            apply_movement(ingredient.id, 'in', quantity, reference=data.get('reference'),
+                           operator_id=get_jwt_identity(), notes='初始库存')
+        except StockError as e:
+            db.session.rollback()
+            return jsonify({'error': e.message}), e.status_code
+    
     db.session.commit()
+    search_index.update('ingredient', ingredient)
+    stock_alerts.refresh([ingredient.id])
     return jsonify(ingredient.to_dict()), 201
 
 @ingredients_bp.route('/<int:ingredient_id>', methods=['PUT'])
@@ -81,12 +115,14 @@ def update_ingredient(ingredient_id):
     if not ingredient:
         return jsonify({'error': '食材不存在'}), 404
     
-    # 更新食材信息
+    # 更新食材信息；库存请通过库存变动接口修改
     for key, value in data.items():
-        if hasattr(ingredient, key):
+        if key in INGREDIENT_FIELDS:
             setattr(ingredient, key, value)
     
     db.session.commit()
+    search_index.update('ingredient', ingredient)
+    stock_alerts.refresh([ingredient_id])
     return jsonify(ingredient.to_dict()), 200
 
 @ingredients_bp.route('/<int:ingredient_id>', methods=['DELETE'])
@@ -96,45 +132,264 @@ def delete_ingredient(ingredient_id):
     if not ingredient:
         return jsonify({'error': '食材不存在'}), 404
     
+    # 检查是否有菜品配方引用
+    if DishIngredient.query.filter_by(ingredient_id=ingredient_id).first():
+        return jsonify({'error': '该食材被菜品配方引用，无法删除'}), 400
+    
     db.session.delete(ingredient)
     db.session.commit()
+    search_index.remove('ingredient', ingredient_id)
+    stock_alerts.refresh([ingredient_id])
     return jsonify({'message': '食材删除成功'}), 200
 
-@ingredients_bp.route('/<int:ingredient_id>/stock', methods=['PUT'])
+@ingredients_bp.route('/<int:ingredient_id>/image', methods=['POST'])
 @jwt_required()
-def update_stock(ingredient_id):
-    data = request.get_json()
+def upload_ingredient_image(ingredient_id):
+    # 上传食材图片（字段名 file），内容相同的图片只保存一份
     ingredient = Ingredient.query.get(ingredient_id)
     if not ingredient:
         return jsonify({'error': '食材不存在'}), 404
+    if 'file' not in request.files:
+        return jsonify({'error': '请上传图片'}), 400
     
-    if 'quantity' not in data or 'type' not in data:
-        return jsonify({'error': '请提供数量和操作类型（in或out）'}), 400
+    try:
+        ingredient.image_hash = store_image(request.files['file'].stream)
+    except ImageError as e:
+        return jsonify({'error': str(e)}), 400
     
-    quantity = data['quantity']
-    if quantity <= 0:
-        return jsonify({'error': '数量必须大于0'}), 400
+    db.session.commit()
+    return jsonify(ingredient.to_dict()), 200
+
+@ingredients_bp.route('/<int:ingredient_id>/stock', methods=['PUT'])
+@jwt_required()
+def update_stock(ingredient_id):
+    data = request.get_json()
+    try:
+        _, movement_type, quantity = parse_movement(data)
+        # 余额的判断与修改在一条条件 UPDATE 中完成，并写入库存流水
+        current_stock = apply_movement(ingredient_id, movement_type, quantity,
+                                       reference=data.get('reference'), operator_id=get_jwt_identity(),
+                                       notes=data.get('notes'))
+        if movement_type == 'out':
+            # 出库按先到期先出扣减批次
+            consume({ingredient_id: quantity})
+    except StockError as e:
+        db.session.rollback()
+        return jsonify({'error': e.message}), e.status_code
     
-    if data['type'] == 'in':
-        # 入库
-        ingredient.current_stock += quantity
-    elif data['type'] == 'out':
-        # 出库
-        if ingredient.current_stock < quantity:
-            return jsonify({'error': '库存不足'}), 400
-        ingredient.current_stock -= quantity
-    else:
-        return jsonify({'error': '操作类型必须是in或out'}), 400
+    db.session.commit()
+    stock_alerts.refresh([ingredient_id])
+    return jsonify({
+        'message': '库存更新成功',
+        'current_stock': current_stock
+    }), 200
+
+@ingredients_bp.route('/stock/batch', methods=['POST'])
+@jwt_required()
+def batch_update_stock():
+    # movements: [{ingredient_id, type（in或out）, quantity, reference, notes}]，全部成功或全部失败
+    data = request.get_json()
+    if not data or not isinstance(data.get('movements'), list) or not data['movements']:
+        return jsonify({'error': '请提供库存变动列表'}), 400
+    if len(data['movements']) > MAX_BATCH_MOVEMENTS:
+        return jsonify({'error': f'单次最多提交{MAX_BATCH_MOVEMENTS}条库存变动'}), 400
+    
+    results, errors = apply_movements(data['movements'], reference=data.get('reference'),
+                                      operator_id=get_jwt_identity())
+    if errors:
+        db.session.rollback()
+        return jsonify({'error': '库存更新失败', 'errors': errors}), 400
+    
+    # 出库按先到期先出扣减批次
+    outbound, _ = aggregate([movement for movement in data['movements'] if movement['type'] == 'out'])
+    consume(outbound)
     
     db.session.commit()
+    stock_alerts.refresh(result['ingredient_id'] for result in results)
     return jsonify({
         'message': '库存更新成功',
-        'current_stock': ingredient.current_stock
+        'results': results
+    }), 200
+
+@ingredients_bp.route('/<int:ingredient_id>/lots', methods=['GET'])
+@jwt_required()
+def get_lots(ingredient_id):
+    # 有余量的批次，按先到期先出顺序
+    return jsonify({'ingredient_id': ingredient_id, 'lots': list_lots(ingredient_id)}), 200
+
+@ingredients_bp.route('/lots/receive', methods=['POST'])
+@jwt_required()
+def receive_ingredient_lots():
+    # lots: [{ingredient_id, quantity, expiry_date, lot_number, purchase_order_id}]，全部成功或全部失败
+    data = request.get_json()
+    if not data or not isinstance(data.get('lots'), list) or not data['lots']:
+        return jsonify({'error': '请提供入库批次列表'}), 400
+    if len(data['lots']) > MAX_BATCH_MOVEMENTS:
+        return jsonify({'error': f'单次最多提交{MAX_BATCH_MOVEMENTS}个批次'}), 400
+    
+    results, errors = receive_lots(data['lots'], reference=data.get('reference'), operator_id=get_jwt_identity())
+    if errors:
+        db.session.rollback()
+        return jsonify({'error': '批次入库失败', 'errors': errors}), 400
+    
+    db.session.commit()
+    stock_alerts.refresh(result['ingredient_id'] for result in results)
+    return jsonify({
+        'message': '批次入库成功',
+        'results': results
+    }), 201
+
+@ingredients_bp.route('/stock/pick', methods=['POST'])
+@jwt_required()
+def pick_stock():
+    # 批量领料：requirements 为 [{ingredient_id, quantity}]，或提供 date 按当日食材需求量领料
+    data = request.get_json()
+    if not data or (not data.get('requirements') and not data.get('date')):
+        return jsonify({'error': '请提供领料列表或日期'}), 400
+    
+    requirements = data.get('requirements')
+    if not requirements:
+        try:
+            pick_date = date.fromisoformat(data['date'])
+        except ValueError:
+            return jsonify({'error': '日期格式错误，应为YYYY-MM-DD'}), 400
+        # 只领取单位可换算为库存单位的需求
+        requirements = [{'ingredient_id': row['ingredient_id'], 'quantity': row['required_quantity']}
+                        for row in requirements_for_dates(pick_date, pick_date)['requirements']
+                        if row['current_stock'] is not None]
+        if not requirements:
+            return jsonify({'message': '当日没有需要领取的食材', 'picks': []}), 200
+    if len(requirements) > MAX_BATCH_MOVEMENTS:
+        return jsonify({'error': f'单次最多领取{MAX_BATCH_MOVEMENTS}种食材'}), 400
+    
+    picks, errors = pick(requirements, reference=data.get('reference'), operator_id=get_jwt_identity(),
+                         allow_partial=bool(data.get('allow_partial')))
+    if errors:
+        db.session.rollback()
+        return jsonify({'error': '领料失败', 'errors': errors}), 400
+    
+    db.session.commit()
+    stock_alerts.refresh(row['ingredient_id'] for row in picks)
+    return jsonify({
+        'message': '领料成功',
+        'picks': picks
     }), 200
 
+@ingredients_bp.route('/<int:ingredient_id>/stock/movements', methods=['GET'])
+@jwt_required()
+def get_stock_movements(ingredient_id):
+    # 按时间倒序分页，before 为上一页最后一条流水的ID
+    limit = max(1, min(request.args.get('limit', DEFAULT_MOVEMENT_PAGE_SIZE, type=int), MAX_MOVEMENT_PAGE_SIZE))
+    before_id = request.args.get('before', type=int)
+    
+    movements = list_movements(ingredient_id, limit, before_id)
+    return jsonify({
+        'movements': [movement.to_dict() for movement in movements],
+        'next_before': movements[-1].id if len(movements) == limit else None
+    }), 200
+
+@ingredients_bp.route('/alerts', methods=['GET'])
+@jwt_required()
+def get_alerts():
+    # 库存与保质期告警，按紧急程度排序；types 为逗号分隔的告警类型，默认全部
+    types = None
+    if request.args.get('types'):
+        types = {alert_type.strip() for alert_type in request.args['types'].split(',') if alert_type.strip()}
+        unknown = types - set(ALERT_PRIORITIES)
+        if unknown:
+            return jsonify({'error': f'不支持的告警类型：{",".join(sorted(unknown))}'}), 400
+    limit = request.args.get('limit', type=int)
+    
+    stock_alerts.ensure_scanned()
+    alerts = stock_alerts.alerts(types)
+    return jsonify({
+        'alerts': alerts[:limit] if limit else alerts,
+        'total': len(alerts),
+        'counts': stock_alerts.counts(),
+        'scanned_at': stock_alerts.scanned_at.isoformat() if stock_alerts.scanned_at else None
+    }), 200
+
+@ingredients_bp.route('/forecasts', methods=['GET'])
+@jwt_required()
+def get_forecasts():
+    # 用量预测与建议最低库存、建议采购量；reorder_only=1 时只返回需要采购的食材
+    query = db.session.query(IngredientForecast, Ingredient.name, Ingredient.unit,
+                             Ingredient.current_stock, Ingredient.minimum_stock) \
+        .join(Ingredient, Ingredient.id == IngredientForecast.ingredient_id)
+    if request.args.get('reorder_only', '').lower() in ('1', 'true', 'yes'):
+        query = query.filter(IngredientForecast.reorder_quantity > 0)
+    
+    forecasts = []
+    for forecast_row, name, unit, current_stock, minimum_stock in query.order_by(IngredientForecast.ingredient_id):
+        forecast_dict = forecast_row.to_dict()
+        forecast_dict.update({
+            'ingredient_name': name,
+            'unit': unit,
+            'current_stock': current_stock,
+            'minimum_stock': minimum_stock
+        })
+        forecasts.append(forecast_dict)
+    return jsonify(forecasts), 200
+
+@ingredients_bp.route('/forecasts/run', methods=['POST'])
+@jwt_required()
+def run_forecasts():
+    # 检查用户是否为管理员
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    if not user or user.role != 'admin':
+        return jsonify({'error': '无权限操作'}), 403
+    
+    count = forecast.run()
+    return jsonify({'message': '用量预测完成', 'count': count}), 200
+
+@ingredients_bp.route('/forecasts/apply', methods=['POST'])
+@jwt_required()
+def apply_forecasts():
+    # 将建议最低库存写入食材；可用 ingredient_ids 指定食材，默认全部有近期用量的食材
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    if not user or user.role != 'admin':
+        return jsonify({'error': '无权限操作'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    count = apply_suggestions(data.get('ingredient_ids'))
+    db.session.commit()
+    # 最低库存变化会影响库存不足告警
+    stock_alerts.scan()
+    return jsonify({'message': '最低库存已更新', 'count': count}), 200
+
 @ingredients_bp.route('/categories', methods=['GET'])
 @jwt_required()
 def get_categories():
     # 获取所有食材类别
     categories = db.session.query(Ingredient.category).distinct().all()
     return jsonify([category[0] for category in categories]), 200
+
+@ingredients_bp.route('/requirements', methods=['GET'])
+@jwt_required()
+def get_requirements():
+    # 按订单（order_ids=1,2,3）或配送日期范围（from/to，默认当天）计算食材需求量
+    by_date = request.args.get('by_date', '').lower() in ('1', 'true', 'yes')
+    
+    if request.args.get('order_ids'):
+        try:
+            order_ids = [int(order_id) for order_id in request.args['order_ids'].split(',') if order_id.strip()]
+        except ValueError:
+            return jsonify({'error': '订单ID格式错误'}), 400
+        result = requirements_for_orders(order_ids, by_date)
+        result['order_ids'] = order_ids
+        return jsonify(result), 200
+    
+    try:
+        date_from = date.fromisoformat(request.args['from']) if request.args.get('from') else date.today()
+        date_to = date.fromisoformat(request.args['to']) if request.args.get('to') else date_from
+    except ValueError:
+        return jsonify({'error': '日期格式错误，应为YYYY-MM-DD'}), 400
+    if date_to < date_from:
+        return jsonify({'error': '结束日期不能早于开始日期'}), 400
+    
+    result = requirements_for_dates(date_from, date_to, by_date)
+    result['from'] = date_from.isoformat()
+    result['to'] = date_to.isoformat()
+    return jsonify(result), 200
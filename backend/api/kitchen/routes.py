@@ -0,0 +1,48 @@
+from datetime import date
+from flask import request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from .. import kitchen_bp
+from ...models.user import User
+from ...services.kitchen_production import get_production, rebuild_production
+from ... import db
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else date.today()
+    except ValueError:
+        return None
+
+@kitchen_bp.route('/production', methods=['GET'])
+@jwt_required()
+def get_production_sheet():
+    # 默认返回当天的生产单
+    delivery_date = _parse_date(request.args.get('date'))
+    if not delivery_date:
+        return jsonify({'error': '日期格式错误，应为YYYY-MM-DD'}), 400
+    
+    menu_types = get_production(delivery_date)
+    return jsonify({
+        'date': delivery_date.isoformat(),
+        'menu_types': menu_types,
+        'total_quantity': sum(row['quantity'] for rows in menu_types.values() for row in rows)
+    }), 200
+
+@kitchen_bp.route('/production/rebuild', methods=['POST'])
+@jwt_required()
+def rebuild_production_sheet():
+    # 检查用户是否为管理员
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    if not user or user.role != 'admin':
+        return jsonify({'error': '无权限操作'}), 403
+    
+    # 未指定日期时重建全部日期
+    delivery_date = None
+    if request.args.get('date'):
+        delivery_date = _parse_date(request.args.get('date'))
+        if not delivery_date:
+            return jsonify({'error': '日期格式错误，应为YYYY-MM-DD'}), 400
+    
+    rebuild_production(delivery_date)
+    db.session.commit()
+    return jsonify({'message': '生产单重建成功'}), 200
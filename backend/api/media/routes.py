@@ -0,0 +1,48 @@
+from flask import request, jsonify, send_file, Response
+from .. import media_bp
+from ...services.images import THUMBNAIL_WIDTHS, THUMBNAIL_FORMATS, is_valid_hash, find_original, get_thumbnail
+
+# 内容寻址的图片永不变化，可长期缓存
+CACHE_MAX_AGE = 365 * 24 * 3600
+
+def _thumbnail_format():
+    # 显式指定 format，否则浏览器支持 WebP 时返回 WebP
+    requested = request.args.get('format')
+    if requested:
+        return requested if requested in THUMBNAIL_FORMATS else None
+    return 'webp' if 'image/webp' in request.headers.get('Accept', '') else 'jpeg'
+
+@media_bp.route('/<image_hash>', methods=['GET'])
+def get_media(image_hash):
+    # 图片由 <img> 直接加载，无法携带令牌，因此不要求登录；哈希值不可猜测
+    if not is_valid_hash(image_hash):
+        return jsonify({'error': '图片不存在'}), 404
+    
+    width = request.args.get('w', type=int)
+    if width:
+        if width not in THUMBNAIL_WIDTHS:
+            return jsonify({'error': f'缩略图宽度只能是{",".join(str(w) for w in THUMBNAIL_WIDTHS)}'}), 400
+        thumbnail_format = _thumbnail_format()
+        if not thumbnail_format:
+            return jsonify({'error': '图片格式只能是webp或jpeg'}), 400
+        etag = f'{image_hash}-{width}-{thumbnail_format}'
+    else:
+        etag = image_hash
+    
+    # 客户端已缓存时直接返回 304，不访问磁盘
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+    else:
+        found = get_thumbnail(image_hash, width, thumbnail_format) if width else find_original(image_hash)
+        if not found:
+            return jsonify({'error': '图片不存在'}), 404
+        path, mimetype = found
+        response = send_file(path, mimetype=mimetype, etag=etag, conditional=True)
+    
+    response.cache_control.public = True
+    response.cache_control.max_age = CACHE_MAX_AGE
+    response.cache_control.immutable = True
+    if width and not request.args.get('format'):
+        response.vary.add('Accept')
+    return response
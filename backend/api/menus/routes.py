@@ -1,9 +1,16 @@
-from flask import request, jsonify
-from flask_jwt_extended import jwt_required
+from flask import request, jsonify, Response
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from .. import menus_bp
 from ...models.menu import Menu, MenuDish, CustomerMenu
 from ...models.dish import Dish
 from ...models.customer import Customer
+from ...models.user import User
+from ...services import kitchen_production
+from ...services import menu_cache
+from ...services.menu_composition import sync_menu_dishes
+from ...services.menu_importer import import_menus, MenuImportError
+from ...services.restriction_index import restriction_index
+from ...services.search_index import search_index
 from ... import db
 
 @menus_bp.route('', methods=['GET'])
@@ -12,6 +19,8 @@ def get_menus():
     # 支持按类型、状态等筛选
     menu_type = request.args.get('type')
     status = request.args.get('status')
+    # expand=dishes 时在每个菜单中嵌入菜品及数量
+    expand_dishes = 'dishes' in request.args.get('expand', '').split(',')
     
     query = Menu.query
     
@@ -20,33 +29,36 @@ def get_menus():
     if status:
         query = query.filter_by(status=status)
     
-    menus = query.all()
-    return jsonify([menu.to_dict() for menu in menus]), 200
+    menus = query.order_by(Menu.id).all()
+    
+    # 菜单目录未变化时直接返回 304，不再查询菜品
+    etag = menu_cache.catalog_etag(menus, menu_type, status, expand_dishes)
+    if etag in request.if_none_match:
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    
+    if expand_dishes:
+        response = jsonify(menu_cache.expand_menus(menus))
+    else:
+        response = jsonify([menu.to_dict() for menu in menus])
+    response.set_etag(etag)
+    return response, 200
 
 @menus_bp.route('/<int:menu_id>', methods=['GET'])
 @jwt_required()
 def get_menu(menu_id):
-    menu = Menu.query.get(menu_id)
-    if not menu:
+    # 菜单详情走版本化缓存
+    detail = menu_cache.get_menu_detail(menu_id)
+    if not detail:
         return jsonify({'error': '菜单不存在'}), 404
     
-    # 获取菜单包含的菜品
-    menu_dishes = MenuDish.query.filter_by(menu_id=menu_id).all()
-    dish_ids = [md.dish_id for md in menu_dishes]
-    dishes = Dish.query.filter(Dish.id.in_(dish_ids)).all()
-    
-    # 构建菜品与数量的映射
-    dish_quantity_map = {md.dish_id: md.quantity for md in menu_dishes}
-    dishes_with_quantity = []
-    for dish in dishes:
-        dish_dict = dish.to_dict()
-        dish_dict['quantity'] = dish_quantity_map.get(dish.id, 1)
-        dishes_with_quantity.append(dish_dict)
-    
-    return jsonify({
-        'menu': menu.to_dict(),
-        'dishes': dishes_with_quantity
-    }), 200
+    return jsonify(detail), 200
+
+@menus_bp.route('/cache/stats', methods=['GET'])
+@jwt_required()
+def get_menu_cache_stats():
+    return jsonify(menu_cache.cache_stats()), 200
 
 @menus_bp.route('', methods=['POST'])
 @jwt_required()
@@ -88,34 +100,36 @@ def update_menu(menu_id):
     if not menu:
         return jsonify({'error': '菜单不存在'}), 404
     
-    # 更新菜单信息
-    if 'name' in data:
-        menu.name = data['name']
-    if 'description' in data:
-        menu.description = data['description']
-    if 'type' in data:
-        menu.type = data['type']
-    if 'price' in data:
-        menu.price = data['price']
-    if 'status' in data:
-        menu.status = data['status']
-    
-    # 更新菜单菜品关联
+    old_type = menu.type
+    
+    # 更新菜单信息，只记录实际发生变化的字段
+    changed = False
+    for field in ['name', 'description', 'type', 'price', 'status']:
+        if field in data and getattr(menu, field) != data[field]:
+            setattr(menu, field, data[field])
+            changed = True
+    
+    # 按差异更新菜单菜品关联，只执行必要的插入、更新和删除
+    dish_changes = None
     if 'dishes' in data:
-        # 删除现有关联
-        MenuDish.query.filter_by(menu_id=menu_id).delete()
-        # 添加新关联
-        for dish_item in data['dishes']:
-            if 'dish_id' in dish_item and 'quantity' in dish_item:
-                menu_dish = MenuDish(
-                    menu_id=menu_id,
-                    dish_id=dish_item['dish_id'],
-                    quantity=dish_item['quantity']
-                )
-                db.session.add(menu_dish)
+        dish_changes, old_dishes, new_dishes = sync_menu_dishes(menu_id, data['dishes'])
+        if any(dish_changes.values()):
+            changed = True
+    elif menu.type != old_type:
+        old_dishes = new_dishes = kitchen_production.menu_composition(menu_id)
+    
+    if changed:
+        # 按菜单组成和类型的变化增量调整厨房生产量
+        if dish_changes is not None or menu.type != old_type:
+            kitchen_production.apply_menu_change(menu_id, old_type, old_dishes, menu.type, new_dishes)
+        menu_cache.invalidate_menus([menu_id])
     
     db.session.commit()
-    return jsonify(menu.to_dict()), 200
+    
+    result = menu.to_dict()
+    if dish_changes is not None:
+        result['dish_changes'] = dish_changes
+    return jsonify(result), 200
 
 @menus_bp.route('/<int:menu_id>', methods=['DELETE'])
 @jwt_required()
@@ -124,6 +138,9 @@ def delete_menu(menu_id):
     if not menu:
         return jsonify({'error': '菜单不存在'}), 404
     
+    # 从厨房生产量中移除该菜单的菜品
+    kitchen_production.apply_menu_change(menu_id, menu.type, kitchen_production.menu_composition(menu_id), menu.type, {})
+    
     # 删除菜单菜品关联
     MenuDish.query.filter_by(menu_id=menu_id).delete()
     # 删除菜单客户关联
@@ -132,6 +149,7 @@ def delete_menu(menu_id):
     db.session.delete(menu)
     
     db.session.commit()
+    menu_cache.forget_menu(menu_id)
     return jsonify({'message': '菜单删除成功'}), 200
 
 @menus_bp.route('/<int:menu_id>/add-dish', methods=['POST'])
@@ -153,6 +171,10 @@ def add_dish_to_menu(menu_id):
     
     # 检查关联是否已存在
     existing = MenuDish.query.filter_by(menu_id=menu_id, dish_id=data['dish_id']).first()
+    old_quantity = (existing.quantity or 1) if existing else 0
+    kitchen_production.apply_menu_change(
+        menu_id, menu.type, {dish.id: old_quantity}, menu.type, {dish.id: data['quantity']}
+    )
     if existing:
         existing.quantity = data['quantity']
     else:
@@ -163,6 +185,7 @@ def add_dish_to_menu(menu_id):
         )
         db.session.add(menu_dish)
     
+    menu_cache.invalidate_menus([menu_id])
     db.session.commit()
     return jsonify({'message': '菜品添加成功'}), 200
 
@@ -173,6 +196,43 @@ def remove_dish_from_menu(menu_id, dish_id):
     if not menu_dish:
         return jsonify({'error': '菜品不在菜单中'}), 404
     
+    menu = Menu.query.get(menu_id)
+    kitchen_production.apply_menu_change(
+        menu_id, menu.type, {dish_id: menu_dish.quantity or 1}, menu.type, {}
+    )
+    
     db.session.delete(menu_dish)
+    menu_cache.invalidate_menus([menu_id])
     db.session.commit()
     return jsonify({'message': '菜品移除成功'}), 200
+
+@menus_bp.route('/import', methods=['POST'])
+@jwt_required()
+def import_menu_workbooks():
+    # 检查用户是否为管理员
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    if not user or user.role != 'admin':
+        return jsonify({'error': '无权限操作'}), 403
+    
+    # 上传一个或多个餐单工作簿（字段名 file），dry_run=1 时只返回差异
+    files = request.files.getlist('file')
+    if not files:
+        return jsonify({'error': '请上传餐单工作簿'}), 400
+    dry_run = request.args.get('dry_run', request.form.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+    
+    try:
+        summary = import_menus([f.stream for f in files], dry_run=dry_run)
+    except MenuImportError as e:
+        db.session.rollback()
+        return jsonify({'error': f'餐单导入失败：{e}'}), 400
+    
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+        # 导入可能批量新增菜品，直接重建索引
+        if summary['dishes_created']:
+            restriction_index.build()
+            search_index.build()
+    return jsonify(summary), 200
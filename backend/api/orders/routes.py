@@ -1,13 +1,39 @@
-from flask import request, jsonify
+import time
+from decimal import Decimal
+from flask import request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from .. import orders_bp
 from ...models.order import CustomerOrder, OrderItem
-from ...models.customer import Customer
-from ...models.employee import Employee
-from ...models.dish import Dish
-from ...models.menu import Menu
+from ...services.order_loader import load_order_detail, expand_orders
+from ...services.order_writer import validate_order_payload, bulk_insert_orders, build_order_rows, item_row
+from ...services.order_totals import adjust_order_total, recompute_order_total, get_order_total
+from ...services import order_events
+from ...services import kitchen_production
+from ...utils.pagination import encode_cursor, decode_cursor, keyset_filter, iter_keyset_chunks
+from ...utils.streaming import wants_ndjson, ndjson_response
+from ...utils.idempotency import idempotent
 from ... import db
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+ORDER_STREAM_CHUNK_SIZE = 500
+MAX_BULK_ORDERS = 1000
+# 事件流参数：每批最多推送的事件数、跨进程轮询间隔和心跳间隔（秒）
+STREAM_BATCH_SIZE = 200
+STREAM_POLL_INTERVAL = 1.0
+STREAM_HEARTBEAT_INTERVAL = 15
+
+def _serialize_orders(orders, expand_items):
+    if expand_items:
+        return expand_orders(orders)
+    return [order.to_dict() for order in orders]
+
+def _record_items_changed(order_id):
+    # 订单项变化时推送最新的总金额
+    total_amount = get_order_total(order_id)
+    order_events.record_order_event('updated', order_id, {'id': order_id, 'total_amount': total_amount})
+    return total_amount
+
 @orders_bp.route('', methods=['GET'])
 @jwt_required()
 def get_orders():
@@ -15,6 +41,11 @@ def get_orders():
     order_type = request.args.get('order_type')
     status = request.args.get('status')
     customer_id = request.args.get('customer_id', type=int)
+    # expand=items 时在每个订单中嵌入订单项详情
+    expand_items = 'items' in request.args.get('expand', '').split(',')
+    # 游标分页参数：按 (order_date, id) 升序
+    limit = request.args.get('limit', type=int)
+    after = request.args.get('after')
     
     query = CustomerOrder.query
     
@@ -25,8 +56,79 @@ def get_orders():
     if customer_id:
         query = query.filter_by(customer_id=customer_id)
     
-    orders = query.all()
-    return jsonify([order.to_dict() for order in orders]), 200
+    if after:
+        cursor = decode_cursor(after)
+        if not cursor:
+            return jsonify({'error': '无效的分页游标'}), 400
+        query = keyset_filter(query, CustomerOrder.order_date, CustomerOrder.id, cursor)
+    query = query.order_by(CustomerOrder.order_date, CustomerOrder.id)
+    
+    # NDJSON 流式模式：使用服务端游标分批读取，内存占用恒定
+    if wants_ndjson():
+        if expand_items:
+            # 展开模式需要在块之间查询订单项，改为按键集逐块读取
+            chunks = iter_keyset_chunks(query, CustomerOrder.order_date, CustomerOrder.id,
+                                        ORDER_STREAM_CHUNK_SIZE, limit)
+            return ndjson_response(order for chunk in chunks for order in expand_orders(chunk))
+        if limit:
+            query = query.limit(limit)
+        query = query.execution_options(stream_results=True).yield_per(ORDER_STREAM_CHUNK_SIZE)
+        return ndjson_response(order.to_dict() for order in query)
+    
+    # 未指定分页参数时保持原有的完整列表返回
+    if not limit and not after:
+        orders = query.all()
+        return jsonify(_serialize_orders(orders, expand_items)), 200
+    
+    limit = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    # 多取一条用于判断是否还有下一页
+    orders = query.limit(limit + 1).all()
+    has_more = len(orders) > limit
+    orders = orders[:limit]
+    next_cursor = encode_cursor(orders[-1].order_date, orders[-1].id) if has_more else None
+    
+    return jsonify({
+        'orders': _serialize_orders(orders, expand_items),
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }), 200
+
+@orders_bp.route('/stream', methods=['GET'])
+@jwt_required()
+def stream_order_events():
+    # 支持通过 since 参数或 Last-Event-ID 头从指定事件之后重放
+    since = request.args.get('since', type=int)
+    if since is None:
+        since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = order_events.latest_event_id()
+    
+    def generate():
+        reader = order_events.EventReader(since)
+        last_sent = time.monotonic()
+        yield 'retry: 3000\n\n'
+        while True:
+            generation = order_events.current_generation()
+            late, events = reader.read(STREAM_BATCH_SIZE)
+            # 结束本次只读事务，下一次查询才能看到其他连接新提交的事件
+            db.session.rollback()
+            for event in late:
+                yield order_events.format_sse(event, with_id=False)
+            for event in events:
+                yield order_events.format_sse(event)
+            if late or events:
+                last_sent = time.monotonic()
+                if len(events) == STREAM_BATCH_SIZE:
+                    continue
+            elif time.monotonic() - last_sent >= STREAM_HEARTBEAT_INTERVAL:
+                last_sent = time.monotonic()
+                yield ': keep-alive\n\n'
+            order_events.wait_for_events(generation, STREAM_POLL_INTERVAL)
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @orders_bp.route('/<int:order_id>', methods=['GET'])
 @jwt_required()
@@ -35,89 +137,65 @@ def get_order(order_id):
     if not order:
         return jsonify({'error': '订单不存在'}), 404
     
-    # 获取订单包含的项目
-    order_items = OrderItem.query.filter_by(order_id=order_id).all()
-    
-    # 获取项目详细信息
-    items_with_details = []
-    for item in order_items:
-        item_dict = item.to_dict()
-        # 根据项目类型获取详细信息
-        if item.item_type == 'dish':
-            dish = Dish.query.get(item.item_id)
-            if dish:
-                item_dict['details'] = dish.to_dict()
-        elif item.item_type == 'menu':
-            menu = Menu.query.get(item.item_id)
-            if menu:
-                item_dict['details'] = menu.to_dict()
-        elif item.item_type == 'service':
-            # 服务项目的详细信息可以从其他表获取
-            pass
-        items_with_details.append(item_dict)
-    
-    # 获取客户信息
-    customer = Customer.query.get(order.customer_id)
-    # 获取服务员工信息
-    employee = Employee.query.get(order.service_employee_id)
-    
-    return jsonify({
-        'order': order.to_dict(),
-        'items': items_with_details,
-        'customer': customer.to_dict() if customer else None,
-        'employee': employee.to_dict() if employee else None
-    }), 200
+    # 批量加载订单项详情、客户和服务员工信息
+    return jsonify(load_order_detail(order)), 200
 
 @orders_bp.route('', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_order():
     data = request.get_json()
-    if not data or not data.get('customer_id') or not data.get('order_type') or not data.get('items'):
-        return jsonify({'error': '请提供客户ID、订单类型和订单项目'}), 400
-    
-    # 计算总金额
-    total_amount = 0
-    for item in data['items']:
-        if 'subtotal' in item:
-            total_amount += item['subtotal']
-    
-    order = CustomerOrder(
-        customer_id=data['customer_id'],
-        order_type=data['order_type'],
-        total_amount=total_amount,
-        delivery_date=data.get('delivery_date'),
-        start_time=data.get('start_time'),
-        end_time=data.get('end_time'),
-        duration=data.get('duration'),
-        payment_method=data.get('payment_method'),
-        booker_name=data.get('booker_name'),
-        booker_role=data.get('booker_role'),
-        service_employee_id=data.get('service_employee_id'),
-        delivery_address=data.get('delivery_address'),
-        notes=data.get('notes')
-    )
+    error = validate_order_payload(data)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    # 数量、单价和小计统一为 Decimal，格式错误时返回 400
+    try:
+        order_row, item_rows = build_order_rows(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # 日期和时间已转换为 date/time，提交前生成事件摘要时 to_dict 才能格式化
+    order = CustomerOrder(**order_row)
     
     db.session.add(order)
     db.session.flush()  # 获取订单ID但不提交事务
     
     # 添加订单项
-    for item in data['items']:
-        if not item.get('item_type') or not item.get('item_id') or not item.get('quantity') or not item.get('unit_price'):
-            return jsonify({'error': '订单项信息不完整'}), 400
-        
-        order_item = OrderItem(
-            order_id=order.id,
-            item_type=item['item_type'],
-            item_id=item['item_id'],
-            quantity=item['quantity'],
-            unit_price=item['unit_price'],
-            subtotal=item.get('subtotal', item['quantity'] * item['unit_price'])
-        )
-        db.session.add(order_item)
+    for row in item_rows:
+        db.session.add(OrderItem(order_id=order.id, **row))
     
+    # 计入厨房生产量
+    kitchen_production.apply_order_lines(
+        (order.delivery_date, row['item_type'], row['item_id'], row['quantity']) for row in item_rows
+    )
+    order_events.record_order_event('created', order.id, order_events.order_payload(order.to_dict()))
     db.session.commit()
+    order_events.notify_subscribers()
     return jsonify(order.to_dict()), 201
 
+@orders_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+@idempotent
+def bulk_create_orders():
+    data = request.get_json()
+    if not data or not isinstance(data.get('orders'), list) or not data['orders']:
+        return jsonify({'error': '请提供订单列表'}), 400
+    if len(data['orders']) > MAX_BULK_ORDERS:
+        return jsonify({'error': f'单次最多创建{MAX_BULK_ORDERS}个订单'}), 400
+    
+    # 全部校验后在同一事务中批量写入，逐单返回订单ID或错误信息
+    results = bulk_insert_orders(data['orders'])
+    db.session.commit()
+    order_events.notify_subscribers()
+    
+    created = sum(1 for result in results if 'id' in result)
+    return jsonify({
+        'results': results,
+        'created': created,
+        'failed': len(results) - created
+    }), 201 if created else 400
+
 @orders_bp.route('/<int:order_id>', methods=['PUT'])
 @jwt_required()
 def update_order(order_id):
@@ -126,13 +204,22 @@ def update_order(order_id):
     if not order:
         return jsonify({'error': '订单不存在'}), 404
     
+    was_cancelled = order.status == 'cancelled'
+    
     # 更新订单信息
     updateable_fields = ['status', 'payment_status', 'payment_method', 'service_employee_id', 'notes', 'rating', 'feedback']
     for field in updateable_fields:
         if field in data:
             setattr(order, field, data[field])
     
+    # 订单取消或恢复时同步调整厨房生产量
+    is_cancelled = order.status == 'cancelled'
+    if is_cancelled != was_cancelled:
+        kitchen_production.apply_orders([order.id], -1 if is_cancelled else 1)
+    
+    order_events.record_order_event('updated', order.id, order_events.order_payload(order.to_dict()))
     db.session.commit()
+    order_events.notify_subscribers()
     return jsonify(order.to_dict()), 200
 
 @orders_bp.route('/<int:order_id>', methods=['DELETE'])
@@ -146,12 +233,18 @@ def delete_order(order_id):
     if order.status == 'completed':
         return jsonify({'error': '已完成的订单不能删除'}), 400
     
+    # 从厨房生产量中移除
+    if order.status != 'cancelled':
+        kitchen_production.apply_orders([order_id], -1)
+    
     # 删除订单项
     OrderItem.query.filter_by(order_id=order_id).delete()
     # 删除订单
     db.session.delete(order)
     
+    order_events.record_order_event('deleted', order_id)
     db.session.commit()
+    order_events.notify_subscribers()
     return jsonify({'message': '订单删除成功'}), 200
 
 @orders_bp.route('/<int:order_id>/items', methods=['POST'])
@@ -180,10 +273,16 @@ def add_order_item(order_id):
     )
     db.session.add(order_item)
     
-    # 更新订单总金额
-    order.total_amount += subtotal
+    # 在数据库端原子地更新订单总金额
+    adjust_order_total(order_id, subtotal)
     
+    if order.status != 'cancelled':
+        kitchen_production.apply_order_lines(
+            [(order.delivery_date, data['item_type'], data['item_id'], data['quantity'])]
+        )
+    _record_items_changed(order_id)
     db.session.commit()
+    order_events.notify_subscribers()
     return jsonify({'message': '项目添加成功'}), 200
 
 @orders_bp.route('/<int:order_id>/items/<int:item_id>', methods=['DELETE'])
@@ -193,19 +292,95 @@ def remove_order_item(order_id, item_id):
     if not order_item:
         return jsonify({'error': '订单项不存在'}), 404
     
-    # 更新订单总金额
+    # 删除订单项，仅当本次确实删除了该行时才扣减总金额，避免并发重复扣减
+    deleted = OrderItem.query.filter_by(order_id=order_id, id=item_id).delete(synchronize_session=False)
+    if deleted:
+        adjust_order_total(order_id, -order_item.subtotal)
+        order = CustomerOrder.query.get(order_id)
+        if order and order.status != 'cancelled':
+            kitchen_production.apply_order_lines(
+                [(order.delivery_date, order_item.item_type, order_item.item_id, order_item.quantity)], -1
+            )
+        _record_items_changed(order_id)
+    
+    db.session.commit()
+    order_events.notify_subscribers()
+    return jsonify({'message': '项目移除成功'}), 200
+
+@orders_bp.route('/<int:order_id>/items/batch', methods=['POST'])
+@jwt_required()
+def batch_update_order_items(order_id):
+    data = request.get_json()
+    if not data or (not data.get('add') and not data.get('remove')):
+        return jsonify({'error': '请提供要添加或移除的订单项'}), 400
+    
+    add_items = data.get('add') or []
+    remove_ids = data.get('remove') or []
+    if not isinstance(add_items, list) or not isinstance(remove_ids, list):
+        return jsonify({'error': 'add 和 remove 必须为列表'}), 400
+    for item in add_items:
+        if not isinstance(item, dict) or not item.get('item_type') or not item.get('item_id') \
+                or not item.get('quantity') or not item.get('unit_price'):
+            return jsonify({'error': '订单项信息不完整'}), 400
+    # 数量、单价和小计统一为 Decimal，与已有订单项的小计相加时不会混用 float
+    try:
+        add_rows = [item_row(item) for item in add_items]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     order = CustomerOrder.query.get(order_id)
-    if order:
-        order.total_amount -= order_item.subtotal
+    if not order:
+        return jsonify({'error': '订单不存在'}), 404
+    counts_for_kitchen = order.status != 'cancelled'
     
-    # 删除订单项
-    db.session.delete(order_item)
+    delta = Decimal('0')
     
+    # 锁定要移除的订单项，确保每个订单项的小计只被扣减一次
+    removed_ids = []
+    if remove_ids:
+        removed = db.session.query(OrderItem.id, OrderItem.subtotal, OrderItem.item_type,
+                                   OrderItem.item_id, OrderItem.quantity) \
+            .filter(OrderItem.order_id == order_id, OrderItem.id.in_(remove_ids)) \
+            .with_for_update() \
+            .all()
+        removed_ids = [row.id for row in removed]
+        if removed_ids:
+            OrderItem.query.filter(OrderItem.id.in_(removed_ids)).delete(synchronize_session=False)
+            delta -= sum(row.subtotal for row in removed)
+            if counts_for_kitchen:
+                kitchen_production.apply_order_lines(
+                    [(order.delivery_date, row.item_type, row.item_id, row.quantity) for row in removed], -1
+                )
+    
+    # 新订单项一次 executemany 写入
+    if add_rows:
+        rows = [dict(row, order_id=order_id) for row in add_rows]
+        db.session.execute(OrderItem.__table__.insert(), rows)
+        delta += sum(row['subtotal'] for row in rows)
+        if counts_for_kitchen:
+            kitchen_production.apply_order_lines(
+                [(order.delivery_date, row['item_type'], row['item_id'], row['quantity']) for row in rows]
+            )
+    
+    # 整批只调整一次总金额
+    if data.get('recompute'):
+        recompute_order_total(order_id)
+    else:
+        adjust_order_total(order_id, delta)
+    
+    total_amount = _record_items_changed(order_id)
     db.session.commit()
-    return jsonify({'message': '项目移除成功'}), 200
+    order_events.notify_subscribers()
+    return jsonify({
+        'message': '订单项更新成功',
+        'added': len(add_items),
+        'removed': removed_ids,
+        'total_amount': total_amount
+    }), 200
 
 @orders_bp.route('/<int:order_id>/pay', methods=['POST'])
 @jwt_required()
+@idempotent
 def pay_order(order_id):
     data = request.get_json()
     if not data or not data.get('payment_method'):
@@ -225,5 +400,7 @@ def pay_order(order_id):
     # 这里可以集成第三方支付API
     # 例如：调用微信支付、支付宝等API
     
+    order_events.record_order_event('paid', order.id, order_events.order_payload(order.to_dict()))
     db.session.commit()
+    order_events.notify_subscribers()
     return jsonify({'message': '支付成功'}), 200
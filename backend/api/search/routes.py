@@ -0,0 +1,37 @@
+import time
+from flask import request, jsonify
+from flask_jwt_extended import jwt_required
+from .. import search_bp
+from ...services.search_index import search_index, SEARCH_SOURCES
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+@search_bp.route('', methods=['GET'])
+@jwt_required()
+def search():
+    # q 为搜索词，types 为逗号分隔的类型（dish/ingredient/supplier），默认全部
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': '请提供搜索关键词'}), 400
+    
+    doc_types = None
+    if request.args.get('types'):
+        doc_types = {doc_type.strip() for doc_type in request.args['types'].split(',') if doc_type.strip()}
+        unknown = doc_types - set(SEARCH_SOURCES)
+        if unknown:
+            return jsonify({'error': f'不支持的搜索类型：{",".join(sorted(unknown))}'}), 400
+    
+    limit = request.args.get('limit', DEFAULT_SEARCH_LIMIT, type=int)
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+    
+    started = time.perf_counter()
+    search_index.ensure_fresh()
+    results, total = search_index.search(query, doc_types, limit)
+    
+    return jsonify({
+        'query': query,
+        'results': results,
+        'total': total,
+        'took_ms': round((time.perf_counter() - started) * 1000, 2)
+    }), 200
@@ -1,12 +1,31 @@
 from flask import request, jsonify
-from flask_jwt_extended import jwt_required
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from .. import suppliers_bp
-from ...models.supplier import Supplier
+from ...models.supplier import Supplier, SupplierScore
+from ...models.user import User
+from ...services.search_index import search_index
+from ...services.supplier_prices import price_index, rebuild_price_history, DEFAULT_RECENT_DAYS, DEFAULT_ALERT_PCT
+from ...services.supplier_scores import rebuild_scores
 from ... import db
 
 @suppliers_bp.route('', methods=['GET'])
 @jwt_required()
 def get_suppliers():
+    # sort=score 按供应商评分排序：沿评分索引读取已评分的供应商，未评分的排在最后
+    if request.args.get('sort') == 'score':
+        scored = db.session.query(Supplier, SupplierScore) \
+            .join(SupplierScore, SupplierScore.supplier_id == Supplier.id) \
+            .filter(SupplierScore.score.isnot(None)) \
+            .order_by(SupplierScore.score.desc(), Supplier.id) \
+            .all()
+        unscored = Supplier.query \
+            .outerjoin(SupplierScore, SupplierScore.supplier_id == Supplier.id) \
+            .filter(SupplierScore.score.is_(None)) \
+            .order_by(Supplier.id) \
+            .all()
+        return jsonify([dict(supplier.to_dict(), score=score.to_dict()) for supplier, score in scored] +
+                       [dict(supplier.to_dict(), score=None) for supplier in unscored]), 200
+    
     # 支持按评分排序
     sort_by_rating = request.args.get('sort_by_rating', type=bool)
     
@@ -18,6 +37,53 @@ def get_suppliers():
     suppliers = query.all()
     return jsonify([supplier.to_dict() for supplier in suppliers]), 200
 
+@suppliers_bp.route('/price-index', methods=['GET'])
+@jwt_required()
+def get_price_index():
+    # ingredient_id=1 或 ingredient_ids=1,2,3 查询食材的最低价供应商和价格走势；不指定时只返回涨跌幅告警
+    try:
+        if request.args.get('ingredient_ids'):
+            ingredient_ids = [int(item_id) for item_id in request.args['ingredient_ids'].split(',') if item_id.strip()]
+        elif request.args.get('ingredient_id'):
+            ingredient_ids = [int(request.args['ingredient_id'])]
+        else:
+            ingredient_ids = None
+    except ValueError:
+        return jsonify({'error': 'ID格式错误'}), 400
+    
+    days = request.args.get('days', DEFAULT_RECENT_DAYS, type=int)
+    alert_pct = request.args.get('alert_pct', DEFAULT_ALERT_PCT, type=float)
+    if days <= 0 or alert_pct < 0:
+        return jsonify({'error': '参数错误'}), 400
+    
+    return jsonify(price_index(ingredient_ids, days=days, alert_pct=alert_pct)), 200
+
+@suppliers_bp.route('/price-index/rebuild', methods=['POST'])
+@jwt_required()
+def rebuild_price_index():
+    # 检查用户是否为管理员
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    if not user or user.role != 'admin':
+        return jsonify({'error': '无权限操作'}), 403
+    
+    count = rebuild_price_history()
+    db.session.commit()
+    return jsonify({'message': '价格索引已重建', 'count': count}), 200
+
+@suppliers_bp.route('/scores/rebuild', methods=['POST'])
+@jwt_required()
+def rebuild_supplier_scores():
+    # 检查用户是否为管理员
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    if not user or user.role != 'admin':
+        return jsonify({'error': '无权限操作'}), 403
+    
+    count = rebuild_scores()
+    db.session.commit()
+    return jsonify({'message': '供应商评分已重建', 'count': count}), 200
+
 @suppliers_bp.route('/<int:supplier_id>', methods=['GET'])
 @jwt_required()
 def get_supplier(supplier_id):
@@ -29,9 +95,12 @@ def get_supplier(supplier_id):
     from ...models.ingredient import Ingredient
     ingredients = Ingredient.query.filter_by(supplier_id=supplier_id).all()
     
+    score = SupplierScore.query.get(supplier_id)
+    
     return jsonify({
         'supplier': supplier.to_dict(),
-        'ingredients': [ingredient.to_dict() for ingredient in ingredients]
+        'ingredients': [ingredient.to_dict() for ingredient in ingredients],
+        'score': score.to_dict() if score else None
     }), 200
 
 @suppliers_bp.route('', methods=['POST'])
@@ -52,6 +121,7 @@ def create_supplier():
     
     db.session.add(supplier)
     db.session.commit()
+    search_index.update('supplier', supplier)
     return jsonify(supplier.to_dict()), 201
 
 @suppliers_bp.route('/<int:supplier_id>', methods=['PUT'])
@@ -68,6 +138,7 @@ def update_supplier(supplier_id):
             setattr(supplier, key, value)
     
     db.session.commit()
+    search_index.update('supplier', supplier)
     return jsonify(supplier.to_dict()), 200
 
 @suppliers_bp.route('/<int:supplier_id>', methods=['DELETE'])
@@ -85,4 +156,5 @@ def delete_supplier(supplier_id):
     
     db.session.delete(supplier)
     db.session.commit()
+    search_index.remove('supplier', supplier_id)
     return jsonify({'message': '供应商删除成功'}), 200
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+餐单导入脚本
+将基础餐单和每日厨房餐单工作簿批量导入菜品、菜单和菜单菜品表
+"""
+
+import argparse
+import json
+import os
+
+from app import app, db
+from services.menu_importer import import_menus
+
+# 默认导入项目根目录下的两个餐单工作簿
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_WORKBOOKS = [
+    os.path.join(ROOT_DIR, '基础餐单2025.xlsx'),
+    os.path.join(ROOT_DIR, '每日厨房餐单2025.xlsx')
+]
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='导入餐单工作簿')
+    parser.add_argument('workbooks', nargs='*', default=DEFAULT_WORKBOOKS, help='工作簿路径')
+    parser.add_argument('--dry-run', action='store_true', help='只显示差异，不写入数据库')
+    args = parser.parse_args()
+    
+    with app.app_context():
+        try:
+            summary = import_menus(args.workbooks, dry_run=args.dry_run)
+            if args.dry_run:
+                db.session.rollback()
+            else:
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    print(f"读取菜单 {summary['menus_read']} 个，新增菜品 {len(summary['dishes_created'])} 个，"
+          f"新增菜单 {len(summary['menus_created'])} 个，更新菜单 {len(summary['menus_updated'])} 个")
+
+if __name__ == "__main__":
+    main()
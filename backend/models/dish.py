@@ -13,6 +13,7 @@ class Dish(db.Model):
     calories = db.Column(db.Integer)  # 卡路里
     price = db.Column(db.Decimal(10, 2))  # 价格
     status = db.Column(db.String(20), default='active')  # active/inactive
+    image_hash = db.Column(db.String(64))  # 图片内容哈希，见 /api/media
     
     def __repr__(self):
         return f'<Dish {self.name}>'
@@ -27,5 +28,32 @@ class Dish(db.Model):
             'restrictions': self.restrictions,
             'calories': self.calories,
             'price': self.price,
-            'status': self.status
+            'status': self.status,
+            'image_url': f'/api/media/{self.image_hash}' if self.image_hash else None,
+            'thumbnail_url': f'/api/media/{self.image_hash}?w=320' if self.image_hash else None
+        }
+
+class DishIngredient(db.Model):
+    __tablename__ = 'dish_ingredients'
+    __table_args__ = (
+        db.UniqueConstraint('dish_id', 'ingredient_id', name='uq_dish_ingredients_dish_ingredient'),
+        db.Index('idx_dish_ingredients_ingredient', 'ingredient_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    dish_id = db.Column(db.Integer, db.ForeignKey('dishes.id'), nullable=False)
+    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredients.id'), nullable=False)
+    quantity = db.Column(db.Decimal(10, 3), nullable=False)  # 每份用量
+    unit = db.Column(db.String(20))  # 用量单位，为空时与食材单位相同
+    
+    def __repr__(self):
+        return f'<DishIngredient dish_id={self.dish_id} ingredient_id={self.ingredient_id}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'dish_id': self.dish_id,
+            'ingredient_id': self.ingredient_id,
+            'quantity': self.quantity,
+            'unit': self.unit
         }
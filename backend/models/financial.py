@@ -5,19 +5,57 @@ class Transaction(db.Model):
     __tablename__ = 'transactions'
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    type = db.Column(db.String(20), nullable=False)  # income/expense
-    category = db.Column(db.String(50), nullable=False)
-    amount = db.Column(db.Decimal(10, 2), nullable=False)
+    # 计入收支汇总的字段在修改前加载旧值（active_history），未加载就被修改时汇总也能扣除旧值
+    type = db.column_property(db.Column(db.String(20), nullable=False), active_history=True)  # income/expense
+    category = db.column_property(db.Column(db.String(50), nullable=False), active_history=True)
+    amount = db.column_property(db.Column(db.Decimal(10, 2), nullable=False), active_history=True)
     description = db.Column(db.Text)
-    transaction_date = db.Column(db.DateTime, default=datetime.utcnow)
-    payment_method = db.Column(db.String(20))  # wechat/alipay/bank/cash
-    status = db.Column(db.String(20), default='completed')  # pending/completed/cancelled
+    transaction_date = db.column_property(db.Column(db.DateTime, default=datetime.utcnow), active_history=True)
+    payment_method = db.column_property(db.Column(db.String(20)), active_history=True)  # wechat/alipay/bank/cash
+    status = db.column_property(db.Column(db.String(20), default='completed'), active_history=True)  # pending/completed/cancelled
     related_id = db.Column(db.Integer)  # 关联ID（客户ID/员工ID/供应商ID）
     related_type = db.Column(db.String(20))  # 关联类型（customer/employee/supplier）
     
     def __repr__(self):
         return f'<Transaction {self.id} {self.type}>'
 
+class TransactionDailyRollup(db.Model):
+    __tablename__ = 'transaction_daily_rollups'
+    __table_args__ = (
+        # 唯一键同时用于按日期范围读取
+        db.UniqueConstraint('period_start', 'type', 'category', 'payment_method',
+                            name='uq_transaction_daily_rollups_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    period_start = db.Column(db.Date, nullable=False)  # 日期
+    type = db.Column(db.String(20), nullable=False)  # income/expense
+    category = db.Column(db.String(50), nullable=False)
+    payment_method = db.Column(db.String(20), nullable=False, default='')  # 未指定支付方式时为空字符串
+    total_amount = db.Column(db.Decimal(14, 2), nullable=False, default=0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<TransactionDailyRollup {self.period_start} {self.type} {self.category}>'
+
+class TransactionMonthlyRollup(db.Model):
+    __tablename__ = 'transaction_monthly_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('period_start', 'type', 'category', 'payment_method',
+                            name='uq_transaction_monthly_rollups_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    period_start = db.Column(db.Date, nullable=False)  # 月份第一天
+    type = db.Column(db.String(20), nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+    payment_method = db.Column(db.String(20), nullable=False, default='')
+    total_amount = db.Column(db.Decimal(14, 2), nullable=False, default=0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<TransactionMonthlyRollup {self.period_start} {self.type} {self.category}>'
+
 class Attendance(db.Model):
     __tablename__ = 'attendance'
     
@@ -73,8 +111,10 @@ class PurchaseOrder(db.Model):
     order_date = db.Column(db.Date, nullable=False)
     expected_delivery = db.Column(db.Date)  # 预计送达日期
     total_amount = db.Column(db.Decimal(10, 2), nullable=False)
-    status = db.Column(db.String(20), default='pending')  # pending/delivered/cancelled
+    status = db.Column(db.String(20), default='pending')  # pending/partially_received/delivered/cancelled
     transaction_id = db.Column(db.Integer, db.ForeignKey('transactions.id'))
+    notes = db.Column(db.Text)  # 备注
+    delivered_at = db.Column(db.DateTime)  # 全部到货时间
     
     def __repr__(self):
         return f'<PurchaseOrder {self.id} supplier_id={self.supplier_id}>'
@@ -88,6 +128,7 @@ class PurchaseOrderItem(db.Model):
     quantity = db.Column(db.Decimal(10, 2), nullable=False)
     unit_price = db.Column(db.Decimal(10, 2), nullable=False)
     subtotal = db.Column(db.Decimal(10, 2), nullable=False)
+    received_quantity = db.Column(db.Decimal(10, 2), nullable=False, default=0)  # 已入库数量
     
     def __repr__(self):
         return f'<PurchaseOrderItem order_id={self.order_id} ingredient_id={self.ingredient_id}>'
@@ -1,5 +1,6 @@
 from app import db
 from datetime import datetime
+import json
 
 class Ingredient(db.Model):
     __tablename__ = 'ingredients'
@@ -18,6 +19,7 @@ class Ingredient(db.Model):
     restrictions = db.Column(db.Text)  # 禁忌信息
     purchaser = db.Column(db.String(50))  # 购买人
     origin = db.Column(db.Text)  # 食材溯源
+    image_hash = db.Column(db.String(64))  # 图片内容哈希，见 /api/media
     
     def __repr__(self):
         return f'<Ingredient {self.name}>'
@@ -37,5 +39,104 @@ class Ingredient(db.Model):
             'calories': self.calories,
             'restrictions': self.restrictions,
             'purchaser': self.purchaser,
-            'origin': self.origin
+            'origin': self.origin,
+            'image_url': f'/api/media/{self.image_hash}' if self.image_hash else None,
+            'thumbnail_url': f'/api/media/{self.image_hash}?w=320' if self.image_hash else None
+        }
+
+class StockMovement(db.Model):
+    __tablename__ = 'stock_movements'
+    __table_args__ = (
+        db.Index('idx_stock_movements_ingredient_id', 'ingredient_id', 'id'),
+    )
+    
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredients.id'), nullable=False)
+    movement_type = db.Column(db.String(10), nullable=False)  # in/out
+    quantity = db.Column(db.Decimal(10, 2), nullable=False)
+    balance_after = db.Column(db.Decimal(10, 2), nullable=False)  # 变动后库存
+    reference = db.Column(db.String(50))  # 来源单据，如 purchase_order:12
+    operator_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<StockMovement ingredient_id={self.ingredient_id} {self.movement_type} {self.quantity}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'ingredient_id': self.ingredient_id,
+            'movement_type': self.movement_type,
+            'quantity': self.quantity,
+            'balance_after': self.balance_after,
+            'reference': self.reference,
+            'operator_id': self.operator_id,
+            'notes': self.notes,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class IngredientLot(db.Model):
+    __tablename__ = 'ingredient_lots'
+    __table_args__ = (
+        # 先到期先出：按 (食材, 保质期) 顺序读取批次
+        db.Index('idx_ingredient_lots_fefo', 'ingredient_id', 'expiry_date', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredients.id'), nullable=False)
+    lot_number = db.Column(db.String(50))  # 批号
+    purchase_order_id = db.Column(db.Integer, db.ForeignKey('purchase_orders.id'))
+    quantity_received = db.Column(db.Decimal(10, 2), nullable=False)
+    quantity_remaining = db.Column(db.Decimal(10, 2), nullable=False)
+    expiry_date = db.Column(db.Date)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<IngredientLot {self.id} ingredient_id={self.ingredient_id}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'ingredient_id': self.ingredient_id,
+            'lot_number': self.lot_number,
+            'purchase_order_id': self.purchase_order_id,
+            'quantity_received': self.quantity_received,
+            'quantity_remaining': self.quantity_remaining,
+            'expiry_date': self.expiry_date.isoformat() if self.expiry_date else None,
+            'received_at': self.received_at.isoformat() if self.received_at else None
+        }
+
+class IngredientForecast(db.Model):
+    __tablename__ = 'ingredient_forecasts'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredients.id'), nullable=False, unique=True)
+    daily_rate = db.Column(db.Decimal(12, 3), nullable=False)  # 近期日均用量（指数加权）
+    demand_std = db.Column(db.Decimal(12, 3), nullable=False)  # 近期日用量标准差
+    weekday_factors = db.Column(db.Text)  # 周一至周日的季节系数（JSON）
+    lead_time_days = db.Column(db.Integer, nullable=False)  # 采购提前期
+    lead_time_demand = db.Column(db.Decimal(12, 3), nullable=False)  # 提前期内预计用量
+    safety_stock = db.Column(db.Decimal(12, 3), nullable=False)  # 安全库存
+    suggested_minimum_stock = db.Column(db.Decimal(10, 2), nullable=False)  # 建议最低库存（再订货点）
+    reorder_quantity = db.Column(db.Decimal(10, 2), nullable=False)  # 建议采购量
+    history_days = db.Column(db.Integer, nullable=False)  # 参与计算的历史天数
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<IngredientForecast ingredient_id={self.ingredient_id}>'
+    
+    def to_dict(self):
+        return {
+            'ingredient_id': self.ingredient_id,
+            'daily_rate': self.daily_rate,
+            'demand_std': self.demand_std,
+            'weekday_factors': json.loads(self.weekday_factors) if self.weekday_factors else None,
+            'lead_time_days': self.lead_time_days,
+            'lead_time_demand': self.lead_time_demand,
+            'safety_stock': self.safety_stock,
+            'suggested_minimum_stock': self.suggested_minimum_stock,
+            'reorder_quantity': self.reorder_quantity,
+            'history_days': self.history_days,
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None
         }
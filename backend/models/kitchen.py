@@ -0,0 +1,27 @@
+from app import db
+from datetime import datetime
+
+class KitchenProduction(db.Model):
+    __tablename__ = 'kitchen_production'
+    __table_args__ = (
+        db.UniqueConstraint('delivery_date', 'dish_id', 'menu_type', name='uq_kitchen_production_date_dish_type'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    delivery_date = db.Column(db.Date, nullable=False)
+    dish_id = db.Column(db.Integer, db.ForeignKey('dishes.id'), nullable=False)
+    menu_type = db.Column(db.String(20), nullable=False)  # breakfast/lunch/dinner/a_la_carte
+    quantity = db.Column(db.Integer, nullable=False, default=0)  # 需制作份数
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<KitchenProduction {self.delivery_date} dish_id={self.dish_id} {self.menu_type}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'delivery_date': self.delivery_date.isoformat() if self.delivery_date else None,
+            'dish_id': self.dish_id,
+            'menu_type': self.menu_type,
+            'quantity': self.quantity
+        }
@@ -11,6 +11,7 @@ class Menu(db.Model):
     price = db.Column(db.Decimal(10, 2))
     status = db.Column(db.String(20), default='active')  # active/inactive
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1)  # 缓存版本号，菜单或其菜品变化时递增
     
     def __repr__(self):
         return f'<Menu {self.name}>'
@@ -3,6 +3,9 @@ from datetime import datetime
 
 class CustomerOrder(db.Model):
     __tablename__ = 'customer_orders'
+    __table_args__ = (
+        db.Index('idx_customer_orders_date_id', 'order_date', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'))
@@ -76,3 +79,24 @@ class OrderItem(db.Model):
             'unit_price': self.unit_price,
             'subtotal': self.subtotal
         }
+
+class OrderEvent(db.Model):
+    __tablename__ = 'order_events'
+    
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    order_id = db.Column(db.Integer, nullable=False, index=True)
+    event_type = db.Column(db.String(20), nullable=False)  # created/updated/paid/deleted
+    payload = db.Column(db.Text)  # 订单摘要（JSON）
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<OrderEvent {self.id} {self.event_type} order_id={self.order_id}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'order_id': self.order_id,
+            'event_type': self.event_type,
+            'payload': self.payload,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
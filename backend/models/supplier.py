@@ -25,3 +25,98 @@ class Supplier(db.Model):
             'products': self.products,
             'rating': self.rating
         }
+
+class SupplierPrice(db.Model):
+    __tablename__ = 'supplier_prices'
+    __table_args__ = (
+        db.Index('idx_supplier_prices_ingredient_date', 'ingredient_id', 'observed_on'),
+        db.Index('idx_supplier_prices_date', 'observed_on'),
+    )
+    
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'), nullable=False)
+    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredients.id'), nullable=False)
+    unit_price = db.Column(db.Decimal(10, 2), nullable=False)
+    previous_price = db.Column(db.Decimal(10, 2))  # 该供应商此前的价格
+    change_pct = db.Column(db.Decimal(8, 2))  # 相对此前价格的涨跌幅（%）
+    observed_on = db.Column(db.Date, nullable=False)  # 采购单日期
+    purchase_order_id = db.Column(db.Integer, db.ForeignKey('purchase_orders.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SupplierPrice supplier_id={self.supplier_id} ingredient_id={self.ingredient_id}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'supplier_id': self.supplier_id,
+            'ingredient_id': self.ingredient_id,
+            'unit_price': self.unit_price,
+            'previous_price': self.previous_price,
+            'change_pct': self.change_pct,
+            'observed_on': self.observed_on.isoformat() if self.observed_on else None,
+            'purchase_order_id': self.purchase_order_id
+        }
+
+class SupplierCurrentPrice(db.Model):
+    __tablename__ = 'supplier_current_prices'
+    __table_args__ = (
+        db.UniqueConstraint('supplier_id', 'ingredient_id', name='uq_supplier_current_prices_supplier_ingredient'),
+        # 按食材取最低价供应商
+        db.Index('idx_supplier_current_prices_ingredient_price', 'ingredient_id', 'unit_price'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'), nullable=False)
+    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredients.id'), nullable=False)
+    unit_price = db.Column(db.Decimal(10, 2), nullable=False)
+    observed_on = db.Column(db.Date, nullable=False)
+    
+    def __repr__(self):
+        return f'<SupplierCurrentPrice supplier_id={self.supplier_id} ingredient_id={self.ingredient_id}>'
+    
+    def to_dict(self):
+        return {
+            'supplier_id': self.supplier_id,
+            'ingredient_id': self.ingredient_id,
+            'unit_price': self.unit_price,
+            'observed_on': self.observed_on.isoformat() if self.observed_on else None
+        }
+
+class SupplierScore(db.Model):
+    __tablename__ = 'supplier_scores'
+    __table_args__ = (
+        # 按评分排序读取供应商
+        db.Index('idx_supplier_scores_score', 'score'),
+    )
+    
+    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'), primary_key=True)
+    # 累计计数，收货和价格变动时按增量累加
+    delivered_orders = db.Column(db.Integer, nullable=False, default=0)  # 全部到货的采购单数
+    timed_orders = db.Column(db.Integer, nullable=False, default=0)  # 其中有预计送达日期的单数
+    on_time_orders = db.Column(db.Integer, nullable=False, default=0)  # 其中按时到货的单数
+    ordered_quantity = db.Column(db.Decimal(14, 2), nullable=False, default=0)  # 已首次收货的采购单的采购数量
+    first_received_quantity = db.Column(db.Decimal(14, 2), nullable=False, default=0)  # 首次收货的数量
+    price_changes = db.Column(db.Integer, nullable=False, default=0)  # 价格变动次数
+    price_change_square_sum = db.Column(db.Decimal(18, 4), nullable=False, default=0)  # 涨跌幅（%）的平方和
+    # 由计数得出的指标（0-1）与综合评分（0-100），无数据的指标为空
+    on_time_rate = db.Column(db.Decimal(5, 4))
+    fill_rate = db.Column(db.Decimal(5, 4))
+    price_stability = db.Column(db.Decimal(5, 4))
+    score = db.Column(db.Decimal(5, 2))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SupplierScore supplier_id={self.supplier_id} score={self.score}>'
+    
+    def to_dict(self):
+        return {
+            'supplier_id': self.supplier_id,
+            'score': self.score,
+            'on_time_rate': self.on_time_rate,
+            'fill_rate': self.fill_rate,
+            'price_stability': self.price_stability,
+            'delivered_orders': self.delivered_orders,
+            'price_changes': self.price_changes,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
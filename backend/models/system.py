@@ -62,3 +62,17 @@ class Backup(db.Model):
     
     def __repr__(self):
         return f'<Backup id={self.id} backup_time={self.backup_time}>'
+
+class IdempotencyRecord(db.Model):
+    __tablename__ = 'idempotency_records'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    key = db.Column(db.String(64), unique=True, nullable=False)  # 用户、接口与幂等键组合后的哈希
+    request_hash = db.Column(db.String(64), nullable=False)  # 请求体哈希，用于识别键被复用于不同请求
+    status_code = db.Column(db.Integer)  # 为空表示请求仍在处理中
+    response_body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<IdempotencyRecord {self.key} status_code={self.status_code}>'
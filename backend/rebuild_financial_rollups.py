@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+收支汇总重建脚本
+从收支记录重新生成日汇总和月汇总，用于首次上线回填或绕过 ORM 批量修改收支之后
+"""
+
+from app import app, db
+from services.financial_rollups import rebuild_rollups
+
+def main():
+    """主函数"""
+    with app.app_context():
+        try:
+            count = rebuild_rollups()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    
+    print(f"收支汇总重建完成，共 {count} 条日汇总")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import threading
+import time
+from app import db
+from models.customer import Customer
+from services.restriction_index import restriction_index, split_restrictions, INDEX_TTL
+
+# 全部菜品的位掩码（Python 整数的 -1 在任意位上均为 1）
+ALL_DISHES = -1
+
+
+class CompatibilityMatrix:
+    """客户 × 菜品禁忌矩阵：每个在住客户一行，行内为其不能食用的菜品ID位集"""
+
+    def __init__(self, ttl=INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._rows = {}
+        self._generation = None
+        self._built_at = None
+        restriction_index.subscribe(self.dish_changed)
+
+    @staticmethod
+    def _row(restrictions):
+        tokens = frozenset(split_restrictions(restrictions))
+        return tokens, restriction_index.unsafe_bits(tokens, ALL_DISHES)
+
+    def build(self):
+        """为全部在住客户构建矩阵（一次查询），每行只需对其禁忌词的倒排位集求并"""
+        restriction_index.ensure_fresh()
+        generation = restriction_index.generation
+        rows = {}
+        for customer_id, restrictions in db.session.query(Customer.id, Customer.dietary_restrictions) \
+                .filter(Customer.status == 'active'):
+            rows[customer_id] = self._row(restrictions)
+        with self._lock:
+            self._rows = rows
+            self._generation = generation
+            self._built_at = time.monotonic()
+
+    def ensure_fresh(self):
+        restriction_index.ensure_fresh()
+        if self._generation != restriction_index.generation or time.monotonic() - self._built_at > self.ttl:
+            self.build()
+
+    def dish_changed(self, dish_id, tokens):
+        """菜品禁忌变化时只更新每行中该菜品对应的一位"""
+        bit = 1 << dish_id
+        tokens = set(tokens or [])
+        with self._lock:
+            for customer_id, (customer_tokens, unsafe) in self._rows.items():
+                if tokens & customer_tokens:
+                    unsafe |= bit
+                else:
+                    unsafe &= ~bit
+                self._rows[customer_id] = (customer_tokens, unsafe)
+
+    def update_customer(self, customer):
+        """客户新增、禁忌或状态变化后更新其所在行"""
+        with self._lock:
+            if customer.status == 'active':
+                self._rows[customer.id] = self._row(customer.dietary_restrictions)
+            else:
+                self._rows.pop(customer.id, None)
+
+    def remove_customer(self, customer_id):
+        with self._lock:
+            self._rows.pop(customer_id, None)
+
+    def unsafe_bits(self, customer_id):
+        """客户不能食用的菜品位集；不在矩阵中的客户（如已离店）临时按其禁忌计算"""
+        with self._lock:
+            row = self._rows.get(customer_id)
+        if row:
+            return row[1]
+        restrictions = db.session.query(Customer.dietary_restrictions).filter(Customer.id == customer_id).first()
+        if restrictions is None:
+            return None
+        return self._row(restrictions[0])[1]
+
+    def safe_bits(self, customer_id, dish_bits=None):
+        """客户可食用的在售菜品位集，dish_bits 可限定候选菜品"""
+        unsafe = self.unsafe_bits(customer_id)
+        if unsafe is None:
+            return None
+        candidates = restriction_index.active_bits()
+        if dish_bits is not None:
+            candidates &= dish_bits
+        return candidates & ~unsafe
+
+    def customer_ids(self):
+        with self._lock:
+            return sorted(self._rows)
+
+
+compatibility_matrix = CompatibilityMatrix()
@@ -0,0 +1,198 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import event, func, inspect
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from app import db
+from models.financial import Transaction, TransactionDailyRollup, TransactionMonthlyRollup
+
+# 只有已完成的收支计入汇总
+ROLLUP_STATUSES = ('completed',)
+ROLLUP_FIELDS = ('transaction_date', 'type', 'category', 'payment_method', 'amount', 'status')
+GRANULARITIES = ('day', 'month')
+ZERO = Decimal('0')
+
+
+def _to_date(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.date() if isinstance(value, datetime) else value
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _contribution(values):
+    """一条收支对汇总的贡献：((日期, 类型, 分类, 支付方式), 金额)，不计入汇总时返回 None"""
+    if values['status'] not in ROLLUP_STATUSES or not values['transaction_date'] or values['amount'] is None:
+        return None
+    key = (_to_date(values['transaction_date']), values['type'], values['category'], values['payment_method'] or '')
+    return key, Decimal(str(values['amount']))
+
+
+def _current_values(target):
+    return {field: getattr(target, field) for field in ROLLUP_FIELDS}
+
+
+def _previous_values(target):
+    """更新前的字段值：有修改的字段取修改前的值（模型中这些字段设置了 active_history，修改前的值总会被加载）"""
+    state = inspect(target)
+    values = {}
+    for field in ROLLUP_FIELDS:
+        history = state.attrs[field].history
+        values[field] = history.deleted[0] if history.deleted else getattr(target, field)
+    return values
+
+
+def apply_changes(connection, changes):
+    """将 [(汇总键, 金额增量, 笔数增量)] 累加到日汇总和月汇总（各一次 upsert）"""
+    daily, monthly = {}, {}
+    for (day, transaction_type, category, payment_method), amount, count in changes:
+        for rollup, period in ((daily, day), (monthly, month_start(day))):
+            key = (period, transaction_type, category, payment_method)
+            total, total_count = rollup.get(key, (ZERO, 0))
+            rollup[key] = (total + amount, total_count + count)
+
+    for model, rollup in ((TransactionDailyRollup, daily), (TransactionMonthlyRollup, monthly)):
+        rows = [{
+            'period_start': period,
+            'type': transaction_type,
+            'category': category,
+            'payment_method': payment_method,
+            'total_amount': amount,
+            'transaction_count': count
+        } for (period, transaction_type, category, payment_method), (amount, count) in sorted(rollup.items())
+            if amount or count]
+        if not rows:
+            continue
+        table = model.__table__
+        stmt = mysql_insert(table)
+        stmt = stmt.on_duplicate_key_update(
+            total_amount=table.c.total_amount + stmt.inserted.total_amount,
+            transaction_count=table.c.transaction_count + stmt.inserted.transaction_count
+        )
+        connection.execute(stmt, rows)
+
+
+# 收支的新增、修改和删除经 ORM 提交时，在同一事务中增量更新汇总；
+# 绕过 ORM 的批量写入（如 Query.update）不会触发，需要运行 rebuild_financial_rollups.py 重建
+@event.listens_for(Transaction, 'after_insert')
+def _after_insert(mapper, connection, target):
+    contribution = _contribution(_current_values(target))
+    if contribution:
+        apply_changes(connection, [(contribution[0], contribution[1], 1)])
+
+
+@event.listens_for(Transaction, 'after_update')
+def _after_update(mapper, connection, target):
+    previous = _contribution(_previous_values(target))
+    current = _contribution(_current_values(target))
+    if previous == current:
+        return
+    changes = []
+    if previous:
+        changes.append((previous[0], -previous[1], -1))
+    if current:
+        changes.append((current[0], current[1], 1))
+    apply_changes(connection, changes)
+
+
+@event.listens_for(Transaction, 'after_delete')
+def _after_delete(mapper, connection, target):
+    previous = _contribution(_previous_values(target))
+    if previous:
+        apply_changes(connection, [(previous[0], -previous[1], -1)])
+
+
+def rebuild_rollups():
+    """从收支记录重建日汇总和月汇总（数据库中按天聚合），返回日汇总行数"""
+    day = func.date(Transaction.transaction_date)
+    payment_method = func.coalesce(Transaction.payment_method, '')
+    rows = db.session.query(
+        day, Transaction.type, Transaction.category, payment_method,
+        func.sum(Transaction.amount), func.count(Transaction.id)
+    ).filter(Transaction.status.in_(ROLLUP_STATUSES), Transaction.transaction_date.isnot(None)) \
+        .group_by(day, Transaction.type, Transaction.category, payment_method) \
+        .all()
+
+    TransactionDailyRollup.query.delete(synchronize_session=False)
+    TransactionMonthlyRollup.query.delete(synchronize_session=False)
+    changes = [((_to_date(row_day), transaction_type, category, method), amount or ZERO, count)
+               for row_day, transaction_type, category, method, amount, count in rows]
+    apply_changes(db.session.connection(), changes)
+    return len(changes)
+
+
+def _load(model, start, end):
+    """读取 [start, end) 范围内的汇总行（沿唯一键的日期前缀范围读取）"""
+    if start >= end:
+        return []
+    return db.session.query(
+        model.period_start, model.type, model.category, model.payment_method,
+        model.total_amount, model.transaction_count
+    ).filter(model.period_start >= start, model.period_start < end).all()
+
+
+def summary(granularity, date_from, date_to):
+    """收支汇总：各期收入、支出、净额及按 (类型, 分类, 支付方式) 的明细
+
+    按月汇总时，完整月份读取月汇总，首尾不完整的月份由日汇总补足。
+    """
+    end = date_to + timedelta(days=1)
+    if granularity == 'day':
+        rows = _load(TransactionDailyRollup, date_from, end)
+    else:
+        first_full = date_from if date_from.day == 1 else next_month(date_from)
+        full_end = month_start(end)
+        if first_full < full_end:
+            rows = _load(TransactionDailyRollup, date_from, first_full) + \
+                _load(TransactionMonthlyRollup, first_full, full_end) + \
+                _load(TransactionDailyRollup, full_end, end)
+        else:
+            rows = _load(TransactionDailyRollup, date_from, end)
+
+    periods, breakdown = {}, {}
+    for period, transaction_type, category, payment_method, amount, count in rows:
+        if granularity == 'month':
+            period = month_start(period)
+        totals = periods.setdefault(period, {'income': ZERO, 'expense': ZERO, 'transaction_count': 0})
+        if transaction_type in ('income', 'expense'):
+            totals[transaction_type] += amount
+        totals['transaction_count'] += count
+        key = (period, transaction_type, category, payment_method)
+        total, total_count = breakdown.get(key, (ZERO, 0))
+        breakdown[key] = (total + amount, total_count + count)
+
+    income = sum((totals['income'] for totals in periods.values()), ZERO)
+    expense = sum((totals['expense'] for totals in periods.values()), ZERO)
+    return {
+        'granularity': granularity,
+        'from': date_from.isoformat(),
+        'to': date_to.isoformat(),
+        'totals': {
+            'income': income,
+            'expense': expense,
+            'net': income - expense,
+            'transaction_count': sum(totals['transaction_count'] for totals in periods.values())
+        },
+        'periods': [{
+            'period': period.isoformat(),
+            'income': totals['income'],
+            'expense': totals['expense'],
+            'net': totals['income'] - totals['expense'],
+            'transaction_count': totals['transaction_count']
+        } for period, totals in sorted(periods.items())],
+        'breakdown': [{
+            'period': period.isoformat(),
+            'type': transaction_type,
+            'category': category,
+            'payment_method': payment_method or None,
+            'amount': amount,
+            'transaction_count': count
+        } for (period, transaction_type, category, payment_method), (amount, count) in sorted(breakdown.items())
+            if count]
+    }
@@ -0,0 +1,199 @@
+import json
+from datetime import date, datetime, timedelta
+import numpy as np
+from sqlalchemy import bindparam, func, or_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from app import db
+from models.ingredient import Ingredient, IngredientForecast, StockMovement
+from models.dish import DishIngredient
+from models.kitchen import KitchenProduction
+from models.financial import PurchaseOrder
+
+# 读取的历史天数
+HISTORY_DAYS = 3 * 365
+# 近期日均用量的计算窗口及指数加权系数（越近的日期权重越大）
+RATE_WINDOW_DAYS = 56
+EWMA_ALPHA = 0.1
+# 安全库存的服务水平系数（约 95%）
+SERVICE_LEVEL_Z = 1.65
+# 采购周期：建议采购量覆盖再订货点之外的天数
+REVIEW_PERIOD_DAYS = 7
+DEFAULT_LEAD_TIME_DAYS = 2
+MAX_LEAD_TIME_DAYS = 30
+
+
+def _to_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _accumulate(matrix, rows, positions, start):
+    """将 (食材ID, 日期, 数量) 累加到矩阵对应的格子（一次 np.add.at）"""
+    row_index, column_index, values = [], [], []
+    days = matrix.shape[1]
+    for ingredient_id, day, quantity in rows:
+        day = _to_date(day)
+        if ingredient_id not in positions or day is None or quantity is None:
+            continue
+        offset = (day - start).days
+        if 0 <= offset < days:
+            row_index.append(positions[ingredient_id])
+            column_index.append(offset)
+            values.append(float(quantity))
+    if values:
+        np.add.at(matrix, (np.array(row_index, dtype=np.intp), np.array(column_index, dtype=np.intp)),
+                  np.array(values, dtype=float))
+
+
+def load_consumption(positions, start, days):
+    """每日用量矩阵（食材 × 天），按天的汇总在数据库中完成
+
+    以出库流水为准；没有出库流水的食材（如启用库存流水之前）用订单推算的菜品用量代替。
+    """
+    matrix = np.zeros((len(positions), days))
+    end = start + timedelta(days=days)
+
+    day = func.date(StockMovement.created_at)
+    outbound = db.session.query(StockMovement.ingredient_id, day, func.sum(StockMovement.quantity)) \
+        .filter(StockMovement.movement_type == 'out',
+                StockMovement.created_at >= start, StockMovement.created_at < end) \
+        .group_by(StockMovement.ingredient_id, day) \
+        .all()
+    _accumulate(matrix, outbound, positions, start)
+    covered = {row[0] for row in outbound}
+
+    # 只统计配方单位与库存单位一致的用量
+    ordered = db.session.query(
+        DishIngredient.ingredient_id, KitchenProduction.delivery_date,
+        func.sum(KitchenProduction.quantity * DishIngredient.quantity)
+    ).join(DishIngredient, DishIngredient.dish_id == KitchenProduction.dish_id) \
+        .join(Ingredient, Ingredient.id == DishIngredient.ingredient_id) \
+        .filter(KitchenProduction.delivery_date >= start, KitchenProduction.delivery_date < end,
+                or_(DishIngredient.unit.is_(None), DishIngredient.unit == Ingredient.unit)) \
+        .group_by(DishIngredient.ingredient_id, KitchenProduction.delivery_date) \
+        .all()
+    _accumulate(matrix, [row for row in ordered if row[0] not in covered], positions, start)
+    return matrix
+
+
+def load_lead_times(supplier_ids):
+    """各供应商的平均采购提前期（天），按采购单的下单日期与预计送达日期计算"""
+    rows = db.session.query(
+        PurchaseOrder.supplier_id,
+        func.avg(func.datediff(PurchaseOrder.expected_delivery, PurchaseOrder.order_date))
+    ).filter(PurchaseOrder.expected_delivery.isnot(None),
+             or_(PurchaseOrder.status.is_(None), PurchaseOrder.status != 'cancelled')) \
+        .group_by(PurchaseOrder.supplier_id) \
+        .all()
+    by_supplier = {supplier_id: float(days) for supplier_id, days in rows if days is not None}
+    lead_times = np.array([by_supplier.get(supplier_id, DEFAULT_LEAD_TIME_DAYS) for supplier_id in supplier_ids])
+    return np.clip(np.ceil(lead_times), 1, MAX_LEAD_TIME_DAYS).astype(int)
+
+
+def compute_forecasts(matrix, first_weekday, lead_times, current_stock,
+                      window=RATE_WINDOW_DAYS, alpha=EWMA_ALPHA, z=SERVICE_LEVEL_Z, review_days=REVIEW_PERIOD_DAYS):
+    """对全部食材同时计算预测（矩阵运算，无逐食材循环）
+
+    matrix 为食材 × 天的用量矩阵，最后一列为昨天；first_weekday 为第一列的星期（周一为 0）。
+    """
+    days = matrix.shape[1]
+    window = min(window, days)
+
+    # 近期日均用量（指数加权）与波动
+    recent = matrix[:, days - window:]
+    weights = (1 - alpha) ** np.arange(window - 1, -1, -1)
+    weights /= weights.sum()
+    daily_rate = recent @ weights
+    demand_std = recent.std(axis=1)
+
+    # 星期季节系数：各星期的日均用量 / 总日均用量
+    weekdays = (first_weekday + np.arange(days)) % 7
+    weekday_matrix = np.eye(7)[weekdays]
+    weekday_means = (matrix @ weekday_matrix) / np.maximum(weekday_matrix.sum(axis=0), 1)
+    overall_mean = matrix.mean(axis=1, keepdims=True)
+    weekday_factors = np.divide(weekday_means, overall_mean, out=np.ones_like(weekday_means),
+                                where=overall_mean > 0)
+
+    # 从今天起提前期内每天的预计用量，超出各食材提前期的天数置零
+    horizon = int(lead_times.max()) if len(lead_times) else 0
+    future_weekdays = (first_weekday + days + np.arange(horizon)) % 7
+    future_demand = daily_rate[:, None] * weekday_factors[:, future_weekdays]
+    within_lead_time = np.arange(horizon)[None, :] < lead_times[:, None]
+    lead_time_demand = (future_demand * within_lead_time).sum(axis=1)
+
+    safety_stock = z * demand_std * np.sqrt(lead_times)
+    reorder_point = lead_time_demand + safety_stock
+    reorder_quantity = np.clip(reorder_point + daily_rate * review_days - current_stock, 0, None)
+
+    return {
+        'daily_rate': daily_rate,
+        'demand_std': demand_std,
+        'weekday_factors': weekday_factors,
+        'lead_time_demand': lead_time_demand,
+        'safety_stock': safety_stock,
+        'reorder_point': reorder_point,
+        'reorder_quantity': reorder_quantity
+    }
+
+
+def run_forecast(history_days=HISTORY_DAYS, apply_minimum_stock=False):
+    """计算全部食材的预测并写入预测表（一次 executemany 批量更新），返回食材数量"""
+    ingredients = db.session.query(Ingredient.id, Ingredient.supplier_id, Ingredient.current_stock) \
+        .order_by(Ingredient.id) \
+        .all()
+    if not ingredients:
+        return 0
+
+    ingredient_ids = [row.id for row in ingredients]
+    positions = {ingredient_id: index for index, ingredient_id in enumerate(ingredient_ids)}
+    start = date.today() - timedelta(days=history_days)
+    matrix = load_consumption(positions, start, history_days)
+    lead_times = load_lead_times([row.supplier_id for row in ingredients])
+    current_stock = np.array([float(row.current_stock or 0) for row in ingredients])
+    result = compute_forecasts(matrix, start.weekday(), lead_times, current_stock)
+
+    now = datetime.utcnow()
+    rows = [{
+        'ingredient_id': ingredient_id,
+        'daily_rate': round(float(result['daily_rate'][index]), 3),
+        'demand_std': round(float(result['demand_std'][index]), 3),
+        'weekday_factors': json.dumps([round(float(factor), 3) for factor in result['weekday_factors'][index]]),
+        'lead_time_days': int(lead_times[index]),
+        'lead_time_demand': round(float(result['lead_time_demand'][index]), 3),
+        'safety_stock': round(float(result['safety_stock'][index]), 3),
+        'suggested_minimum_stock': round(float(result['reorder_point'][index]), 2),
+        'reorder_quantity': round(float(result['reorder_quantity'][index]), 2),
+        'history_days': history_days,
+        'computed_at': now
+    } for index, ingredient_id in enumerate(ingredient_ids)]
+
+    table = IngredientForecast.__table__
+    stmt = mysql_insert(table)
+    stmt = stmt.on_duplicate_key_update({
+        column: stmt.inserted[column] for column in rows[0] if column != 'ingredient_id'
+    })
+    db.session.execute(stmt, rows)
+
+    if apply_minimum_stock:
+        apply_suggestions()
+    return len(rows)
+
+
+def apply_suggestions(ingredient_ids=None):
+    """将建议最低库存写入食材的 minimum_stock（一次 executemany），返回更新数量
+
+    未指定食材时跳过没有近期用量（日均用量或建议值为 0）的食材，不把手工设置的最低库存清零；
+    只有明确指定的食材才会被写入 0。
+    """
+    query = db.session.query(IngredientForecast.ingredient_id, IngredientForecast.suggested_minimum_stock)
+    if ingredient_ids:
+        query = query.filter(IngredientForecast.ingredient_id.in_(ingredient_ids))
+    else:
+        query = query.filter(IngredientForecast.daily_rate > 0, IngredientForecast.suggested_minimum_stock > 0)
+    rows = [{'row_id': ingredient_id, 'minimum': minimum} for ingredient_id, minimum in query]
+    if rows:
+        table = Ingredient.__table__
+        db.session.execute(
+            table.update().where(table.c.id == bindparam('row_id')).values(minimum_stock=bindparam('minimum')),
+            rows
+        )
+    return len(rows)
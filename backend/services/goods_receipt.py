@@ -0,0 +1,186 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import bindparam
+from app import db
+from models.financial import PurchaseOrder, PurchaseOrderItem
+from services.lots import receive_lots
+from services.supplier_scores import record_receipts
+
+# 可以收货的采购单状态
+RECEIVABLE_STATUSES = ('pending', 'partially_received')
+ZERO = Decimal('0')
+
+
+def _outstanding(item):
+    return item.quantity - (item.received_quantity or ZERO)
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _receipt_lines(order_id, items, requested):
+    """确定一张采购单本次的收货行
+
+    requested 为空时收取全部未到货数量；否则为 [{item_id 或 ingredient_id, quantity, expiry_date, lot_number}]。
+    同一食材出现在多个采购项目中时必须用 item_id 指定。返回 (收货行列表, 错误列表)。
+    """
+    if not requested:
+        return [(item, _outstanding(item), {}) for item in items if _outstanding(item) > 0], []
+    if not isinstance(requested, list):
+        return [], [{'purchase_order_id': order_id, 'error': 'items 必须为列表'}]
+
+    by_id = {item.id: item for item in items}
+    by_ingredient = {}
+    for item in items:
+        by_ingredient.setdefault(item.ingredient_id, []).append(item)
+
+    lines, errors, receiving = [], [], {}
+    for index, line in enumerate(requested):
+        if not isinstance(line, dict):
+            errors.append({'purchase_order_id': order_id, 'index': index, 'error': '收货行格式错误'})
+            continue
+        if line.get('item_id') is not None:
+            item = by_id.get(line['item_id']) if _is_id(line['item_id']) else None
+        else:
+            candidates = by_ingredient.get(line['ingredient_id'], []) if _is_id(line.get('ingredient_id')) else []
+            if len(candidates) > 1:
+                errors.append({'purchase_order_id': order_id, 'index': index,
+                               'error': '该食材对应多个采购项目，请提供item_id'})
+                continue
+            item = candidates[0] if candidates else None
+        if not item:
+            errors.append({'purchase_order_id': order_id, 'index': index, 'error': '采购项目不存在'})
+            continue
+        try:
+            quantity = Decimal(str(line['quantity'])) if line.get('quantity') is not None else _outstanding(item)
+        except (InvalidOperation, ValueError):
+            errors.append({'purchase_order_id': order_id, 'index': index, 'error': '数量格式错误'})
+            continue
+        if not quantity.is_finite():
+            errors.append({'purchase_order_id': order_id, 'index': index, 'error': '数量格式错误'})
+            continue
+        if quantity <= 0:
+            errors.append({'purchase_order_id': order_id, 'index': index, 'error': '数量必须大于0'})
+            continue
+        receiving[item.id] = receiving.get(item.id, ZERO) + quantity
+        if receiving[item.id] > _outstanding(item):
+            errors.append({'purchase_order_id': order_id, 'index': index, 'error': '收货数量超过未到货数量',
+                           'outstanding': _outstanding(item)})
+            continue
+        lines.append((item, quantity, line))
+    return lines, errors
+
+
+def receive_purchase_orders(receipts, operator_id=None):
+    """批量收货：多张采购单的全部或部分项目一次入库
+
+    按ID顺序锁定采购单，收货行经批次入库（一次库存流水批量更新、一次批次批量插入），
+    再以 executemany 更新采购项目的已入库数量和采购单状态。
+    receipts 为 [{purchase_order_id, items（可选）}]；返回 (结果列表, 错误列表)，
+    有错误时不做任何修改，由调用方回滚事务。
+    """
+    if not all(isinstance(receipt, dict) for receipt in receipts):
+        return [], [{'error': '收货记录格式错误'}]
+    order_ids = [receipt.get('purchase_order_id') for receipt in receipts]
+    if not all(_is_id(order_id) for order_id in order_ids):
+        return [], [{'error': '请提供采购单ID'}]
+    if len(set(order_ids)) != len(order_ids):
+        return [], [{'error': '同一采购单只能出现一次'}]
+
+    orders = {order.id: order for order in PurchaseOrder.query
+              .filter(PurchaseOrder.id.in_(order_ids))
+              .order_by(PurchaseOrder.id)
+              .with_for_update()}
+    items_by_order = {}
+    for item in PurchaseOrderItem.query.filter(PurchaseOrderItem.order_id.in_(order_ids)).order_by(PurchaseOrderItem.id):
+        items_by_order.setdefault(item.order_id, []).append(item)
+
+    errors, lines_by_order = [], {}
+    for receipt in receipts:
+        order_id = receipt['purchase_order_id']
+        order = orders.get(order_id)
+        if not order:
+            errors.append({'purchase_order_id': order_id, 'error': '采购单不存在'})
+            continue
+        if order.status not in RECEIVABLE_STATUSES:
+            errors.append({'purchase_order_id': order_id, 'error': f'采购单状态为{order.status}，无法收货'})
+            continue
+        lines, line_errors = _receipt_lines(order_id, items_by_order.get(order_id, []), receipt.get('items'))
+        errors.extend(line_errors)
+        if not line_errors and not lines:
+            errors.append({'purchase_order_id': order_id, 'error': '没有需要收货的项目'})
+        lines_by_order[order_id] = lines
+    if errors:
+        return [], errors
+
+    # 入库：库存余额、库存流水、批次与保质期一并处理
+    lot_rows = [{
+        'ingredient_id': item.ingredient_id,
+        'quantity': quantity,
+        'expiry_date': line.get('expiry_date'),
+        'lot_number': line.get('lot_number'),
+        'purchase_order_id': order_id,
+        'reference': f'purchase_order:{order_id}'
+    } for order_id, lines in lines_by_order.items() for item, quantity, line in lines]
+    lot_results, errors = receive_lots(lot_rows, operator_id=operator_id)
+    if errors:
+        return [], errors
+
+    # 更新采购项目的已入库数量
+    received = {}
+    for lines in lines_by_order.values():
+        for item, quantity, _ in lines:
+            received[item.id] = received.get(item.id, item.received_quantity or ZERO) + quantity
+    item_table = PurchaseOrderItem.__table__
+    db.session.execute(
+        item_table.update().where(item_table.c.id == bindparam('row_id')).values(received_quantity=bindparam('received')),
+        [{'row_id': item_id, 'received': quantity} for item_id, quantity in received.items()]
+    )
+
+    # 全部项目到货的采购单标记为已送达，否则为部分到货
+    now = datetime.utcnow()
+    status_rows, results, score_events = [], [], []
+    for order_id, lines in lines_by_order.items():
+        complete = all(received.get(item.id, item.received_quantity or ZERO) >= item.quantity
+                       for item in items_by_order.get(order_id, []))
+        status = 'delivered' if complete else 'partially_received'
+        status_rows.append({'row_id': order_id, 'status': status, 'delivered_at': now if complete else None})
+        order = orders[order_id]
+        if order.supplier_id:
+            score_events.append({
+                'supplier_id': order.supplier_id,
+                'first_receipt': order.status == 'pending',
+                'ordered_quantity': sum((item.quantity for item in items_by_order.get(order_id, [])), ZERO),
+                'received_quantity': sum((quantity for _, quantity, _ in lines), ZERO),
+                'delivered_at': now if complete else None,
+                'expected_delivery': order.expected_delivery
+            })
+        results.append({
+            'purchase_order_id': order_id,
+            'status': status,
+            'lines': [{
+                'item_id': item.id,
+                'ingredient_id': item.ingredient_id,
+                'received_quantity': quantity,
+                'total_received': received[item.id],
+                'ordered_quantity': item.quantity
+            } for item, quantity, _ in lines]
+        })
+    order_table = PurchaseOrder.__table__
+    db.session.execute(
+        order_table.update().where(order_table.c.id == bindparam('row_id'))
+        .values(status=bindparam('status'), delivered_at=bindparam('delivered_at')),
+        status_rows
+    )
+    # 供应商评分按本次收货增量更新
+    record_receipts(score_events)
+
+    # 批次入库结果按收货行顺序返回，附到对应的收货行
+    lot_iter = iter(lot_results)
+    for result in results:
+        for line in result['lines']:
+            lot_result = next(lot_iter)
+            line['lot_id'] = lot_result['lot_id']
+            line['balance_after'] = lot_result['balance_after']
+    return results, []
@@ -0,0 +1,141 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from flask import current_app
+from PIL import Image, ImageOps
+
+# 缩略图只生成固定的几种宽度，避免任意尺寸占满磁盘缓存
+THUMBNAIL_WIDTHS = (160, 320, 640, 1280)
+THUMBNAIL_FORMATS = {'webp': ('WEBP', 'image/webp'), 'jpeg': ('JPEG', 'image/jpeg')}
+THUMBNAIL_QUALITY = 80
+# 原图支持的格式及保存时使用的扩展名
+ORIGINAL_FORMATS = {'JPEG': ('jpg', 'image/jpeg'), 'PNG': ('png', 'image/png'),
+                    'WEBP': ('webp', 'image/webp'), 'GIF': ('gif', 'image/gif')}
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+READ_CHUNK_SIZE = 64 * 1024
+
+# 同一缩略图只由一个线程生成
+_generation_locks = {}
+_generation_locks_guard = threading.Lock()
+
+
+class ImageError(Exception):
+    pass
+
+
+def media_root():
+    return current_app.config['MEDIA_ROOT']
+
+
+def _shard(image_hash):
+    return image_hash[:2]
+
+
+def _write_atomic(path, write):
+    """先写入同目录的临时文件再重命名，其他进程不会读到写了一半的文件"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            write(temp_file)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def is_valid_hash(image_hash):
+    return bool(image_hash and HASH_PATTERN.match(image_hash))
+
+
+def store_image(stream):
+    """按内容的 SHA-256 保存原图，相同内容只保存一份，返回哈希值"""
+    digest = hashlib.sha256()
+    with tempfile.SpooledTemporaryFile(max_size=READ_CHUNK_SIZE * 16) as buffer:
+        size = 0
+        while True:
+            chunk = stream.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > MAX_IMAGE_BYTES:
+                raise ImageError(f'图片不能超过{MAX_IMAGE_BYTES // (1024 * 1024)}MB')
+            digest.update(chunk)
+            buffer.write(chunk)
+        if not size:
+            raise ImageError('图片内容为空')
+
+        buffer.seek(0)
+        try:
+            with Image.open(buffer) as image:
+                image_format = image.format
+                image.verify()
+        except Exception:
+            raise ImageError('无法识别的图片文件')
+        if image_format not in ORIGINAL_FORMATS:
+            raise ImageError('仅支持JPEG、PNG、WebP和GIF图片')
+
+        image_hash = digest.hexdigest()
+        if not find_original(image_hash):
+            extension = ORIGINAL_FORMATS[image_format][0]
+            path = os.path.join(media_root(), 'originals', _shard(image_hash), f'{image_hash}.{extension}')
+
+            def write(target):
+                buffer.seek(0)
+                while True:
+                    chunk = buffer.read(READ_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+            _write_atomic(path, write)
+    return image_hash
+
+
+def find_original(image_hash):
+    """返回原图路径和类型 (路径, MIME)，不存在时返回 None"""
+    directory = os.path.join(media_root(), 'originals', _shard(image_hash))
+    for extension, mimetype in ORIGINAL_FORMATS.values():
+        path = os.path.join(directory, f'{image_hash}.{extension}')
+        if os.path.exists(path):
+            return path, mimetype
+    return None
+
+
+def _generation_lock(key):
+    with _generation_locks_guard:
+        return _generation_locks.setdefault(key, threading.Lock())
+
+
+def get_thumbnail(image_hash, width, thumbnail_format):
+    """返回缩略图路径和类型，首次请求时生成并缓存到磁盘；原图不存在时返回 None"""
+    pil_format, mimetype = THUMBNAIL_FORMATS[thumbnail_format]
+    path = os.path.join(media_root(), 'thumbnails', _shard(image_hash), f'{image_hash}_{width}.{thumbnail_format}')
+    if os.path.exists(path):
+        return path, mimetype
+
+    original = find_original(image_hash)
+    if not original:
+        return None
+
+    key = (image_hash, width, thumbnail_format)
+    with _generation_lock(key):
+        if not os.path.exists(path):
+            with Image.open(original[0]) as image:
+                # 手机照片的方向记录在 EXIF 中，生成缩略图前先按其旋转
+                image = ImageOps.exif_transpose(image)
+                if image.mode not in ('RGB', 'RGBA') or pil_format == 'JPEG':
+                    image = image.convert('RGB')
+                if image.width > width:
+                    image.thumbnail((width, image.height * width // image.width + 1), Image.LANCZOS)
+
+                def write(target):
+                    image.save(target, format=pil_format, quality=THUMBNAIL_QUALITY, optimize=True)
+                _write_atomic(path, write)
+        with _generation_locks_guard:
+            _generation_locks.pop(key, None)
+    return path, mimetype
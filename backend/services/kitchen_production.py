@@ -0,0 +1,157 @@
+from collections import defaultdict
+from datetime import date
+from sqlalchemy import func, or_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from app import db
+from models.kitchen import KitchenProduction
+from models.order import CustomerOrder, OrderItem
+from models.menu import Menu, MenuDish
+from models.dish import Dish
+
+# 直接点的单品菜（不属于套餐菜单）归入此类型
+STANDALONE_MENU_TYPE = 'a_la_carte'
+
+
+def active_order_filter():
+    """已取消的订单不计入厨房生产量"""
+    return or_(CustomerOrder.status.is_(None), CustomerOrder.status != 'cancelled')
+
+
+def to_date(value):
+    if isinstance(value, str):
+        return date.fromisoformat(value) if value else None
+    return value
+
+
+def menu_composition(menu_id):
+    """返回菜单当前的组成 {菜品ID: 数量}"""
+    rows = db.session.query(MenuDish.dish_id, MenuDish.quantity).filter(MenuDish.menu_id == menu_id).all()
+    return {row.dish_id: row.quantity or 1 for row in rows}
+
+
+def _menu_compositions(menu_ids):
+    rows = db.session.query(MenuDish.menu_id, Menu.type, MenuDish.dish_id, MenuDish.quantity) \
+        .join(Menu, Menu.id == MenuDish.menu_id) \
+        .filter(MenuDish.menu_id.in_(menu_ids)) \
+        .all()
+    compositions = defaultdict(list)
+    for row in rows:
+        compositions[row.menu_id].append((row.dish_id, row.type, row.quantity or 1))
+    return compositions
+
+
+def expand_lines(lines):
+    """将订单行 (配送日期, 项目类型, 项目ID, 数量) 展开为 {(日期, 菜品ID, 菜单类型): 份数}"""
+    lines = [(to_date(line[0]),) + tuple(line[1:]) for line in lines]
+    menu_ids = {item_id for _, item_type, item_id, _ in lines if item_type == 'menu'}
+    compositions = _menu_compositions(menu_ids) if menu_ids else {}
+
+    totals = defaultdict(int)
+    for delivery_date, item_type, item_id, quantity in lines:
+        if delivery_date is None:
+            continue
+        if item_type == 'dish':
+            totals[(delivery_date, item_id, STANDALONE_MENU_TYPE)] += quantity
+        elif item_type == 'menu':
+            for dish_id, menu_type, dish_quantity in compositions.get(item_id, []):
+                totals[(delivery_date, dish_id, menu_type)] += quantity * dish_quantity
+    return totals
+
+
+def apply_deltas(deltas, sign=1):
+    """以 INSERT ... ON DUPLICATE KEY UPDATE 批量累加生产量，一次 executemany"""
+    rows = [{
+        'delivery_date': delivery_date,
+        'dish_id': dish_id,
+        'menu_type': menu_type,
+        'quantity': sign * quantity
+    } for (delivery_date, dish_id, menu_type), quantity in deltas.items() if quantity]
+    if not rows:
+        return
+
+    table = KitchenProduction.__table__
+    stmt = mysql_insert(table)
+    stmt = stmt.on_duplicate_key_update(
+        quantity=table.c.quantity + stmt.inserted.quantity,
+        updated_at=func.now()
+    )
+    db.session.execute(stmt, rows)
+
+    # 扣减后清理已归零的记录
+    reduced_dates = {row['delivery_date'] for row in rows if row['quantity'] < 0}
+    if reduced_dates:
+        KitchenProduction.query.filter(
+            KitchenProduction.delivery_date.in_(reduced_dates),
+            KitchenProduction.quantity <= 0
+        ).delete(synchronize_session=False)
+
+
+def apply_order_lines(lines, sign=1):
+    apply_deltas(expand_lines(lines), sign)
+
+
+def apply_orders(order_ids, sign=1):
+    """将指定订单的全部订单项计入（sign=1）或移出（sign=-1）生产量"""
+    order_ids = list(order_ids)
+    if not order_ids:
+        return
+    lines = db.session.query(
+        CustomerOrder.delivery_date, OrderItem.item_type, OrderItem.item_id, OrderItem.quantity
+    ).join(OrderItem, OrderItem.order_id == CustomerOrder.id) \
+        .filter(CustomerOrder.id.in_(order_ids)) \
+        .all()
+    apply_order_lines(lines, sign)
+
+
+def apply_menu_change(menu_id, old_type, old_dishes, new_type, new_dishes):
+    """菜单组成或类型变化时，按各日期已订购的该菜单份数增量调整生产量"""
+    if old_type == new_type and old_dishes == new_dishes:
+        return
+    ordered = db.session.query(CustomerOrder.delivery_date, func.sum(OrderItem.quantity)) \
+        .join(OrderItem, OrderItem.order_id == CustomerOrder.id) \
+        .filter(OrderItem.item_type == 'menu', OrderItem.item_id == menu_id,
+                CustomerOrder.delivery_date.isnot(None), active_order_filter()) \
+        .group_by(CustomerOrder.delivery_date) \
+        .all()
+
+    deltas = defaultdict(int)
+    for delivery_date, menu_quantity in ordered:
+        for dish_id, quantity in old_dishes.items():
+            deltas[(delivery_date, dish_id, old_type)] -= int(menu_quantity) * quantity
+        for dish_id, quantity in new_dishes.items():
+            deltas[(delivery_date, dish_id, new_type)] += int(menu_quantity) * quantity
+    apply_deltas(deltas)
+
+
+def rebuild_production(delivery_date=None):
+    """从订单重新计算生产量（指定日期或全部），用于初始化和校正"""
+    delete_query = KitchenProduction.query
+    lines_query = db.session.query(
+        CustomerOrder.delivery_date, OrderItem.item_type, OrderItem.item_id, OrderItem.quantity
+    ).join(OrderItem, OrderItem.order_id == CustomerOrder.id) \
+        .filter(CustomerOrder.delivery_date.isnot(None), active_order_filter())
+    if delivery_date:
+        delete_query = delete_query.filter(KitchenProduction.delivery_date == delivery_date)
+        lines_query = lines_query.filter(CustomerOrder.delivery_date == delivery_date)
+
+    delete_query.delete(synchronize_session=False)
+    apply_order_lines(lines_query.all())
+
+
+def get_production(delivery_date):
+    """读取某日的生产单，按菜单类型分组"""
+    rows = db.session.query(KitchenProduction, Dish.name, Dish.category) \
+        .join(Dish, Dish.id == KitchenProduction.dish_id) \
+        .filter(KitchenProduction.delivery_date == delivery_date, KitchenProduction.quantity > 0) \
+        .order_by(KitchenProduction.menu_type, Dish.category, Dish.id) \
+        .all()
+
+    menu_types = defaultdict(list)
+    for production, dish_name, category in rows:
+        menu_types[production.menu_type].append({
+            'dish_id': production.dish_id,
+            'dish_name': dish_name,
+            'category': category,
+            'quantity': production.quantity
+        })
+    return menu_types
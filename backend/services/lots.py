@@ -0,0 +1,236 @@
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import bindparam, exists, func, select
+from app import db
+from models.ingredient import Ingredient, IngredientLot
+from services.stock_ledger import apply_movements
+
+ZERO = Decimal('0')
+
+
+def _quantity(value):
+    try:
+        quantity = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return None
+    # NaN 和无穷大能被 Decimal 解析，但不能参与比较
+    if not quantity.is_finite():
+        return None
+    return quantity if quantity > 0 else None
+
+
+def _date(value):
+    if isinstance(value, str):
+        return date.fromisoformat(value) if value else None
+    if value is not None and not isinstance(value, date):
+        raise ValueError(value)
+    return value
+
+
+def aggregate(items):
+    """将 [{ingredient_id, quantity}] 按食材合并，返回 ({食材ID: 数量}, 错误列表)"""
+    quantities, errors = {}, []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            item = None
+        quantity = _quantity(item.get('quantity')) if item else None
+        if not item or not item.get('ingredient_id') or quantity is None:
+            errors.append({'index': index, 'error': '请提供食材ID和大于0的数量'})
+            continue
+        quantities[item['ingredient_id']] = quantities.get(item['ingredient_id'], ZERO) + quantity
+    return quantities, errors
+
+
+def load_open_lots(ingredient_ids, lock=True):
+    """按先到期先出顺序读取（并锁定）有余量的批次，沿 (食材, 保质期) 索引读取，一次查询"""
+    query = db.session.query(
+        IngredientLot.id, IngredientLot.ingredient_id, IngredientLot.lot_number,
+        IngredientLot.expiry_date, IngredientLot.quantity_remaining
+    ).filter(
+        IngredientLot.ingredient_id.in_(ingredient_ids),
+        IngredientLot.quantity_remaining > 0
+    ).order_by(IngredientLot.ingredient_id, IngredientLot.expiry_date, IngredientLot.id)
+    rows = query.with_for_update().all() if lock else query.all()
+
+    # MySQL 升序排列时 NULL 在前；没有保质期的批次放到最后使用
+    lots, undated = {}, {}
+    for row in rows:
+        target = lots if row.expiry_date is not None else undated
+        target.setdefault(row.ingredient_id, []).append(row)
+    for ingredient_id, rows in undated.items():
+        lots.setdefault(ingredient_id, []).extend(rows)
+    return lots
+
+
+def allocate(quantities, lots):
+    """按先到期先出将需求量分配到批次
+
+    返回 (分配结果 {食材ID: [批次分配]}, 批次未覆盖的数量 {食材ID: 数量}, 批次余量更新列表)。
+    未覆盖的数量来自启用批次管理之前的库存。
+    """
+    allocations, uncovered, updates = {}, {}, []
+    for ingredient_id, need in quantities.items():
+        picks = []
+        for lot in lots.get(ingredient_id, []):
+            if need <= 0:
+                break
+            take = min(lot.quantity_remaining, need)
+            picks.append({
+                'lot_id': lot.id,
+                'lot_number': lot.lot_number,
+                'expiry_date': lot.expiry_date.isoformat() if lot.expiry_date else None,
+                'quantity': take
+            })
+            updates.append({'lot_id': lot.id, 'remaining': lot.quantity_remaining - take})
+            need -= take
+        allocations[ingredient_id] = picks
+        uncovered[ingredient_id] = need
+    return allocations, uncovered, updates
+
+
+def sync_expiry(ingredient_ids):
+    """将食材的保质期更新为其有余量批次中最早的保质期（一条 UPDATE，只涉及有批次记录的食材）"""
+    ingredient_ids = list(ingredient_ids)
+    if not ingredient_ids:
+        return
+    lots = IngredientLot.__table__
+    table = Ingredient.__table__
+    earliest = select(func.min(lots.c.expiry_date)) \
+        .where(lots.c.ingredient_id == table.c.id, lots.c.quantity_remaining > 0) \
+        .scalar_subquery()
+    has_lots = exists().where(lots.c.ingredient_id == table.c.id)
+    db.session.execute(
+        table.update().where(table.c.id.in_(ingredient_ids), has_lots).values(expiry_date=earliest)
+    )
+
+
+def consume(quantities):
+    """按先到期先出扣减批次余量；库存余额由库存流水扣减，调用方需先完成出库
+
+    返回 (分配结果, 批次未覆盖的数量)。
+    """
+    quantities = {ingredient_id: quantity for ingredient_id, quantity in quantities.items() if quantity > 0}
+    if not quantities:
+        return {}, {}
+    allocations, uncovered, updates = allocate(quantities, load_open_lots(list(quantities)))
+    if updates:
+        table = IngredientLot.__table__
+        db.session.execute(
+            table.update().where(table.c.id == bindparam('lot_id')).values(quantity_remaining=bindparam('remaining')),
+            updates
+        )
+    sync_expiry(quantities)
+    return allocations, uncovered
+
+
+def receive_lots(receipts, reference=None, operator_id=None):
+    """批量入库新批次：写入库存流水、批量插入批次并同步食材保质期
+
+    receipts 为 [{ingredient_id, quantity, expiry_date, lot_number, purchase_order_id}]，
+    返回 (结果列表, 错误列表)；有错误时不做任何修改，由调用方回滚事务。
+    """
+    rows, movements, errors = [], [], []
+    now = datetime.utcnow()
+    for index, receipt in enumerate(receipts):
+        if not isinstance(receipt, dict):
+            errors.append({'index': index, 'error': '入库记录格式错误'})
+            continue
+        quantity = _quantity(receipt.get('quantity'))
+        if not receipt.get('ingredient_id') or quantity is None:
+            errors.append({'index': index, 'error': '请提供食材ID和大于0的数量'})
+            continue
+        try:
+            expiry_date = _date(receipt.get('expiry_date'))
+        except ValueError:
+            errors.append({'index': index, 'error': '保质期格式错误，应为YYYY-MM-DD'})
+            continue
+        rows.append({
+            'ingredient_id': receipt['ingredient_id'],
+            'lot_number': receipt.get('lot_number'),
+            'purchase_order_id': receipt.get('purchase_order_id'),
+            'quantity_received': quantity,
+            'quantity_remaining': quantity,
+            'expiry_date': expiry_date,
+            'received_at': now
+        })
+        movements.append({
+            'ingredient_id': receipt['ingredient_id'],
+            'type': 'in',
+            'quantity': quantity,
+            'reference': receipt.get('reference', reference),
+            'notes': receipt.get('notes')
+        })
+    if errors:
+        return [], errors
+
+    results, errors = apply_movements(movements, reference=reference, operator_id=operator_id)
+    if errors:
+        return [], errors
+
+    # return_defaults 用于取回自增ID
+    db.session.bulk_insert_mappings(IngredientLot, rows, return_defaults=True)
+    sync_expiry({row['ingredient_id'] for row in rows})
+    for result, row in zip(results, rows):
+        result['lot_id'] = row['id']
+    return results, []
+
+
+def pick(requirements, reference=None, operator_id=None, allow_partial=False):
+    """批量领料：按食材合并需求，一次出库并按先到期先出分配到批次
+
+    allow_partial 为真时库存不足的食材按现有库存领取，否则任一食材不足即整体失败。
+    返回 (领料结果, 错误列表)；有错误时不做任何修改，由调用方回滚事务。
+    """
+    quantities, errors = aggregate(requirements)
+    if errors:
+        return [], errors
+    if not quantities:
+        return [], []
+
+    # 与库存流水相同，按食材ID顺序加锁
+    balances = {row.id: row.current_stock or ZERO for row in db.session.query(Ingredient.id, Ingredient.current_stock)
+                .filter(Ingredient.id.in_(list(quantities)))
+                .order_by(Ingredient.id)
+                .with_for_update()}
+    picked = {}
+    for ingredient_id, quantity in quantities.items():
+        if ingredient_id not in balances:
+            errors.append({'ingredient_id': ingredient_id, 'error': '食材不存在'})
+        elif quantity > balances[ingredient_id] and not allow_partial:
+            errors.append({'ingredient_id': ingredient_id, 'error': '库存不足',
+                           'requested': quantity, 'available': balances[ingredient_id]})
+        else:
+            picked[ingredient_id] = min(quantity, max(balances[ingredient_id], ZERO))
+    if errors:
+        return [], errors
+
+    movements = [{'ingredient_id': ingredient_id, 'type': 'out', 'quantity': quantity}
+                 for ingredient_id, quantity in picked.items() if quantity > 0]
+    balance_after = {}
+    if movements:
+        results, errors = apply_movements(movements, reference=reference, operator_id=operator_id)
+        if errors:
+            return [], errors
+        balance_after = {result['ingredient_id']: result['balance_after'] for result in results}
+    allocations, uncovered = consume(picked)
+
+    return [{
+        'ingredient_id': ingredient_id,
+        'requested': quantity,
+        'picked': picked[ingredient_id],
+        'shortage': quantity - picked[ingredient_id],
+        'lots': allocations.get(ingredient_id, []),
+        'untracked_quantity': uncovered.get(ingredient_id, ZERO),
+        'balance_after': balance_after.get(ingredient_id, balances[ingredient_id])
+    } for ingredient_id, quantity in quantities.items()], []
+
+
+def list_lots(ingredient_id):
+    """食材有余量的批次，按先到期先出顺序"""
+    lots = load_open_lots([ingredient_id], lock=False).get(ingredient_id, [])
+    return [{
+        'lot_id': lot.id,
+        'lot_number': lot.lot_number,
+        'expiry_date': lot.expiry_date.isoformat() if lot.expiry_date else None,
+        'quantity_remaining': lot.quantity_remaining
+    } for lot in lots]
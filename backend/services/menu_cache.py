@@ -0,0 +1,109 @@
+import hashlib
+from app import db
+from models.menu import Menu, MenuDish
+from models.dish import Dish
+from utils.cache import LRUCache
+
+MENU_CACHE_MAX_ENTRIES = 512
+
+# 每个进程各自缓存 {菜单ID: (版本号, 菜单详情)}；版本号保存在 menus 表中，
+# 任何进程修改菜单后递增版本号，其他进程读取时发现版本不一致即重新加载
+_cache = LRUCache(max_entries=MENU_CACHE_MAX_ENTRIES)
+
+
+def build_menu_detail(menu):
+    """组装菜单详情：菜单信息及其菜品和数量"""
+    menu_dishes = MenuDish.query.filter_by(menu_id=menu.id).all()
+    dish_ids = [md.dish_id for md in menu_dishes]
+    dishes = Dish.query.filter(Dish.id.in_(dish_ids)).all() if dish_ids else []
+
+    # 构建菜品与数量的映射
+    dish_quantity_map = {md.dish_id: md.quantity for md in menu_dishes}
+    dishes_with_quantity = []
+    for dish in dishes:
+        dish_dict = dish.to_dict()
+        dish_dict['quantity'] = dish_quantity_map.get(dish.id, 1)
+        dishes_with_quantity.append(dish_dict)
+
+    return {
+        'menu': menu.to_dict(),
+        'dishes': dishes_with_quantity
+    }
+
+
+def expand_menus(menus):
+    """为一批菜单嵌入菜品和数量：一次 MenuDish/Dish 连接查询，与菜单数量无关"""
+    menu_ids = [menu.id for menu in menus]
+    dishes_by_menu = {menu_id: [] for menu_id in menu_ids}
+    if menu_ids:
+        rows = db.session.query(MenuDish.menu_id, MenuDish.quantity, Dish) \
+            .join(Dish, Dish.id == MenuDish.dish_id) \
+            .filter(MenuDish.menu_id.in_(menu_ids)) \
+            .order_by(MenuDish.menu_id, MenuDish.id) \
+            .all()
+        for menu_id, quantity, dish in rows:
+            dish_dict = dish.to_dict()
+            dish_dict['quantity'] = quantity if quantity is not None else 1
+            dishes_by_menu[menu_id].append(dish_dict)
+
+    expanded = []
+    for menu in menus:
+        menu_dict = menu.to_dict()
+        menu_dict['dishes'] = dishes_by_menu[menu.id]
+        expanded.append(menu_dict)
+    return expanded
+
+
+def catalog_etag(menus, *variant):
+    """根据菜单ID与版本号计算 ETag；菜单或其菜品的任何变化都会递增版本号"""
+    digest = hashlib.md5(repr(variant).encode('utf-8'))
+    for menu in menus:
+        digest.update(f'{menu.id}:{menu.version};'.encode('ascii'))
+    return digest.hexdigest()
+
+
+def get_menu_detail(menu_id):
+    """读取菜单详情：仅按主键查询版本号，版本一致时直接返回缓存"""
+    version = db.session.query(Menu.version).filter(Menu.id == menu_id).scalar()
+    if version is None:
+        _cache.delete(menu_id)
+        return None
+
+    cached = _cache.get(menu_id)
+    if cached:
+        if cached[0] == version:
+            return cached[1]
+        _cache.record_miss()
+
+    menu = Menu.query.get(menu_id)
+    if not menu:
+        return None
+    detail = build_menu_detail(menu)
+    _cache.set(menu_id, (menu.version, detail))
+    return detail
+
+
+def invalidate_menus(menu_ids):
+    """在当前事务中递增菜单版本号，使所有进程中的缓存失效"""
+    menu_ids = list(menu_ids)
+    if not menu_ids:
+        return
+    Menu.query.filter(Menu.id.in_(menu_ids)).update(
+        {Menu.version: Menu.version + 1}, synchronize_session=False
+    )
+    for menu_id in menu_ids:
+        _cache.delete(menu_id)
+
+
+def invalidate_menus_with_dish(dish_id):
+    """菜品变化时，只使包含该菜品的菜单缓存失效"""
+    menu_ids = [row[0] for row in db.session.query(MenuDish.menu_id).filter(MenuDish.dish_id == dish_id).distinct()]
+    invalidate_menus(menu_ids)
+
+
+def forget_menu(menu_id):
+    _cache.delete(menu_id)
+
+
+def cache_stats():
+    return _cache.stats()
@@ -0,0 +1,67 @@
+from sqlalchemy import bindparam
+from app import db
+from models.menu import MenuDish
+
+
+def diff_menu_dishes(existing_rows, dish_items):
+    """比较现有菜单菜品与目标列表，返回需插入、更新、删除的记录及变更摘要
+
+    existing_rows 为 (记录ID, 菜品ID, 数量) 列表；dish_items 中同一菜品出现多次时以最后一次为准。
+    """
+    desired = {}
+    for dish_item in dish_items:
+        if 'dish_id' in dish_item and 'quantity' in dish_item:
+            desired[dish_item['dish_id']] = dish_item['quantity']
+
+    current = {}
+    duplicate_ids = []
+    for row_id, dish_id, quantity in existing_rows:
+        if dish_id in current:
+            # 历史数据中重复的关联只保留一条
+            duplicate_ids.append(row_id)
+        else:
+            current[dish_id] = (row_id, quantity if quantity is not None else 1)
+
+    inserts, updates, deletes = [], [], list(duplicate_ids)
+    changes = {'added': [], 'updated': [], 'removed': []}
+    for dish_id, quantity in desired.items():
+        if dish_id not in current:
+            inserts.append({'dish_id': dish_id, 'quantity': quantity})
+            changes['added'].append({'dish_id': dish_id, 'quantity': quantity})
+        elif current[dish_id][1] != quantity:
+            updates.append({'row_id': current[dish_id][0], 'quantity': quantity})
+            changes['updated'].append({'dish_id': dish_id, 'old_quantity': current[dish_id][1], 'quantity': quantity})
+    for dish_id, (row_id, quantity) in current.items():
+        if dish_id not in desired:
+            deletes.append(row_id)
+            changes['removed'].append({'dish_id': dish_id, 'quantity': quantity})
+
+    old_composition = {dish_id: quantity for dish_id, (_, quantity) in current.items()}
+    return inserts, updates, deletes, changes, old_composition, desired
+
+
+def sync_menu_dishes(menu_id, dish_items):
+    """按差异更新菜单菜品：插入、更新、删除各最多一次数据库往返
+
+    返回 (变更摘要, 原组成, 新组成)。
+    """
+    existing_rows = db.session.query(MenuDish.id, MenuDish.dish_id, MenuDish.quantity) \
+        .filter(MenuDish.menu_id == menu_id) \
+        .order_by(MenuDish.id) \
+        .all()
+    inserts, updates, deletes, changes, old_composition, new_composition = diff_menu_dishes(existing_rows, dish_items)
+
+    table = MenuDish.__table__
+    if inserts:
+        for row in inserts:
+            row['menu_id'] = menu_id
+        db.session.execute(table.insert(), inserts)
+    if updates:
+        db.session.execute(
+            table.update().where(table.c.id == bindparam('row_id')).values(quantity=bindparam('quantity')),
+            updates
+        )
+    if deletes:
+        db.session.execute(table.delete().where(table.c.id.in_(deletes)))
+
+    return changes, old_composition, new_composition
@@ -0,0 +1,361 @@
+import re
+from collections import Counter, OrderedDict
+from datetime import date, datetime
+from zipfile import BadZipFile
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from sqlalchemy import bindparam
+from app import db
+from models.dish import Dish
+from models.menu import Menu, MenuDish
+from services import kitchen_production, menu_cache
+from services.menu_composition import diff_menu_dishes
+
+# 表格中的餐次标题与菜单类型
+MEAL_TYPES = OrderedDict([
+    ('早餐', 'breakfast'),
+    ('早加', 'breakfast_snack'),
+    ('午餐', 'lunch'),
+    ('午加', 'lunch_snack'),
+    ('晚餐', 'dinner'),
+    ('晚加', 'dinner_snack')
+])
+MEAL_LABELS = {meal_type: label for label, meal_type in MEAL_TYPES.items()}
+
+# 按菜名关键字推断菜品类别，未匹配时归入默认类别
+CATEGORY_KEYWORDS = [
+    ('汤', '汤品'),
+    ('粥', '粥品'),
+    ('饭', '主食'),
+    ('面', '主食'),
+    ('包', '点心'),
+    ('饺', '点心'),
+    ('卷', '点心'),
+    ('饼', '点心'),
+    ('烧卖', '点心'),
+    ('馒头', '点心'),
+    ('羹', '甜品'),
+    ('露', '甜品'),
+    ('浆', '饮品'),
+    ('汁', '饮品'),
+    ('奶', '饮品')
+]
+DEFAULT_CATEGORY = '菜肴'
+
+EMPTY_MARKERS = {'无', '/', '-'}
+DATE_PATTERN = re.compile(r'(\d{4})\s*[/\-.年]\s*(\d{1,2})\s*[/\-.月]\s*(\d{1,2})')
+DAY_LABEL_PATTERN = re.compile(r'^第.+天$')
+PARENTHESES_PATTERN = re.compile(r'（.*?）|\(.*?\)')
+NAME_MAX_LENGTH = 100
+# IN 查询和 executemany 的分批大小
+IMPORT_BATCH_SIZE = 1000
+
+
+def _clean(value):
+    if value is None or isinstance(value, (datetime, date)):
+        return value
+    text = str(value).strip()
+    return text or None
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not value:
+        return None
+    match = DATE_PATTERN.search(str(value))
+    if not match:
+        return None
+    try:
+        return date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+    except ValueError:
+        return None
+
+
+def _cell(row, index):
+    return row[index] if row and index < len(row) else None
+
+
+def _is_dish(value):
+    return isinstance(value, str) and value not in EMPTY_MARKERS
+
+
+def guess_category(dish_name):
+    for keyword, category in CATEGORY_KEYWORDS:
+        if keyword in dish_name:
+            return category
+    return DEFAULT_CATEGORY
+
+
+def _read_sheet(worksheet):
+    """逐行读取工作表，返回表头行（日期、姓名、禁忌、天数）和各餐次的菜品行"""
+    headers = {'dates': None, 'names': None, 'restrictions': None, 'days': None}
+    blocks = OrderedDict()
+    current = None
+    for row in worksheet.iter_rows(values_only=True):
+        cells = [_clean(cell) for cell in row]
+        if not cells:
+            continue
+        label = cells[0] if isinstance(cells[0], str) else None
+        rest = cells[1:]
+        if label in MEAL_TYPES:
+            current = MEAL_TYPES[label]
+            blocks.setdefault(current, []).append(rest)
+        elif label == '姓名':
+            headers['names'] = rest
+        elif label == '禁忌':
+            headers['restrictions'] = rest
+        elif label is None and current is None and headers['dates'] is None \
+                and any(_parse_date(cell) for cell in rest):
+            headers['dates'] = rest
+        elif label is None and current is None \
+                and any(isinstance(cell, str) and DAY_LABEL_PATTERN.match(cell) for cell in rest):
+            headers['days'] = rest
+        elif label is None and current:
+            blocks[current].append(rest)
+        else:
+            # 其他标题或备注行结束当前餐次
+            current = None
+    return headers, blocks
+
+
+def _block_width(blocks):
+    return max((len(row) for rows in blocks.values() for row in rows), default=0)
+
+
+def _base_menu_specs(sheet_title, headers, blocks):
+    """基础餐单：每列是一天，每个餐次生成一个菜单"""
+    for column in range(_block_width(blocks)):
+        day = _cell(headers['days'], column) or f'第{column + 1}天'
+        for meal_type, rows in blocks.items():
+            dishes = [cell for cell in (_cell(row, column) for row in rows) if _is_dish(cell)]
+            if dishes:
+                yield {
+                    'name': f'基础餐单-{sheet_title}-{day}-{MEAL_LABELS[meal_type]}',
+                    'type': meal_type,
+                    'description': f'基础餐单 {sheet_title} {day}',
+                    'dishes': dishes
+                }
+
+
+def _daily_menu_specs(headers, blocks):
+    """每日厨房餐单：每个日期的第一列为当日标准餐，其余列为客户的调整（空单元格沿用标准餐）"""
+    current_date = None
+    standard_column = None
+    for column in range(_block_width(blocks)):
+        column_date = _parse_date(_cell(headers['dates'], column))
+        if column_date:
+            current_date = column_date
+            standard_column = column
+        if current_date is None:
+            continue
+
+        customer = _cell(headers['names'], column)
+        customer = PARENTHESES_PATTERN.sub('', customer).strip() if isinstance(customer, str) else None
+        restrictions = _cell(headers['restrictions'], column)
+
+        for meal_type, rows in blocks.items():
+            name = f'每日餐单-{current_date.isoformat()}-{MEAL_LABELS[meal_type]}'
+            if column == standard_column:
+                cells = [_cell(row, column) for row in rows]
+                description = f'每日厨房餐单 {current_date.isoformat()}'
+            else:
+                overrides = [_cell(row, column) for row in rows]
+                if all(cell is None for cell in overrides):
+                    continue
+                cells = [
+                    override if override is not None else _cell(row, standard_column)
+                    for override, row in zip(overrides, rows)
+                ]
+                name = f'{name}-{customer or column + 1}'
+                description = f'禁忌：{restrictions}' if restrictions else None
+            dishes = [cell for cell in cells if _is_dish(cell)]
+            if dishes:
+                yield {'name': name, 'type': meal_type, 'description': description, 'dishes': dishes}
+
+
+class MenuImportError(Exception):
+    """工作簿无法读取或格式不符"""
+    pass
+
+
+def read_menu_specs(source):
+    """以只读流式模式读取餐单工作簿；含“姓名”行的工作表按每日厨房餐单解析，否则按基础餐单解析"""
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            headers, blocks = _read_sheet(worksheet)
+            if headers['names'] and headers['dates']:
+                specs = _daily_menu_specs(headers, blocks)
+            else:
+                specs = _base_menu_specs(worksheet.title, headers, blocks)
+            for spec in specs:
+                spec['name'] = spec['name'][:NAME_MAX_LENGTH]
+                spec['dishes'] = [dish[:NAME_MAX_LENGTH] for dish in spec['dishes']]
+                yield spec
+    finally:
+        workbook.close()
+
+
+def _chunks(items, size=IMPORT_BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _ids_by_name(model, names):
+    index = {}
+    for chunk in _chunks(names):
+        for name, row_id in db.session.query(model.name, model.id).filter(model.name.in_(chunk)):
+            index.setdefault(name, row_id)
+    return index
+
+
+def import_menus(sources, dry_run=False):
+    """导入餐单工作簿：按菜名索引解析菜品，在当前事务中批量插入或更新菜品、菜单和菜单菜品
+
+    dry_run 为真时只计算差异不写入。调用方负责提交事务。
+    """
+    specs = OrderedDict()
+    for number, source in enumerate(sources, 1):
+        try:
+            for spec in read_menu_specs(source):
+                specs[spec['name']] = spec
+        except (InvalidFileException, BadZipFile, KeyError, ValueError, TypeError, IndexError):
+            raise MenuImportError(f'第{number}个文件不是有效的餐单工作簿')
+
+    # 菜名索引一次载入内存
+    dish_index = {}
+    for name, dish_id in db.session.query(Dish.name, Dish.id):
+        dish_index.setdefault(name, dish_id)
+    new_dish_names = sorted({dish for spec in specs.values() for dish in spec['dishes']} - set(dish_index))
+
+    if new_dish_names and not dry_run:
+        for chunk in _chunks(new_dish_names):
+            db.session.execute(Dish.__table__.insert(), [
+                {'name': name, 'category': guess_category(name), 'status': 'active'} for name in chunk
+            ])
+        dish_index.update(_ids_by_name(Dish, new_dish_names))
+
+    existing_menus = {}
+    for chunk in _chunks(specs):
+        for menu in Menu.query.filter(Menu.name.in_(chunk)):
+            existing_menus.setdefault(menu.name, menu)
+
+    existing_rows = {menu.id: [] for menu in existing_menus.values()}
+    for chunk in _chunks(existing_rows):
+        rows = db.session.query(MenuDish.id, MenuDish.menu_id, MenuDish.dish_id, MenuDish.quantity) \
+            .filter(MenuDish.menu_id.in_(chunk)) \
+            .order_by(MenuDish.id)
+        for row_id, menu_id, dish_id, quantity in rows:
+            existing_rows[menu_id].append((row_id, dish_id, quantity))
+
+    dish_names = {dish_id: name for name, dish_id in dish_index.items()}
+
+    def dish_key(name):
+        # 试运行时新菜品尚无ID，用占位键参与比较
+        return dish_index.get(name, ('new', name))
+
+    def dish_label(key):
+        return key[1] if isinstance(key, tuple) else dish_names.get(key, key)
+
+    summary = {
+        'dry_run': dry_run,
+        'menus_read': len(specs),
+        'dishes_created': new_dish_names,
+        'menus_created': [],
+        'menus_updated': [],
+        'menus_unchanged': 0
+    }
+    new_menus = []
+    menu_updates = []
+    dish_inserts, dish_updates, dish_deletes = [], [], []
+    changed_menus = []
+
+    for name, spec in specs.items():
+        counts = Counter(dish_key(dish) for dish in spec['dishes'])
+        dish_items = [{'dish_id': key, 'quantity': quantity} for key, quantity in counts.items()]
+        menu = existing_menus.get(name)
+        if not menu:
+            new_menus.append((spec, dish_items))
+            summary['menus_created'].append(name)
+            continue
+
+        inserts, updates, deletes, changes, old_composition, new_composition = \
+            diff_menu_dishes(existing_rows[menu.id], dish_items)
+        fields_changed = menu.type != spec['type'] or (spec['description'] and menu.description != spec['description'])
+        if not any(changes.values()) and not fields_changed and not deletes:
+            summary['menus_unchanged'] += 1
+            continue
+
+        summary['menus_updated'].append({
+            'name': name,
+            'added': [dish_label(change['dish_id']) for change in changes['added']],
+            'updated': [dish_label(change['dish_id']) for change in changes['updated']],
+            'removed': [dish_label(change['dish_id']) for change in changes['removed']]
+        })
+        if fields_changed:
+            menu_updates.append({
+                'row_id': menu.id,
+                'type': spec['type'],
+                'description': spec['description'] or menu.description
+            })
+        for row in inserts:
+            row['menu_id'] = menu.id
+        dish_inserts.extend(inserts)
+        dish_updates.extend(updates)
+        dish_deletes.extend(deletes)
+        changed_menus.append((menu.id, menu.type, old_composition, spec['type'], new_composition))
+
+    if dry_run:
+        return summary
+
+    # 新菜单批量插入后按名称取回ID
+    menu_table = Menu.__table__
+    for chunk in _chunks(new_menus):
+        db.session.execute(menu_table.insert(), [{
+            'name': spec['name'],
+            'type': spec['type'],
+            'description': spec['description'],
+            'status': 'active',
+            'created_at': datetime.utcnow(),
+            'version': 1
+        } for spec, _ in chunk])
+    new_menu_ids = _ids_by_name(Menu, [spec['name'] for spec, _ in new_menus])
+    for spec, dish_items in new_menus:
+        for dish_item in dish_items:
+            dish_inserts.append({
+                'menu_id': new_menu_ids[spec['name']],
+                'dish_id': dish_item['dish_id'],
+                'quantity': dish_item['quantity']
+            })
+
+    if menu_updates:
+        db.session.execute(
+            menu_table.update()
+            .where(menu_table.c.id == bindparam('row_id'))
+            .values(type=bindparam('type'), description=bindparam('description')),
+            menu_updates
+        )
+
+    menu_dish_table = MenuDish.__table__
+    for chunk in _chunks(dish_inserts):
+        db.session.execute(menu_dish_table.insert(), chunk)
+    for chunk in _chunks(dish_updates):
+        db.session.execute(
+            menu_dish_table.update()
+            .where(menu_dish_table.c.id == bindparam('row_id'))
+            .values(quantity=bindparam('quantity')),
+            chunk
+        )
+    for chunk in _chunks(dish_deletes):
+        db.session.execute(menu_dish_table.delete().where(menu_dish_table.c.id.in_(chunk)))
+
+    # 已有菜单变化时同步缓存和厨房生产量
+    for menu_id, old_type, old_composition, new_type, new_composition in changed_menus:
+        kitchen_production.apply_menu_change(menu_id, old_type, old_composition, new_type, new_composition)
+    menu_cache.invalidate_menus(menu_id for menu_id, *_ in changed_menus)
+
+    return summary
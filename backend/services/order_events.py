@@ -0,0 +1,126 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import json
+from app import db
+from models.order import OrderEvent
+
+# 事件中保留的订单摘要字段，保持事件表紧凑
+PAYLOAD_FIELDS = [
+    'id', 'customer_id', 'order_type', 'status', 'payment_status',
+    'payment_method', 'delivery_date', 'total_amount'
+]
+
+# 同一进程内的订阅者通过条件变量即时唤醒，其他进程的事件由轮询事件表获得
+_condition = threading.Condition()
+_generation = 0
+# 跳过的事件ID在该时间（秒）内继续补读；单次最多记录的空洞ID数
+GAP_TIMEOUT = 30
+MAX_GAP_IDS = 1000
+
+
+def order_payload(order_dict):
+    """从订单字典中提取事件摘要"""
+    return {field: order_dict[field] for field in PAYLOAD_FIELDS if field in order_dict}
+
+
+def record_order_event(event_type, order_id, payload=None):
+    """在当前事务中写入一条订单事件，需在提交后调用 notify_subscribers"""
+    event = OrderEvent(
+        order_id=order_id,
+        event_type=event_type,
+        payload=json.dumps(payload if payload is not None else {'id': order_id}, ensure_ascii=False)
+    )
+    db.session.add(event)
+    return event
+
+
+def record_order_events(event_type, payloads):
+    """批量写入订单事件（一次 executemany）"""
+    rows = [{
+        'order_id': payload['id'],
+        'event_type': event_type,
+        'payload': json.dumps(payload, ensure_ascii=False),
+        'created_at': datetime.utcnow()
+    } for payload in payloads]
+    if rows:
+        db.session.execute(OrderEvent.__table__.insert(), rows)
+
+
+def notify_subscribers():
+    """事务提交后唤醒本进程内等待中的事件流"""
+    global _generation
+    with _condition:
+        _generation += 1
+        _condition.notify_all()
+
+
+def current_generation():
+    return _generation
+
+
+def wait_for_events(generation, timeout):
+    """等待新事件通知；若取到 generation 之后已有通知则立即返回"""
+    with _condition:
+        if _generation == generation:
+            _condition.wait(timeout)
+
+
+def latest_event_id():
+    return db.session.query(db.func.max(OrderEvent.id)).scalar() or 0
+
+
+def fetch_events(since_id, limit):
+    """按ID顺序读取 since_id 之后的事件"""
+    return OrderEvent.query \
+        .filter(OrderEvent.id > since_id) \
+        .order_by(OrderEvent.id) \
+        .limit(limit) \
+        .all()
+
+
+class EventReader:
+    """按ID顺序读取事件，并补读晚提交的事件
+
+    自增ID在插入时分配、提交后才可见，ID 较小的事件可能在 ID 较大的事件已推送之后才提交，
+    单纯按 id > since_id 轮询会永久漏掉它。读取时记录被跳过的ID，在 GAP_TIMEOUT 秒内随每次轮询
+    重新查询这些ID，出现的事件补发一次；超时仍未出现的（事务已回滚）不再等待。
+    """
+
+    def __init__(self, since_id):
+        self.last_id = since_id
+        self._gaps = {}
+
+    def read(self, limit):
+        """返回 (补读到的较早事件, since 之后的新事件)"""
+        now = time.monotonic()
+        self._gaps = {event_id: deadline for event_id, deadline in self._gaps.items() if deadline > now}
+        late = []
+        if self._gaps:
+            late = OrderEvent.query.filter(OrderEvent.id.in_(list(self._gaps))).order_by(OrderEvent.id).all()
+            for event in late:
+                self._gaps.pop(event.id, None)
+
+        events = fetch_events(self.last_id, limit)
+        for event in events:
+            missing = event.id - self.last_id - 1
+            if 0 < missing and len(self._gaps) + missing <= MAX_GAP_IDS:
+                for event_id in range(self.last_id + 1, event.id):
+                    self._gaps[event_id] = now + GAP_TIMEOUT
+            self.last_id = event.id
+        return late, events
+
+
+def format_sse(event, with_id=True):
+    """补发的较早事件不带 id 行，客户端的 Last-Event-ID 保持为已推送的最大ID"""
+    if not with_id:
+        return f'event: {event.event_type}\ndata: {event.payload}\n\n'
+    return f'id: {event.id}\nevent: {event.event_type}\ndata: {event.payload}\n\n'
+
+
+def prune_order_events(keep_days=7):
+    """清理过期事件，事件表只用于断线重放"""
+    cutoff = datetime.utcnow() - timedelta(days=keep_days)
+    deleted = OrderEvent.query.filter(OrderEvent.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
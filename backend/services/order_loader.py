@@ -0,0 +1,82 @@
+from collections import defaultdict
+from models.order import OrderItem
+from models.customer import Customer
+from models.employee import Employee
+from models.dish import Dish
+from models.menu import Menu
+
+# 订单项类型与详情模型的对应关系（服务项目暂无详情表）
+ITEM_DETAIL_MODELS = {
+    'dish': Dish,
+    'menu': Menu
+}
+
+
+def load_by_ids(model, ids):
+    """一次 IN 查询批量获取记录，返回 {id: 对象}"""
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return {}
+    return {obj.id: obj for obj in model.query.filter(model.id.in_(ids)).all()}
+
+
+def hydrate_items(items):
+    """为订单项附加详细信息：按项目类型分组，每种类型只查询一次"""
+    ids_by_type = defaultdict(set)
+    for item in items:
+        ids_by_type[item.item_type].add(item.item_id)
+
+    details = {}
+    for item_type, ids in ids_by_type.items():
+        model = ITEM_DETAIL_MODELS.get(item_type)
+        if model:
+            for obj_id, obj in load_by_ids(model, ids).items():
+                details[(item_type, obj_id)] = obj.to_dict()
+
+    items_with_details = []
+    for item in items:
+        item_dict = item.to_dict()
+        detail = details.get((item.item_type, item.item_id))
+        if detail:
+            item_dict['details'] = detail
+        items_with_details.append(item_dict)
+    return items_with_details
+
+
+def load_items_by_order(order_ids):
+    """批量获取多个订单的订单项（含详情），返回 {订单ID: [订单项]}"""
+    order_ids = list(order_ids)
+    if not order_ids:
+        return {}
+    items = OrderItem.query.filter(OrderItem.order_id.in_(order_ids)).order_by(OrderItem.id).all()
+
+    items_by_order = {order_id: [] for order_id in order_ids}
+    for item_dict in hydrate_items(items):
+        items_by_order[item_dict['order_id']].append(item_dict)
+    return items_by_order
+
+
+def load_order_detail(order):
+    """组装单个订单的详情：订单、订单项、客户和服务员工"""
+    items_by_order = load_items_by_order([order.id])
+    customer = Customer.query.get(order.customer_id) if order.customer_id else None
+    employee = Employee.query.get(order.service_employee_id) if order.service_employee_id else None
+
+    return {
+        'order': order.to_dict(),
+        'items': items_by_order[order.id],
+        'customer': customer.to_dict() if customer else None,
+        'employee': employee.to_dict() if employee else None
+    }
+
+
+def expand_orders(orders):
+    """将一批订单序列化并嵌入订单项详情，查询次数与订单数量无关"""
+    items_by_order = load_items_by_order(order.id for order in orders)
+    expanded = []
+    for order in orders:
+        order_dict = order.to_dict()
+        order_dict['items'] = items_by_order.get(order.id, [])
+        expanded.append(order_dict)
+    return expanded
+
@@ -0,0 +1,28 @@
+from sqlalchemy import func, select
+from app import db
+from models.order import CustomerOrder, OrderItem
+
+
+def adjust_order_total(order_id, delta):
+    """在数据库端以单条 UPDATE 调整订单总金额，避免读-改-写造成的更新丢失"""
+    if not delta:
+        return 0
+    return CustomerOrder.query.filter(CustomerOrder.id == order_id).update(
+        {CustomerOrder.total_amount: CustomerOrder.total_amount + delta},
+        synchronize_session=False
+    )
+
+
+def recompute_order_total(order_id):
+    """按订单项小计重新汇总订单总金额"""
+    items_total = select(func.coalesce(func.sum(OrderItem.subtotal), 0)) \
+        .where(OrderItem.order_id == order_id) \
+        .scalar_subquery()
+    return CustomerOrder.query.filter(CustomerOrder.id == order_id).update(
+        {CustomerOrder.total_amount: items_total},
+        synchronize_session=False
+    )
+
+
+def get_order_total(order_id):
+    return db.session.query(CustomerOrder.total_amount).filter(CustomerOrder.id == order_id).scalar()
@@ -0,0 +1,149 @@
+from datetime import date, time
+from decimal import Decimal, InvalidOperation
+from app import db
+from models.order import CustomerOrder, OrderItem
+from models.customer import Customer
+from services.order_events import record_order_events
+from services.kitchen_production import apply_order_lines
+
+# 创建订单时可直接写入的字段
+ORDER_FIELDS = [
+    'customer_id', 'order_type', 'delivery_date', 'start_time', 'end_time', 'duration',
+    'payment_method', 'booker_name', 'booker_role', 'service_employee_id',
+    'delivery_address', 'notes'
+]
+DATE_FIELDS = {'delivery_date': date, 'start_time': time, 'end_time': time}
+CENT = Decimal('0.01')
+
+
+def validate_order_payload(data):
+    """校验单个订单的请求数据，返回错误信息，校验通过时返回 None"""
+    if not isinstance(data, dict) or not data.get('customer_id') or not data.get('order_type') or not data.get('items'):
+        return '请提供客户ID、订单类型和订单项目'
+    if not isinstance(data['items'], list):
+        return '订单项目必须为列表'
+    for item in data['items']:
+        if not isinstance(item, dict):
+            return '订单项信息不完整'
+        if not item.get('item_type') or not item.get('item_id') or not item.get('quantity') or not item.get('unit_price'):
+            return '订单项信息不完整'
+    for field, field_type in DATE_FIELDS.items():
+        value = data.get(field)
+        if not value:
+            continue
+        if not isinstance(value, str):
+            return f'{field} 格式错误'
+        try:
+            field_type.fromisoformat(value)
+        except ValueError:
+            return f'{field} 格式错误'
+    return None
+
+
+def item_row(item):
+    """新增订单项的行数据：数量、单价和小计统一为 Decimal，格式错误时抛出 ValueError"""
+    try:
+        quantity = Decimal(str(item['quantity']))
+        unit_price = Decimal(str(item['unit_price']))
+    except InvalidOperation:
+        raise ValueError('订单项数量或单价格式错误')
+    if not quantity.is_finite() or not unit_price.is_finite():
+        raise ValueError('订单项数量或单价格式错误')
+    return {
+        'item_type': item['item_type'],
+        'item_id': item['item_id'],
+        'quantity': quantity,
+        'unit_price': unit_price,
+        'subtotal': (quantity * unit_price).quantize(CENT)
+    }
+
+
+def parse_order_fields(data):
+    """取出订单可写入的字段，日期和时间字符串转换为 date/time（需先经 validate_order_payload 校验）"""
+    order_row = {field: data.get(field) for field in ORDER_FIELDS}
+    for field, field_type in DATE_FIELDS.items():
+        if isinstance(order_row[field], str) and order_row[field]:
+            order_row[field] = field_type.fromisoformat(order_row[field])
+    return order_row
+
+
+def build_order_rows(data):
+    """将订单请求数据转换为订单行和订单项行（订单项尚未关联订单ID），数量或单价格式错误时抛出 ValueError"""
+    order_row = parse_order_fields(data)
+    item_rows = [item_row(item) for item in data['items']]
+    order_row['total_amount'] = sum((row['subtotal'] for row in item_rows), Decimal('0'))
+    return order_row, item_rows
+
+
+def bulk_insert_orders(payloads):
+    """批量创建订单：先整体校验，再在同一事务中批量插入订单和订单项
+
+    返回与请求顺序一致的结果列表，每项包含 index 以及 id 或 error。
+    """
+    results = [{'index': index} for index in range(len(payloads))]
+
+    # 先校验全部订单，并一次性确认客户是否存在
+    valid = []
+    for index, data in enumerate(payloads):
+        error = validate_order_payload(data)
+        if error:
+            results[index]['error'] = error
+        else:
+            valid.append(index)
+
+    customer_ids = {payloads[index]['customer_id'] for index in valid}
+    existing_customers = set()
+    if customer_ids:
+        rows = db.session.query(Customer.id).filter(Customer.id.in_(customer_ids)).all()
+        existing_customers = {row[0] for row in rows}
+
+    order_rows = []
+    item_rows_per_order = []
+    created = []
+    for index in valid:
+        if payloads[index]['customer_id'] not in existing_customers:
+            results[index]['error'] = '客户不存在'
+            continue
+        try:
+            order_row, item_rows = build_order_rows(payloads[index])
+        except ValueError as e:
+            results[index]['error'] = str(e)
+            continue
+        order_rows.append(order_row)
+        item_rows_per_order.append(item_rows)
+        created.append(index)
+
+    if not order_rows:
+        return results
+
+    # MySQL 不支持 RETURNING，订单头需逐行插入以取得自增ID；订单项一次 executemany 写入
+    db.session.bulk_insert_mappings(CustomerOrder, order_rows, return_defaults=True)
+    all_item_rows = []
+    for order_row, item_rows in zip(order_rows, item_rows_per_order):
+        for item_row in item_rows:
+            item_row['order_id'] = order_row['id']
+            all_item_rows.append(item_row)
+    if all_item_rows:
+        db.session.execute(OrderItem.__table__.insert(), all_item_rows)
+
+    # 一次性计入所有新订单的厨房生产量
+    delivery_dates = {order_row['id']: order_row['delivery_date'] for order_row in order_rows}
+    apply_order_lines(
+        (delivery_dates[row['order_id']], row['item_type'], row['item_id'], row['quantity'])
+        for row in all_item_rows
+    )
+
+    for index, order_row in zip(created, order_rows):
+        results[index]['id'] = order_row['id']
+
+    record_order_events('created', [{
+        'id': order_row['id'],
+        'customer_id': order_row['customer_id'],
+        'order_type': order_row['order_type'],
+        'status': 'pending',
+        'payment_status': 'pending',
+        'payment_method': order_row['payment_method'],
+        'delivery_date': order_row['delivery_date'].isoformat() if order_row['delivery_date'] else None,
+        'total_amount': order_row['total_amount']
+    } for order_row in order_rows])
+    return results
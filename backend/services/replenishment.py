@@ -0,0 +1,131 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_UP
+from sqlalchemy import func
+from app import db
+from models.ingredient import Ingredient
+from models.financial import PurchaseOrder, PurchaseOrderItem
+from services.forecasting import load_lead_times
+from services.requirements import requirements_for_dates
+from services.supplier_prices import record_prices
+
+# 计入补货量的未来用量天数（含今天）
+DEMAND_HORIZON_DAYS = 3
+# 仍在途、尚未全部入库的采购单状态
+OPEN_PURCHASE_STATUSES = ('pending', 'partially_received')
+CENT = Decimal('0.01')
+ZERO = Decimal('0')
+
+
+def open_order_quantities():
+    """各食材已下单未入库的数量（一次聚合查询）"""
+    outstanding = PurchaseOrderItem.quantity - func.coalesce(PurchaseOrderItem.received_quantity, 0)
+    rows = db.session.query(PurchaseOrderItem.ingredient_id, func.sum(outstanding)) \
+        .join(PurchaseOrder, PurchaseOrder.id == PurchaseOrderItem.order_id) \
+        .filter(PurchaseOrder.status.in_(OPEN_PURCHASE_STATUSES)) \
+        .group_by(PurchaseOrderItem.ingredient_id) \
+        .all()
+    return {ingredient_id: quantity or ZERO for ingredient_id, quantity in rows}
+
+
+def upcoming_demand(horizon_days=DEMAND_HORIZON_DAYS):
+    """未来几天订单所需的食材用量（按配方展开，只取可换算为库存单位的部分）"""
+    today = date.today()
+    result = requirements_for_dates(today, today + timedelta(days=horizon_days - 1))
+    return {row['ingredient_id']: Decimal(str(row['required_quantity']))
+            for row in result['requirements'] if row['current_stock'] is not None}
+
+
+def plan_replenishment(horizon_days=DEMAND_HORIZON_DAYS):
+    """计算每个食材的补货量并按供应商分组
+
+    补货量 = 最低库存 + 未来用量 - 当前库存 - 在途数量，向上取整到 0.01。
+    没有单价的食材按 0 下单并标记 price_missing，由采购人员补填。
+    返回 ({供应商ID: [采购行]}, 未指定供应商的食材列表)。
+    """
+    ingredients = db.session.query(
+        Ingredient.id, Ingredient.name, Ingredient.unit, Ingredient.supplier_id,
+        Ingredient.current_stock, Ingredient.minimum_stock, Ingredient.price
+    ).all()
+    on_order = open_order_quantities()
+    demand = upcoming_demand(horizon_days)
+
+    by_supplier, unassigned = defaultdict(list), []
+    for ingredient in ingredients:
+        target = (ingredient.minimum_stock or ZERO) + demand.get(ingredient.id, ZERO)
+        available = (ingredient.current_stock or ZERO) + on_order.get(ingredient.id, ZERO)
+        quantity = (target - available).quantize(CENT, rounding=ROUND_UP)
+        if quantity <= 0:
+            continue
+        line = {
+            'ingredient_id': ingredient.id,
+            'ingredient_name': ingredient.name,
+            'unit': ingredient.unit,
+            'quantity': quantity,
+            'unit_price': ingredient.price or ZERO,
+            'subtotal': (quantity * (ingredient.price or ZERO)).quantize(CENT),
+            'price_missing': not ingredient.price
+        }
+        if ingredient.supplier_id:
+            by_supplier[ingredient.supplier_id].append(line)
+        else:
+            unassigned.append(line)
+    return by_supplier, unassigned
+
+
+def create_purchase_orders(by_supplier, notes=None):
+    """为每个供应商创建一张采购单：采购单一次批量插入（取回ID），采购项目一次 executemany"""
+    supplier_ids = sorted(by_supplier)
+    if not supplier_ids:
+        return []
+    today = date.today()
+    lead_times = load_lead_times(supplier_ids)
+
+    orders = [{
+        'supplier_id': supplier_id,
+        'order_date': today,
+        'expected_delivery': today + timedelta(days=int(lead_time)),
+        'total_amount': sum((line['subtotal'] for line in by_supplier[supplier_id]), ZERO),
+        'status': 'pending',
+        'notes': notes
+    } for supplier_id, lead_time in zip(supplier_ids, lead_times)]
+    # return_defaults 用于取回自增ID
+    db.session.bulk_insert_mappings(PurchaseOrder, orders, return_defaults=True)
+
+    items = [{
+        'order_id': order['id'],
+        'ingredient_id': line['ingredient_id'],
+        'quantity': line['quantity'],
+        'unit_price': line['unit_price'],
+        'subtotal': line['subtotal']
+    } for order in orders for line in by_supplier[order['supplier_id']]]
+    db.session.execute(PurchaseOrderItem.__table__.insert(), items)
+
+    # 采购单价同时记入供应商价格历史；没有单价的采购行不是报价，不记入
+    record_prices([{
+        'supplier_id': order['supplier_id'],
+        'ingredient_id': line['ingredient_id'],
+        'unit_price': line['unit_price'],
+        'observed_on': today,
+        'purchase_order_id': order['id']
+    } for order in orders for line in by_supplier[order['supplier_id']] if not line['price_missing']])
+    return orders
+
+
+def run_replenishment(dry_run=False, horizon_days=DEMAND_HORIZON_DAYS):
+    """执行一次补货：计算补货量并生成采购单，调用方负责提交或回滚"""
+    by_supplier, unassigned = plan_replenishment(horizon_days)
+    orders = [] if dry_run else create_purchase_orders(
+        by_supplier, notes=f'自动补货 {date.today().isoformat()}'
+    )
+    order_ids = {order['supplier_id']: order['id'] for order in orders}
+    return {
+        'dry_run': dry_run,
+        'purchase_orders': [{
+            'id': order_ids.get(supplier_id),
+            'supplier_id': supplier_id,
+            'total_amount': sum((line['subtotal'] for line in lines), ZERO),
+            'items': lines
+        } for supplier_id, lines in sorted(by_supplier.items())],
+        'unassigned': unassigned
+    }
@@ -0,0 +1,136 @@
+import pandas as pd
+from app import db
+from models.dish import DishIngredient
+from models.ingredient import Ingredient
+from models.kitchen import KitchenProduction
+from models.order import CustomerOrder, OrderItem
+from services.kitchen_production import expand_lines
+
+# 配方单位换算为食材库存单位：配方单位 -> (库存单位, 系数)
+UNIT_CONVERSIONS = {
+    ('g', 'kg'): 0.001,
+    ('克', '千克'): 0.001,
+    ('克', '公斤'): 0.001,
+    ('克', '斤'): 0.002,
+    ('斤', '千克'): 0.5,
+    ('斤', '公斤'): 0.5,
+    ('kg', 'g'): 1000,
+    ('千克', '克'): 1000,
+    ('公斤', '克'): 1000,
+    ('ml', 'l'): 0.001,
+    ('毫升', '升'): 0.001,
+}
+
+DISH_COLUMNS = ['delivery_date', 'dish_id', 'servings']
+
+
+def unit_factor(recipe_unit, stock_unit):
+    """配方单位到库存单位的换算系数，无法换算时返回 None"""
+    if not recipe_unit or recipe_unit == stock_unit:
+        return 1.0
+    return UNIT_CONVERSIONS.get((recipe_unit.lower(), (stock_unit or '').lower()))
+
+
+def production_frame(date_from, date_to):
+    """某日期范围内需制作的菜品份数（读取厨房生产量汇总表，一次查询）"""
+    rows = db.session.query(
+        KitchenProduction.delivery_date, KitchenProduction.dish_id, KitchenProduction.quantity
+    ).filter(
+        KitchenProduction.delivery_date >= date_from,
+        KitchenProduction.delivery_date <= date_to,
+        KitchenProduction.quantity > 0
+    ).all()
+    return pd.DataFrame(rows, columns=DISH_COLUMNS)
+
+
+def orders_frame(order_ids):
+    """指定订单需制作的菜品份数：套餐菜单展开为菜品"""
+    lines = db.session.query(
+        CustomerOrder.delivery_date, OrderItem.item_type, OrderItem.item_id, OrderItem.quantity
+    ).join(OrderItem, OrderItem.order_id == CustomerOrder.id) \
+        .filter(CustomerOrder.id.in_(order_ids)) \
+        .all()
+    totals = expand_lines(lines)
+    rows = [(delivery_date, dish_id, quantity) for (delivery_date, dish_id, _), quantity in totals.items()]
+    return pd.DataFrame(rows, columns=DISH_COLUMNS)
+
+
+def recipe_frame(dish_ids):
+    """菜品配方及食材库存（一次连接查询）"""
+    rows = db.session.query(
+        DishIngredient.dish_id, DishIngredient.ingredient_id, DishIngredient.quantity, DishIngredient.unit,
+        Ingredient.name, Ingredient.unit, Ingredient.current_stock
+    ).join(Ingredient, Ingredient.id == DishIngredient.ingredient_id) \
+        .filter(DishIngredient.dish_id.in_(dish_ids)) \
+        .all()
+    return pd.DataFrame(rows, columns=[
+        'dish_id', 'ingredient_id', 'per_serving', 'recipe_unit', 'ingredient_name', 'stock_unit', 'current_stock'
+    ])
+
+
+def explode_requirements(dishes, by_date=False):
+    """将菜品份数展开为食材需求量，并与当前库存比较
+
+    dishes 为包含 delivery_date、dish_id、servings 列的 DataFrame；
+    配方单位可换算为库存单位时按库存单位汇总，否则按配方单位单独列出且不计算缺口。
+    """
+    result = {'requirements': [], 'missing_recipes': [], 'dish_count': 0}
+    if dishes.empty:
+        return result
+    dishes = dishes.groupby(['delivery_date', 'dish_id'], as_index=False)['servings'].sum()
+    dish_ids = dishes['dish_id'].unique().tolist()
+    result['dish_count'] = len(dish_ids)
+
+    recipes = recipe_frame(dish_ids)
+    result['missing_recipes'] = sorted(set(dish_ids) - set(recipes['dish_id'].tolist()))
+    if recipes.empty:
+        return result
+
+    recipes['per_serving'] = recipes['per_serving'].astype(float)
+    recipes['current_stock'] = recipes['current_stock'].fillna(0).astype(float)
+    factors = [unit_factor(recipe_unit, stock_unit)
+               for recipe_unit, stock_unit in zip(recipes['recipe_unit'], recipes['stock_unit'])]
+    recipes['factor'] = pd.Series(factors, index=recipes.index, dtype=float)
+    convertible = recipes['factor'].notna()
+    recipes['unit'] = recipes['stock_unit'].where(convertible, recipes['recipe_unit'])
+    recipes['per_serving'] = recipes['per_serving'] * recipes['factor'].fillna(1.0)
+    recipes['convertible'] = convertible
+
+    merged = dishes.merge(recipes, on='dish_id', how='inner')
+    merged['required'] = merged['servings'] * merged['per_serving']
+
+    keys = ['ingredient_id', 'ingredient_name', 'unit', 'convertible']
+    totals = merged.groupby(keys, as_index=False).agg(
+        required=('required', 'sum'), current_stock=('current_stock', 'first')
+    )
+    totals['shortage'] = (totals['required'] - totals['current_stock']).clip(lower=0)
+    totals = totals.sort_values(['shortage', 'ingredient_id'], ascending=[False, True])
+
+    for row in totals.itertuples(index=False):
+        result['requirements'].append({
+            'ingredient_id': int(row.ingredient_id),
+            'ingredient_name': row.ingredient_name,
+            'unit': row.unit,
+            'required_quantity': round(float(row.required), 3),
+            'current_stock': round(float(row.current_stock), 3) if row.convertible else None,
+            'shortage': round(float(row.shortage), 3) if row.convertible else None
+        })
+
+    if by_date:
+        daily = merged.groupby(['delivery_date', 'ingredient_id', 'unit'], as_index=False)['required'].sum() \
+            .sort_values(['delivery_date', 'ingredient_id'])
+        result['by_date'] = [{
+            'date': row.delivery_date.isoformat() if row.delivery_date is not None else None,
+            'ingredient_id': int(row.ingredient_id),
+            'unit': row.unit,
+            'required_quantity': round(float(row.required), 3)
+        } for row in daily.itertuples(index=False)]
+    return result
+
+
+def requirements_for_dates(date_from, date_to, by_date=False):
+    return explode_requirements(production_frame(date_from, date_to), by_date)
+
+
+def requirements_for_orders(order_ids, by_date=False):
+    return explode_requirements(orders_frame(order_ids), by_date)
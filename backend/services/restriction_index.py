@@ -0,0 +1,157 @@
+import re
+import threading
+import time
+from app import db
+from models.dish import Dish
+
+# 禁忌文本的分隔符：原有的英文逗号，以及录入中常见的中文逗号、顿号和中英文分号。
+# 空白不作分隔符，"peanut oil" 这类多词禁忌保持为一个禁忌词
+RESTRICTION_SEPARATORS = re.compile(r'[,，、;；]+')
+# 其他进程修改菜品后，本进程的索引最多在该时间（秒）后重建
+INDEX_TTL = 300
+
+
+def split_restrictions(text):
+    """将禁忌文本拆分为规范化的禁忌词（去首尾空白、小写、去重并保持顺序）
+
+    与原先按英文逗号逐字比较相比：两侧都去掉首尾空白，英文禁忌词不区分大小写。
+    """
+    if not text:
+        return []
+    tokens = []
+    for token in RESTRICTION_SEPARATORS.split(text):
+        token = token.strip().lower()
+        if token and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+
+def iter_bits(bits):
+    """按从小到大的顺序遍历位集中被置位的菜品ID"""
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+
+def to_bits(ids):
+    bits = 0
+    for item_id in ids:
+        bits |= 1 << item_id
+    return bits
+
+
+class RestrictionIndex:
+    """禁忌词倒排索引：禁忌词 -> 含该禁忌的菜品ID位集"""
+
+    def __init__(self, ttl=INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._dish_tokens = {}
+        self._dish_names = {}
+        self._active_bits = 0
+        self._built_at = None
+        self._listeners = []
+        # 每次全量构建后递增，依赖本索引的结构据此判断是否需要重建
+        self.generation = 0
+
+    def build(self):
+        """从菜品表全量构建索引（一次查询）"""
+        postings, dish_tokens, dish_names, active_bits = {}, {}, {}, 0
+        for dish_id, name, restrictions, status in db.session.query(Dish.id, Dish.name, Dish.restrictions, Dish.status):
+            tokens = split_restrictions(restrictions)
+            dish_tokens[dish_id] = tokens
+            dish_names[dish_id] = name
+            if status != 'inactive':
+                active_bits |= 1 << dish_id
+            for token in tokens:
+                postings[token] = postings.get(token, 0) | (1 << dish_id)
+        with self._lock:
+            self._postings = postings
+            self._dish_tokens = dish_tokens
+            self._dish_names = dish_names
+            self._active_bits = active_bits
+            self._built_at = time.monotonic()
+            self.generation += 1
+
+    def ensure_fresh(self):
+        if self._built_at is None or time.monotonic() - self._built_at > self.ttl:
+            self.build()
+
+    def subscribe(self, listener):
+        """注册菜品禁忌变化的回调 listener(菜品ID, 禁忌词列表)，菜品删除时禁忌词为 None"""
+        self._listeners.append(listener)
+
+    def _notify(self, dish_id, tokens):
+        for listener in self._listeners:
+            listener(dish_id, tokens)
+
+    def update_dish(self, dish):
+        """菜品新增或修改后增量更新索引"""
+        tokens = split_restrictions(dish.restrictions)
+        with self._lock:
+            self._remove(dish.id)
+            bit = 1 << dish.id
+            self._dish_tokens[dish.id] = tokens
+            self._dish_names[dish.id] = dish.name
+            if dish.status != 'inactive':
+                self._active_bits |= bit
+            for token in tokens:
+                self._postings[token] = self._postings.get(token, 0) | bit
+        self._notify(dish.id, tokens)
+
+    def remove_dish(self, dish_id):
+        with self._lock:
+            self._remove(dish_id)
+        self._notify(dish_id, None)
+
+    def _remove(self, dish_id):
+        bit = 1 << dish_id
+        for token in self._dish_tokens.pop(dish_id, []):
+            remaining = self._postings.get(token, 0) & ~bit
+            if remaining:
+                self._postings[token] = remaining
+            else:
+                self._postings.pop(token, None)
+        self._dish_names.pop(dish_id, None)
+        self._active_bits &= ~bit
+
+    def known_bits(self, dish_ids):
+        """已知菜品的位集；ID 可为整数或数字字符串，无法转换时抛出 ValueError"""
+        dish_ids = [int(dish_id) for dish_id in dish_ids]
+        with self._lock:
+            return to_bits(dish_id for dish_id in dish_ids if dish_id in self._dish_names)
+
+    def active_bits(self):
+        return self._active_bits
+
+    def dish_names(self, bits):
+        """位集中各菜品的 (ID, 名称)，按ID排序"""
+        with self._lock:
+            return [(dish_id, self._dish_names.get(dish_id)) for dish_id in iter_bits(bits)]
+
+    def unsafe_bits(self, tokens, dish_bits):
+        """dish_bits 中含任一禁忌词的菜品位集"""
+        with self._lock:
+            bits = 0
+            for token in tokens:
+                bits |= self._postings.get(token, 0)
+            return bits & dish_bits
+
+    def find_restricted(self, tokens, dish_bits):
+        """返回 dish_bits 中每个受限菜品及其首个命中的禁忌词（按禁忌词顺序）"""
+        matches = {}
+        remaining = dish_bits
+        with self._lock:
+            for token in tokens:
+                hits = self._postings.get(token, 0) & remaining
+                for dish_id in iter_bits(hits):
+                    matches[dish_id] = (self._dish_names.get(dish_id), token)
+                remaining &= ~hits
+                if not remaining:
+                    break
+        return matches
+
+
+restriction_index = RestrictionIndex()
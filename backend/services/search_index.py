@@ -0,0 +1,196 @@
+import re
+import threading
+import time
+from app import db
+from models.dish import Dish
+from models.ingredient import Ingredient
+from models.supplier import Supplier
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:  # 未安装 pypinyin 时不支持拼音首字母搜索
+    lazy_pinyin = None
+
+# 可搜索的对象类型及其字段，第一个字段为名称
+SEARCH_SOURCES = {
+    'dish': (Dish, ('name', 'description', 'ingredients')),
+    'ingredient': (Ingredient, ('name', 'origin')),
+    'supplier': (Supplier, ('name', 'products')),
+}
+# 名称命中权重最高，其次为名称拼音首字母，其余字段最低
+FIELD_WEIGHTS = {'name': 3, 'pinyin': 2}
+DEFAULT_FIELD_WEIGHT = 1
+# 其他进程修改数据后，本进程的索引最多在该时间（秒）后重建
+INDEX_TTL = 300
+
+# \w 在 Python 3 中包含中文字符，按非文字字符切分片段
+SEGMENT_SEPARATORS = re.compile(r'[\W_]+')
+
+
+def normalize(text):
+    return text.strip().lower() if text else ''
+
+
+def segments(text):
+    return [segment for segment in SEGMENT_SEPARATORS.split(normalize(text)) if segment]
+
+
+def index_grams(text):
+    """文档分词：每个片段的单字和相邻二元组"""
+    grams = set()
+    for segment in segments(text):
+        grams.update(segment)
+        grams.update(segment[i:i + 2] for i in range(len(segment) - 1))
+    return grams
+
+
+def query_grams(text):
+    """查询分词：单字片段用单字，其余片段用二元组"""
+    grams = set()
+    for segment in segments(text):
+        if len(segment) == 1:
+            grams.add(segment)
+        else:
+            grams.update(segment[i:i + 2] for i in range(len(segment) - 1))
+    return grams
+
+
+def pinyin_initials(text):
+    """中文名称的拼音首字母，如 红烧肉 -> hsr"""
+    if not text or lazy_pinyin is None:
+        return ''
+    return ''.join(lazy_pinyin(text, style=Style.FIRST_LETTER, errors='ignore')).lower()
+
+
+class SearchIndex:
+    """中文二元组倒排索引：词元 -> {(类型, ID): 权重}"""
+
+    def __init__(self, ttl=INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._docs = {}
+        self._built_at = None
+
+    @staticmethod
+    def _document(doc_type, values):
+        fields = dict(zip(SEARCH_SOURCES[doc_type][1], values))
+        texts = {field: normalize(value) for field, value in fields.items() if value}
+        initials = pinyin_initials(fields.get('name'))
+        if initials:
+            texts['pinyin'] = initials
+        weights = {}
+        for field, text in texts.items():
+            weight = FIELD_WEIGHTS.get(field, DEFAULT_FIELD_WEIGHT)
+            for gram in index_grams(text):
+                if weight > weights.get(gram, 0):
+                    weights[gram] = weight
+        return {'name': fields.get('name'), 'texts': texts, 'weights': weights}
+
+    def build(self):
+        """从各数据表全量构建索引（每种类型一次查询）"""
+        postings, docs = {}, {}
+        for doc_type, (model, fields) in SEARCH_SOURCES.items():
+            columns = [getattr(model, field) for field in fields]
+            for row in db.session.query(model.id, *columns):
+                key = (doc_type, row[0])
+                docs[key] = self._document(doc_type, row[1:])
+                for gram, weight in docs[key]['weights'].items():
+                    postings.setdefault(gram, {})[key] = weight
+        with self._lock:
+            self._postings = postings
+            self._docs = docs
+            self._built_at = time.monotonic()
+
+    def ensure_fresh(self):
+        if self._built_at is None or time.monotonic() - self._built_at > self.ttl:
+            self.build()
+
+    def update(self, doc_type, obj):
+        """对象新增或修改后增量更新索引"""
+        values = [getattr(obj, field) for field in SEARCH_SOURCES[doc_type][1]]
+        document = self._document(doc_type, values)
+        key = (doc_type, obj.id)
+        with self._lock:
+            self._remove(key)
+            self._docs[key] = document
+            for gram, weight in document['weights'].items():
+                self._postings.setdefault(gram, {})[key] = weight
+
+    def remove(self, doc_type, obj_id):
+        with self._lock:
+            self._remove((doc_type, obj_id))
+
+    def _remove(self, key):
+        document = self._docs.pop(key, None)
+        if not document:
+            return
+        for gram in document['weights']:
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.pop(key, None)
+                if not posting:
+                    del self._postings[gram]
+
+    @staticmethod
+    def _rank(query, document):
+        """按命中位置分级：名称完全相同 > 名称前缀 > 名称包含 > 拼音首字母 > 其他字段"""
+        texts = document['texts']
+        name = texts.get('name', '')
+        if name == query:
+            return 100, 'name'
+        if name.startswith(query):
+            return 80, 'name'
+        if query in name:
+            return 60, 'name'
+        initials = texts.get('pinyin', '')
+        if initials.startswith(query):
+            return 50, 'pinyin'
+        if query in initials:
+            return 40, 'pinyin'
+        for field, text in texts.items():
+            if query in text:
+                return 20, field
+        # 多个片段的查询：每个片段都需出现在某个字段中
+        parts = segments(query)
+        if len(parts) > 1 and all(any(part in text for text in texts.values()) for part in parts):
+            return 10, None
+        return 0, None
+
+    def search(self, text, doc_types=None, limit=20):
+        """返回按相关度排序的结果及命中总数"""
+        query = normalize(text)
+        grams = query_grams(query)
+        if not grams:
+            return [], 0
+
+        with self._lock:
+            # 从最短的倒排表开始求交集
+            postings = sorted((self._postings.get(gram, {}) for gram in grams), key=len)
+            if not postings[0]:
+                return [], 0
+            candidates = {key: weight for key, weight in postings[0].items()
+                          if not doc_types or key[0] in doc_types}
+            for posting in postings[1:]:
+                candidates = {key: weight + posting[key] for key, weight in candidates.items() if key in posting}
+                if not candidates:
+                    return [], 0
+
+            results = []
+            for key, weight in candidates.items():
+                document = self._docs[key]
+                rank, field = self._rank(query, document)
+                if rank:
+                    results.append((rank, weight, document['name'] or '', key, field))
+
+        results.sort(key=lambda result: (-result[0], -result[1], len(result[2]), result[3]))
+        return [{
+            'type': doc_type,
+            'id': doc_id,
+            'name': name,
+            'matched_field': field,
+            'score': round(rank + weight / len(grams), 2)
+        } for rank, weight, name, (doc_type, doc_id), field in results[:limit]], len(results)
+
+
+search_index = SearchIndex()
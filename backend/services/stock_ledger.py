@@ -0,0 +1,139 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import bindparam, func
+from app import db
+from models.ingredient import Ingredient, StockMovement
+
+MOVEMENT_TYPES = ('in', 'out')
+
+
+class StockError(Exception):
+    """库存变动失败，status_code 为对应的 HTTP 状态码"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def parse_movement(movement):
+    """校验一条库存变动，返回 (食材ID, 类型, 数量)，不合法时抛出 StockError"""
+    if not isinstance(movement, dict) or 'quantity' not in movement or 'type' not in movement:
+        raise StockError('请提供数量和操作类型（in或out）')
+    if movement['type'] not in MOVEMENT_TYPES:
+        raise StockError('操作类型必须是in或out')
+    try:
+        quantity = Decimal(str(movement['quantity']))
+    except (InvalidOperation, ValueError):
+        raise StockError('数量格式错误')
+    # NaN 和无穷大能被 Decimal 解析，但不能参与比较
+    if not quantity.is_finite():
+        raise StockError('数量格式错误')
+    if quantity <= 0:
+        raise StockError('数量必须大于0')
+    return movement.get('ingredient_id'), movement['type'], quantity
+
+
+def apply_movement(ingredient_id, movement_type, quantity, reference=None, operator_id=None, notes=None):
+    """单条库存变动：以一条条件 UPDATE 修改余额（出库要求余额充足），并写入流水，返回变动后余额
+
+    条件判断和扣减在同一条语句中完成，并发出库不会超卖。
+    """
+    stock = func.coalesce(Ingredient.current_stock, 0)
+    query = Ingredient.query.filter(Ingredient.id == ingredient_id)
+    if movement_type == 'out':
+        updated = query.filter(stock >= quantity).update(
+            {Ingredient.current_stock: stock - quantity}, synchronize_session=False
+        )
+    else:
+        updated = query.update({Ingredient.current_stock: stock + quantity}, synchronize_session=False)
+
+    if not updated:
+        if not db.session.query(Ingredient.id).filter(Ingredient.id == ingredient_id).scalar():
+            raise StockError('食材不存在', 404)
+        raise StockError('库存不足')
+
+    # UPDATE 已锁定该行，读到的即为本事务写入的余额
+    balance = db.session.query(Ingredient.current_stock).filter(Ingredient.id == ingredient_id).scalar()
+    db.session.execute(StockMovement.__table__.insert(), [{
+        'ingredient_id': ingredient_id,
+        'movement_type': movement_type,
+        'quantity': quantity,
+        'balance_after': balance,
+        'reference': reference,
+        'operator_id': operator_id,
+        'notes': notes,
+        'created_at': datetime.utcnow()
+    }])
+    return balance
+
+
+def apply_movements(movements, reference=None, operator_id=None):
+    """批量库存变动，全部成功或全部失败
+
+    按食材ID顺序 SELECT ... FOR UPDATE 锁定涉及的食材（固定加锁顺序避免死锁），
+    在内存中依次计算余额，再以一次 executemany 更新余额、一次 executemany 写入流水。
+    返回 (结果列表, 错误列表)；有错误时不做任何修改，由调用方回滚事务。
+    """
+    parsed, errors = [], []
+    for index, movement in enumerate(movements):
+        try:
+            ingredient_id, movement_type, quantity = parse_movement(movement)
+        except StockError as e:
+            errors.append({'index': index, 'error': e.message})
+            continue
+        if not ingredient_id:
+            errors.append({'index': index, 'error': '请提供食材ID'})
+            continue
+        parsed.append((index, ingredient_id, movement_type, quantity, movement))
+    if errors:
+        return [], errors
+
+    ingredient_ids = sorted({item[1] for item in parsed})
+    rows = db.session.query(Ingredient.id, Ingredient.current_stock) \
+        .filter(Ingredient.id.in_(ingredient_ids)) \
+        .order_by(Ingredient.id) \
+        .with_for_update() \
+        .all()
+    balances = {row.id: row.current_stock or Decimal('0') for row in rows}
+
+    results, ledger_rows = [], []
+    now = datetime.utcnow()
+    for index, ingredient_id, movement_type, quantity, movement in parsed:
+        if ingredient_id not in balances:
+            errors.append({'index': index, 'error': '食材不存在'})
+            continue
+        if movement_type == 'out' and balances[ingredient_id] < quantity:
+            errors.append({'index': index, 'error': '库存不足'})
+            continue
+        balances[ingredient_id] += quantity if movement_type == 'in' else -quantity
+        ledger_rows.append({
+            'ingredient_id': ingredient_id,
+            'movement_type': movement_type,
+            'quantity': quantity,
+            'balance_after': balances[ingredient_id],
+            'reference': movement.get('reference', reference),
+            'operator_id': operator_id,
+            'notes': movement.get('notes'),
+            'created_at': now
+        })
+        results.append({'index': index, 'ingredient_id': ingredient_id, 'balance_after': balances[ingredient_id]})
+    if errors:
+        return [], errors
+
+    table = Ingredient.__table__
+    touched = {row['ingredient_id'] for row in ledger_rows}
+    db.session.execute(
+        table.update().where(table.c.id == bindparam('row_id')).values(current_stock=bindparam('balance')),
+        [{'row_id': ingredient_id, 'balance': balances[ingredient_id]} for ingredient_id in sorted(touched)]
+    )
+    db.session.execute(StockMovement.__table__.insert(), ledger_rows)
+    return results, []
+
+
+def list_movements(ingredient_id, limit, before_id=None):
+    """按时间倒序读取食材的库存流水，before_id 为上一页最后一条的ID"""
+    query = StockMovement.query.filter(StockMovement.ingredient_id == ingredient_id)
+    if before_id:
+        query = query.filter(StockMovement.id < before_id)
+    return query.order_by(StockMovement.id.desc()).limit(limit).all()
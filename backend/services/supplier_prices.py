@@ -0,0 +1,190 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import or_, tuple_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from app import db
+from models.supplier import Supplier, SupplierPrice, SupplierCurrentPrice
+from models.financial import PurchaseOrder, PurchaseOrderItem
+from services.supplier_scores import record_price_changes
+
+# 默认的"近期"范围和涨跌幅告警阈值（%）
+DEFAULT_RECENT_DAYS = 90
+DEFAULT_ALERT_PCT = 10
+REBUILD_CHUNK_SIZE = 5000
+HUNDRED = Decimal('100')
+# change_pct 列为 DECIMAL(8, 2)，极端涨跌幅（如 0.01 → 100.00）截断到列的取值范围
+MAX_CHANGE_PCT = Decimal('999999.99')
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
+
+
+def record_prices(observations, update_scores=True):
+    """记录一批采购价格：写入价格历史（含相对该供应商上次价格的涨跌幅），并更新各供应商的当前价格
+
+    observations 为 [{supplier_id, ingredient_id, unit_price, observed_on, purchase_order_id}]，按时间顺序排列；
+    update_scores 为真时同时将价格变动计入供应商评分的价格稳定性。
+    单价为空或不大于 0 的记录（如未填单价的采购项目）不是有效报价，不记入。
+    """
+    observations = [obs for obs in observations
+                    if obs.get('supplier_id') and obs.get('ingredient_id') and obs.get('unit_price') is not None
+                    and Decimal(str(obs['unit_price'])) > 0]
+    if not observations:
+        return 0
+
+    # 一次查询取回涉及的 (供应商, 食材) 的当前价格
+    pairs = list({(obs['supplier_id'], obs['ingredient_id']) for obs in observations})
+    latest = {(row.supplier_id, row.ingredient_id): (row.unit_price, row.observed_on)
+              for row in db.session.query(SupplierCurrentPrice.supplier_id, SupplierCurrentPrice.ingredient_id,
+                                          SupplierCurrentPrice.unit_price, SupplierCurrentPrice.observed_on)
+              .filter(tuple_(SupplierCurrentPrice.supplier_id, SupplierCurrentPrice.ingredient_id).in_(pairs))}
+
+    history, changed = [], set()
+    now = datetime.utcnow()
+    for obs in observations:
+        pair = (obs['supplier_id'], obs['ingredient_id'])
+        price = Decimal(str(obs['unit_price']))
+        observed_on = _to_date(obs.get('observed_on')) or date.today()
+        previous = latest.get(pair)
+        previous_price = previous[0] if previous else None
+        change_pct = None
+        if previous_price:
+            change_pct = ((price - previous_price) * HUNDRED / previous_price).quantize(Decimal('0.01'))
+            change_pct = max(min(change_pct, MAX_CHANGE_PCT), -MAX_CHANGE_PCT)
+        history.append({
+            'supplier_id': pair[0],
+            'ingredient_id': pair[1],
+            'unit_price': price,
+            'previous_price': previous_price,
+            'change_pct': change_pct,
+            'observed_on': observed_on,
+            'purchase_order_id': obs.get('purchase_order_id'),
+            'created_at': now
+        })
+        # 补录的较早价格只进入历史，不覆盖当前价格
+        if not previous or observed_on >= previous[1]:
+            latest[pair] = (price, observed_on)
+            changed.add(pair)
+
+    db.session.execute(SupplierPrice.__table__.insert(), history)
+    if update_scores:
+        record_price_changes([(row['supplier_id'], row['change_pct']) for row in history])
+    if not changed:
+        return len(history)
+    table = SupplierCurrentPrice.__table__
+    stmt = mysql_insert(table)
+    stmt = stmt.on_duplicate_key_update(unit_price=stmt.inserted.unit_price, observed_on=stmt.inserted.observed_on)
+    db.session.execute(stmt, [{
+        'supplier_id': supplier_id,
+        'ingredient_id': ingredient_id,
+        'unit_price': latest[(supplier_id, ingredient_id)][0],
+        'observed_on': latest[(supplier_id, ingredient_id)][1]
+    } for supplier_id, ingredient_id in changed])
+    return len(history)
+
+
+def record_purchase_order_prices(order_ids):
+    """记录指定采购单中各采购项目的单价（一次连接查询）"""
+    rows = db.session.query(
+        PurchaseOrder.supplier_id, PurchaseOrderItem.ingredient_id, PurchaseOrderItem.unit_price,
+        PurchaseOrder.order_date, PurchaseOrder.id
+    ).join(PurchaseOrderItem, PurchaseOrderItem.order_id == PurchaseOrder.id) \
+        .filter(PurchaseOrder.id.in_(list(order_ids))) \
+        .order_by(PurchaseOrder.order_date, PurchaseOrder.id, PurchaseOrderItem.id) \
+        .all()
+    return record_prices([{
+        'supplier_id': supplier_id,
+        'ingredient_id': ingredient_id,
+        'unit_price': unit_price,
+        'observed_on': order_date,
+        'purchase_order_id': order_id
+    } for supplier_id, ingredient_id, unit_price, order_date, order_id in rows])
+
+
+def rebuild_price_history():
+    """从全部采购项目重建价格历史和当前价格，按采购日期分块处理，返回记录数
+
+    与下单时的增量记录规则一致：价格在下单时即为一次报价，采购单之后被取消也不撤销，因此包含已取消的采购单。
+    """
+    SupplierPrice.query.delete(synchronize_session=False)
+    SupplierCurrentPrice.query.delete(synchronize_session=False)
+    query = db.session.query(
+        PurchaseOrder.supplier_id, PurchaseOrderItem.ingredient_id, PurchaseOrderItem.unit_price,
+        PurchaseOrder.order_date, PurchaseOrder.id
+    ).join(PurchaseOrderItem, PurchaseOrderItem.order_id == PurchaseOrder.id) \
+        .order_by(PurchaseOrder.order_date, PurchaseOrder.id, PurchaseOrderItem.id)
+
+    total, offset = 0, 0
+    while True:
+        rows = query.offset(offset).limit(REBUILD_CHUNK_SIZE).all()
+        if not rows:
+            return total
+        # 评分中的价格稳定性已在记录价格时累计，重建历史时不重复计入
+        total += record_prices([{
+            'supplier_id': supplier_id,
+            'ingredient_id': ingredient_id,
+            'unit_price': unit_price,
+            'observed_on': order_date,
+            'purchase_order_id': order_id
+        } for supplier_id, ingredient_id, unit_price, order_date, order_id in rows], update_scores=False)
+        offset += len(rows)
+
+
+def current_prices(ingredient_ids, since=None):
+    """各食材的供应商当前价格，按食材、价格升序（沿 (食材, 价格) 索引读取）"""
+    query = db.session.query(SupplierCurrentPrice, Supplier.name) \
+        .join(Supplier, Supplier.id == SupplierCurrentPrice.supplier_id) \
+        .filter(SupplierCurrentPrice.ingredient_id.in_(ingredient_ids))
+    if since:
+        query = query.filter(SupplierCurrentPrice.observed_on >= since)
+    prices = {}
+    for price, supplier_name in query.order_by(SupplierCurrentPrice.ingredient_id, SupplierCurrentPrice.unit_price):
+        price_dict = price.to_dict()
+        price_dict['supplier_name'] = supplier_name
+        prices.setdefault(price.ingredient_id, []).append(price_dict)
+    return prices
+
+
+def price_trend(ingredient_id, since):
+    """食材在指定日期之后的价格历史（沿 (食材, 日期) 索引读取）"""
+    rows = SupplierPrice.query \
+        .filter(SupplierPrice.ingredient_id == ingredient_id, SupplierPrice.observed_on >= since) \
+        .order_by(SupplierPrice.observed_on, SupplierPrice.id) \
+        .all()
+    return [row.to_dict() for row in rows]
+
+
+def price_alerts(since, threshold, ingredient_id=None):
+    """涨跌幅超过阈值的价格变动，最近的在前"""
+    query = SupplierPrice.query.filter(
+        SupplierPrice.observed_on >= since,
+        or_(SupplierPrice.change_pct >= threshold, SupplierPrice.change_pct <= -threshold)
+    )
+    if ingredient_id:
+        query = query.filter(SupplierPrice.ingredient_id == ingredient_id)
+    return [row.to_dict() for row in query.order_by(SupplierPrice.observed_on.desc(), SupplierPrice.id.desc())]
+
+
+def price_index(ingredient_ids=None, days=DEFAULT_RECENT_DAYS, alert_pct=DEFAULT_ALERT_PCT):
+    """价格索引：指定食材的最低价供应商、各供应商当前价格和价格走势，以及涨跌幅告警"""
+    since = date.today() - timedelta(days=days)
+    result = {'days': days, 'alert_pct': alert_pct}
+    if ingredient_ids:
+        recent = current_prices(ingredient_ids, since)
+        all_prices = current_prices(ingredient_ids)
+        result['ingredients'] = [{
+            'ingredient_id': ingredient_id,
+            'cheapest': recent[ingredient_id][0] if recent.get(ingredient_id) else None,
+            'suppliers': all_prices.get(ingredient_id, []),
+            'trend': price_trend(ingredient_id, since) if len(ingredient_ids) == 1 else None
+        } for ingredient_id in ingredient_ids]
+        result['alerts'] = [alert for ingredient_id in ingredient_ids
+                            for alert in price_alerts(since, alert_pct, ingredient_id)]
+    else:
+        result['alerts'] = price_alerts(since, alert_pct)
+    return result
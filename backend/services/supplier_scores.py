@@ -0,0 +1,170 @@
+import math
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import and_, bindparam, case, func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from app import db
+from models.supplier import SupplierPrice, SupplierScore
+from models.financial import PurchaseOrder, PurchaseOrderItem
+from models.ingredient import IngredientLot
+
+# 综合评分中各指标的权重，缺少数据的指标不参与加权
+SCORE_WEIGHTS = {'on_time_rate': 0.5, 'fill_rate': 0.3, 'price_stability': 0.2}
+# 价格涨跌幅的均方根达到该值（%）时价格稳定性为 0
+PRICE_VOLATILITY_LIMIT = 20
+# 单次涨跌幅计入平方和时的上限（%），避免极端值溢出 price_change_square_sum 列
+MAX_SCORED_CHANGE_PCT = Decimal('1000')
+# 按增量累加的计数列
+COUNTER_COLUMNS = ('delivered_orders', 'timed_orders', 'on_time_orders', 'ordered_quantity',
+                   'first_received_quantity', 'price_changes', 'price_change_square_sum')
+RATE_PLACES = Decimal('0.0001')
+SCORE_PLACES = Decimal('0.01')
+
+
+def compute_metrics(row):
+    """由累计计数计算准时率、首次到货满足率、价格稳定性和综合评分"""
+    on_time_rate = row.on_time_orders / row.timed_orders if row.timed_orders else None
+    fill_rate = None
+    if row.ordered_quantity:
+        fill_rate = min(float(row.first_received_quantity) / float(row.ordered_quantity), 1.0)
+    price_stability = None
+    if row.price_changes:
+        rms = math.sqrt(float(row.price_change_square_sum) / row.price_changes)
+        price_stability = max(1 - rms / PRICE_VOLATILITY_LIMIT, 0.0)
+
+    metrics = {'on_time_rate': on_time_rate, 'fill_rate': fill_rate, 'price_stability': price_stability}
+    weighted = [(metrics[name], weight) for name, weight in SCORE_WEIGHTS.items() if metrics[name] is not None]
+    score = None
+    if weighted:
+        score = 100 * sum(value * weight for value, weight in weighted) / sum(weight for _, weight in weighted)
+
+    result = {name: Decimal(str(value)).quantize(RATE_PLACES) if value is not None else None
+              for name, value in metrics.items()}
+    result['score'] = Decimal(str(score)).quantize(SCORE_PLACES) if score is not None else None
+    return result
+
+
+def refresh_scores(supplier_ids=None):
+    """重新计算指定供应商（默认全部）的指标和评分（一次查询、一次 executemany）"""
+    query = db.session.query(SupplierScore.supplier_id, *[getattr(SupplierScore, column) for column in COUNTER_COLUMNS])
+    if supplier_ids is not None:
+        query = query.filter(SupplierScore.supplier_id.in_(supplier_ids))
+    now = datetime.utcnow()
+    rows = [dict(compute_metrics(row), row_id=row.supplier_id, updated_at=now) for row in query]
+    if rows:
+        table = SupplierScore.__table__
+        db.session.execute(
+            table.update().where(table.c.supplier_id == bindparam('row_id')).values(
+                on_time_rate=bindparam('on_time_rate'), fill_rate=bindparam('fill_rate'),
+                price_stability=bindparam('price_stability'), score=bindparam('score'),
+                updated_at=bindparam('updated_at')
+            ),
+            rows
+        )
+    return len(rows)
+
+
+def apply_deltas(deltas):
+    """将各供应商的计数增量累加到评分表（不存在时插入），再刷新这些供应商的评分
+
+    deltas 为 {供应商ID: {计数列: 增量}}，按供应商ID顺序写入。
+    """
+    supplier_ids = sorted(supplier_id for supplier_id in deltas if supplier_id)
+    if not supplier_ids:
+        return
+    table = SupplierScore.__table__
+    stmt = mysql_insert(table)
+    stmt = stmt.on_duplicate_key_update({column: table.c[column] + stmt.inserted[column] for column in COUNTER_COLUMNS})
+    db.session.execute(stmt, [
+        dict({column: deltas[supplier_id].get(column, 0) for column in COUNTER_COLUMNS}, supplier_id=supplier_id)
+        for supplier_id in supplier_ids
+    ])
+    refresh_scores(supplier_ids)
+
+
+def record_receipts(events):
+    """采购单收货后更新供应商评分
+
+    events 为 [{supplier_id, first_receipt, ordered_quantity, received_quantity, delivered_at, expected_delivery}]：
+    首次收货计入满足率，全部到货（delivered_at 不为空）计入准时率。
+    """
+    deltas = {}
+    for event in events:
+        delta = deltas.setdefault(event['supplier_id'], {})
+        if event['first_receipt']:
+            delta['ordered_quantity'] = delta.get('ordered_quantity', 0) + event['ordered_quantity']
+            delta['first_received_quantity'] = delta.get('first_received_quantity', 0) + event['received_quantity']
+        if event.get('delivered_at'):
+            delta['delivered_orders'] = delta.get('delivered_orders', 0) + 1
+            if event.get('expected_delivery'):
+                delta['timed_orders'] = delta.get('timed_orders', 0) + 1
+                if event['delivered_at'].date() <= event['expected_delivery']:
+                    delta['on_time_orders'] = delta.get('on_time_orders', 0) + 1
+    apply_deltas(deltas)
+
+
+def record_price_changes(changes):
+    """记录供应商价格变动后更新价格稳定性，changes 为 [(供应商ID, 涨跌幅%)]"""
+    deltas = {}
+    for supplier_id, change_pct in changes:
+        if change_pct is None:
+            continue
+        delta = deltas.setdefault(supplier_id, {'price_changes': 0, 'price_change_square_sum': Decimal('0')})
+        delta['price_changes'] += 1
+        delta['price_change_square_sum'] += min(abs(Decimal(str(change_pct))), MAX_SCORED_CHANGE_PCT) ** 2
+    apply_deltas(deltas)
+
+
+def rebuild_scores():
+    """从采购单、批次入库记录和价格历史重新汇总全部供应商的计数和评分，返回供应商数量"""
+    counters = {}
+
+    def add(rows, columns):
+        for row in rows:
+            if row[0] is None:
+                continue
+            counter = counters.setdefault(row[0], {column: 0 for column in COUNTER_COLUMNS})
+            for column, value in zip(columns, row[1:]):
+                counter[column] = value or 0
+
+    add(db.session.query(
+        PurchaseOrder.supplier_id,
+        func.count(PurchaseOrder.id),
+        func.count(PurchaseOrder.expected_delivery),
+        func.sum(case((func.date(PurchaseOrder.delivered_at) <= PurchaseOrder.expected_delivery, 1), else_=0))
+    ).filter(PurchaseOrder.status == 'delivered', PurchaseOrder.delivered_at.isnot(None))
+        .group_by(PurchaseOrder.supplier_id),
+        ('delivered_orders', 'timed_orders', 'on_time_orders'))
+
+    # 同一次收货的批次入库时间相同，最早入库时间的批次即为首次收货
+    first_receipts = db.session.query(
+        IngredientLot.purchase_order_id.label('order_id'),
+        func.min(IngredientLot.received_at).label('received_at')
+    ).filter(IngredientLot.purchase_order_id.isnot(None)) \
+        .group_by(IngredientLot.purchase_order_id) \
+        .subquery()
+    add(db.session.query(PurchaseOrder.supplier_id, func.sum(PurchaseOrderItem.quantity))
+        .join(first_receipts, first_receipts.c.order_id == PurchaseOrder.id)
+        .join(PurchaseOrderItem, PurchaseOrderItem.order_id == PurchaseOrder.id)
+        .group_by(PurchaseOrder.supplier_id),
+        ('ordered_quantity',))
+    add(db.session.query(PurchaseOrder.supplier_id, func.sum(IngredientLot.quantity_received))
+        .join(first_receipts, first_receipts.c.order_id == PurchaseOrder.id)
+        .join(IngredientLot, and_(IngredientLot.purchase_order_id == first_receipts.c.order_id,
+                                  IngredientLot.received_at == first_receipts.c.received_at))
+        .group_by(PurchaseOrder.supplier_id),
+        ('first_received_quantity',))
+
+    add(db.session.query(
+        SupplierPrice.supplier_id,
+        func.count(SupplierPrice.change_pct),
+        func.sum(func.least(SupplierPrice.change_pct * SupplierPrice.change_pct, MAX_SCORED_CHANGE_PCT ** 2))
+    ).group_by(SupplierPrice.supplier_id),
+        ('price_changes', 'price_change_square_sum'))
+
+    SupplierScore.query.delete(synchronize_session=False)
+    if counters:
+        db.session.execute(SupplierScore.__table__.insert(), [
+            dict(counter, supplier_id=supplier_id) for supplier_id, counter in sorted(counters.items())
+        ])
+    return refresh_scores()
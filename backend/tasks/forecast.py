@@ -0,0 +1,18 @@
+from app import db
+from services.forecasting import run_forecast
+
+# 默认每天凌晨执行
+DEFAULT_FORECAST_TIME = '02:30'
+
+
+def run(apply_minimum_stock=False):
+    count = run_forecast(apply_minimum_stock=apply_minimum_stock)
+    db.session.commit()
+    return count
+
+
+def register(scheduler, app):
+    """注册每日预测任务；写数据库，多进程中只需一个进程执行"""
+    apply_minimum_stock = app.config.get('FORECAST_APPLY_MINIMUM_STOCK', False)
+    scheduler.register('ingredient_forecast', lambda: run(apply_minimum_stock),
+                       daily_at=app.config.get('FORECAST_TIME', DEFAULT_FORECAST_TIME), singleton=True)
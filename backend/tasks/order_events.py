@@ -0,0 +1,16 @@
+from services.order_events import prune_order_events
+
+# 默认每天凌晨清理，事件保留天数
+DEFAULT_PRUNE_TIME = '04:00'
+DEFAULT_KEEP_DAYS = 7
+
+
+def run(keep_days=DEFAULT_KEEP_DAYS):
+    return prune_order_events(keep_days)
+
+
+def register(scheduler, app):
+    """注册每日清理过期订单事件的任务；多进程中只需一个进程执行"""
+    keep_days = app.config.get('ORDER_EVENT_KEEP_DAYS', DEFAULT_KEEP_DAYS)
+    scheduler.register('order_event_prune', lambda: run(keep_days),
+                       daily_at=app.config.get('ORDER_EVENT_PRUNE_TIME', DEFAULT_PRUNE_TIME), singleton=True)
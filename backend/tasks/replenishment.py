@@ -0,0 +1,19 @@
+from app import db
+from services.replenishment import run_replenishment
+
+# 默认在每日用量预测之后执行
+DEFAULT_REPLENISH_TIME = '03:00'
+
+
+def run():
+    summary = run_replenishment()
+    db.session.commit()
+    return summary
+
+
+def register(scheduler, app):
+    """注册每日补货任务；生成采购单，多进程中只需一个进程执行"""
+    if not app.config.get('REPLENISH_ENABLED', True):
+        return
+    scheduler.register('replenishment', run,
+                       daily_at=app.config.get('REPLENISH_TIME', DEFAULT_REPLENISH_TIME), singleton=True)
@@ -0,0 +1,132 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# 调度线程的最长休眠时间（秒）
+TICK_SECONDS = 1.0
+# 单例任务的 MySQL 命名锁前缀
+LOCK_PREFIX = 'meal_system:'
+
+
+class Job:
+    """定时任务：每隔 interval 秒执行，或每天在 daily_at（HH:MM，本地时间）执行"""
+
+    def __init__(self, name, func, interval=None, daily_at=None, singleton=False, run_at_start=False):
+        if not interval and not daily_at:
+            raise ValueError('请提供执行间隔或每日执行时间')
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.daily_at = daily_at
+        self.singleton = singleton
+        self.last_run = None
+        self.last_error = None
+        self.next_run = datetime.now() if run_at_start else self._next_after(datetime.now())
+
+    def _next_after(self, moment):
+        if self.interval:
+            return moment + timedelta(seconds=self.interval)
+        hour, minute = (int(part) for part in self.daily_at.split(':'))
+        candidate = moment.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        return candidate if candidate > moment else candidate + timedelta(days=1)
+
+    def schedule_next(self):
+        self.next_run = self._next_after(datetime.now())
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'interval': self.interval,
+            'daily_at': self.daily_at,
+            'singleton': self.singleton,
+            'last_run': self.last_run.isoformat() if self.last_run else None,
+            'next_run': self.next_run.isoformat() if self.next_run else None,
+            'last_error': self.last_error
+        }
+
+
+class Scheduler:
+    """进程内的后台任务调度器（守护线程）
+
+    每个进程各自运行调度器；singleton=True 的任务通过 MySQL GET_LOCK 保证同一时刻只有一个进程执行，
+    适用于写数据库的任务。维护进程内存状态的任务（如告警索引）则在每个进程中各自执行。
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._app = None
+
+    def register(self, name, func, interval=None, daily_at=None, singleton=False, run_at_start=False):
+        job = Job(name, func, interval, daily_at, singleton, run_at_start)
+        with self._lock:
+            self._jobs[name] = job
+        self._wakeup.set()
+        return job
+
+    def start(self, app):
+        """启动调度线程，重复调用无副作用"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._app = app
+            self._thread = threading.Thread(target=self._run, name='task-scheduler', daemon=True)
+            self._thread.start()
+
+    def jobs(self):
+        with self._lock:
+            return [job.to_dict() for job in self._jobs.values()]
+
+    def _run(self):
+        while True:
+            now = datetime.now()
+            with self._lock:
+                due = [job for job in self._jobs.values() if job.next_run <= now]
+                upcoming = [job.next_run for job in self._jobs.values() if job.next_run > now]
+            for job in due:
+                job.schedule_next()
+                self._execute(job)
+            delay = TICK_SECONDS
+            if upcoming and not due:
+                delay = min(TICK_SECONDS, max((min(upcoming) - datetime.now()).total_seconds(), 0))
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+
+    def _execute(self, job):
+        with self._app.app_context():
+            from app import db
+            lock_connection = None
+            try:
+                if job.singleton:
+                    # 命名锁属于数据库连接，使用独立连接持有到任务结束（任务内的提交会归还会话连接）
+                    lock_connection = db.engine.connect()
+                    acquired = lock_connection.execute(
+                        text('SELECT GET_LOCK(:name, 0)'), {'name': LOCK_PREFIX + job.name}
+                    ).scalar()
+                    if acquired != 1:
+                        return False
+                started = time.monotonic()
+                job.func()
+                job.last_error = None
+                logger.info('任务 %s 执行完成，用时 %.2f 秒', job.name, time.monotonic() - started)
+                return True
+            except Exception as e:
+                db.session.rollback()
+                job.last_error = str(e)
+                logger.exception('任务 %s 执行失败', job.name)
+                return False
+            finally:
+                job.last_run = datetime.now()
+                if lock_connection is not None:
+                    lock_connection.execute(text('SELECT RELEASE_LOCK(:name)'), {'name': LOCK_PREFIX + job.name})
+                    lock_connection.close()
+                db.session.remove()
+
+
+scheduler = Scheduler()
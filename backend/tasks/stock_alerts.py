@@ -0,0 +1,148 @@
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+from app import db
+from models.ingredient import Ingredient
+
+# 告警类型按紧急程度排序：已过期 > 缺货 > 即将过期 > 库存不足
+ALERT_PRIORITIES = {'expired': 0, 'out_of_stock': 1, 'expiring': 2, 'low_stock': 3}
+# 距保质期不超过该天数的食材视为即将过期
+DEFAULT_EXPIRY_DAYS = 3
+# 后台全量扫描间隔（秒）：处理日期变化以及其他进程的修改
+SCAN_INTERVAL = 300
+
+ALERT_COLUMNS = (Ingredient.id, Ingredient.name, Ingredient.unit, Ingredient.current_stock,
+                 Ingredient.minimum_stock, Ingredient.expiry_date)
+
+
+def evaluate(row, today, expiry_days):
+    """计算单个食材当前的告警列表"""
+    ingredient_id, name, unit, current_stock, minimum_stock, expiry_date = row
+    current_stock = current_stock if current_stock is not None else Decimal('0')
+    minimum_stock = minimum_stock if minimum_stock is not None else Decimal('0')
+    base = {
+        'ingredient_id': ingredient_id,
+        'ingredient_name': name,
+        'unit': unit,
+        'current_stock': current_stock,
+        'minimum_stock': minimum_stock,
+        'expiry_date': expiry_date.isoformat() if expiry_date else None
+    }
+
+    alerts = []
+    if expiry_date and current_stock > 0:
+        days_left = (expiry_date - today).days
+        if days_left < 0:
+            alerts.append(dict(base, type='expired', days_left=days_left))
+        elif days_left <= expiry_days:
+            alerts.append(dict(base, type='expiring', days_left=days_left))
+    if current_stock <= minimum_stock:
+        if current_stock <= 0:
+            alerts.append(dict(base, type='out_of_stock'))
+        else:
+            alerts.append(dict(base, type='low_stock', stock_ratio=round(float(current_stock / minimum_stock), 4)))
+    return alerts
+
+
+def urgency(alert):
+    """排序键：类型优先级，其次剩余天数或库存比例"""
+    return (
+        ALERT_PRIORITIES[alert['type']],
+        alert.get('days_left', 0),
+        alert.get('stock_ratio', 0),
+        alert['ingredient_id']
+    )
+
+
+class StockAlertIndex:
+    """物化的库存与保质期告警集合 {食材ID: [告警]}，按需生成按紧急程度排序的列表"""
+
+    def __init__(self, expiry_days=DEFAULT_EXPIRY_DAYS):
+        self.expiry_days = expiry_days
+        self._lock = threading.Lock()
+        self._alerts = {}
+        self._sorted = None
+        self._scanned_on = None
+        # 扫描期间被增量刷新的食材，扫描结束后需重新计算，避免被扫描结果覆盖
+        self._scanning = False
+        self._refreshed_during_scan = set()
+        self.scanned_at = None
+
+    def scan(self):
+        """全量扫描食材表（一次查询，只读取告警相关的列）"""
+        today = date.today()
+        alerts = {}
+        with self._lock:
+            self._scanning = True
+            self._refreshed_during_scan = set()
+        for row in db.session.query(*ALERT_COLUMNS):
+            ingredient_alerts = evaluate(row, today, self.expiry_days)
+            if ingredient_alerts:
+                alerts[row[0]] = ingredient_alerts
+        with self._lock:
+            self._alerts = alerts
+            self._sorted = None
+            self._scanned_on = today
+            self._scanning = False
+            self.scanned_at = datetime.now()
+            refreshed = self._refreshed_during_scan
+        if refreshed:
+            # 结束扫描所在的读事务，重新读取最新数据
+            db.session.rollback()
+            self.refresh(refreshed)
+
+    def ensure_scanned(self):
+        # 首次使用或跨日后同步扫描一次，保证过期判断基于当天日期
+        if self._scanned_on != date.today():
+            self.scan()
+
+    def refresh(self, ingredient_ids):
+        """库存变动或食材修改后，只重新计算指定食材的告警（一次 IN 查询）"""
+        ingredient_ids = set(ingredient_ids)
+        if not ingredient_ids or self._scanned_on is None:
+            return
+        today = date.today()
+        rows = db.session.query(*ALERT_COLUMNS).filter(Ingredient.id.in_(ingredient_ids)).all()
+        updated = {row[0]: evaluate(row, today, self.expiry_days) for row in rows}
+        with self._lock:
+            for ingredient_id in ingredient_ids:
+                ingredient_alerts = updated.get(ingredient_id)
+                if ingredient_alerts:
+                    self._alerts[ingredient_id] = ingredient_alerts
+                else:
+                    self._alerts.pop(ingredient_id, None)
+            if self._scanning:
+                self._refreshed_during_scan.update(ingredient_ids)
+            self._sorted = None
+
+    def alerts(self, types=None):
+        with self._lock:
+            if self._sorted is None:
+                self._sorted = sorted(
+                    (alert for ingredient_alerts in self._alerts.values() for alert in ingredient_alerts),
+                    key=urgency
+                )
+            alerts = self._sorted
+        if types:
+            alerts = [alert for alert in alerts if alert['type'] in types]
+        return alerts
+
+    def ingredient_ids(self, alert_types):
+        with self._lock:
+            return sorted(ingredient_id for ingredient_id, ingredient_alerts in self._alerts.items()
+                          if any(alert['type'] in alert_types for alert in ingredient_alerts))
+
+    def counts(self):
+        counts = {alert_type: 0 for alert_type in ALERT_PRIORITIES}
+        for alert in self.alerts():
+            counts[alert['type']] += 1
+        return counts
+
+
+stock_alerts = StockAlertIndex()
+
+
+def register(scheduler, app):
+    """注册后台扫描任务；每个进程维护自己的告警集合，因此不是单例任务"""
+    stock_alerts.expiry_days = app.config.get('ALERT_EXPIRY_DAYS', DEFAULT_EXPIRY_DAYS)
+    scheduler.register('stock_alerts', stock_alerts.scan, interval=SCAN_INTERVAL, run_at_start=True)
@@ -0,0 +1,29 @@
+import os
+import sys
+import types
+
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+# 测试不连接 MySQL、不启动后台任务
+os.environ.setdefault('DATABASE_URI', 'sqlite://')
+os.environ.setdefault('SCHEDULER_ENABLED', 'false')
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def _test_app_module():
+    """只含 app 和 db 的测试应用，注册为 app 模块，供模型和服务的 `from app import db` 使用
+
+    app.py 导入时会注册全部蓝图、建表、创建管理员并构建内存索引，测试不导入它。
+    """
+    module = types.ModuleType('app')
+    module.app = Flask('app')
+    module.app.config['SQLALCHEMY_DATABASE_URI'] = os.environ['DATABASE_URI']
+    module.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    module.db = SQLAlchemy(module.app)
+    # 模型中的 db.Decimal 列类型对应 SQLAlchemy 的 Numeric
+    module.db.Decimal = module.db.Numeric
+    return module
+
+
+sys.modules.setdefault('app', _test_app_module())
@@ -0,0 +1,94 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from app import app, db
+from models.financial import Transaction, TransactionDailyRollup, TransactionMonthlyRollup
+from services import financial_rollups
+from services.financial_rollups import _contribution, _previous_values, summary
+
+
+def _values(**overrides):
+    values = {
+        'transaction_date': datetime(2024, 3, 5, 12, 30), 'type': 'income', 'category': '餐费',
+        'payment_method': None, 'amount': Decimal('100.00'), 'status': 'completed'
+    }
+    values.update(overrides)
+    return values
+
+
+def test_contribution_key_and_amount():
+    assert _contribution(_values()) == ((date(2024, 3, 5), 'income', '餐费', ''), Decimal('100.00'))
+
+
+def test_contribution_parses_string_date():
+    key, _ = _contribution(_values(transaction_date='2024-03-05T08:00:00', payment_method='cash'))
+    assert key == (date(2024, 3, 5), 'income', '餐费', 'cash')
+
+
+@pytest.mark.parametrize('overrides', [{'status': 'pending'}, {'transaction_date': None}, {'amount': None}])
+def test_contribution_skips_excluded(overrides):
+    assert _contribution(_values(**overrides)) is None
+
+
+def test_summary_month_splits_partial_months(monkeypatch):
+    calls = []
+
+    def fake_load(model, start, end):
+        calls.append((model, start, end))
+        if model is TransactionMonthlyRollup:
+            return [(date(2024, 2, 1), 'income', '餐费', '', Decimal('200'), 2)]
+        if start.month == 1:
+            return [(date(2024, 1, 20), 'expense', '采购', 'cash', Decimal('30'), 1)]
+        return [(date(2024, 3, 3), 'income', '餐费', '', Decimal('50'), 1)]
+
+    monkeypatch.setattr(financial_rollups, '_load', fake_load)
+    result = summary('month', date(2024, 1, 15), date(2024, 3, 10))
+
+    assert calls == [
+        (TransactionDailyRollup, date(2024, 1, 15), date(2024, 2, 1)),
+        (TransactionMonthlyRollup, date(2024, 2, 1), date(2024, 3, 1)),
+        (TransactionDailyRollup, date(2024, 3, 1), date(2024, 3, 11))
+    ]
+    assert [period['period'] for period in result['periods']] == ['2024-01-01', '2024-02-01', '2024-03-01']
+    assert result['totals'] == {
+        'income': Decimal('250'), 'expense': Decimal('30'), 'net': Decimal('220'), 'transaction_count': 4
+    }
+
+
+def test_summary_month_within_single_month_uses_daily(monkeypatch):
+    calls = []
+    monkeypatch.setattr(financial_rollups, '_load', lambda model, start, end: calls.append((model, start, end)) or [])
+    summary('month', date(2024, 3, 2), date(2024, 3, 20))
+    assert calls == [(TransactionDailyRollup, date(2024, 3, 2), date(2024, 3, 21))]
+
+
+@pytest.fixture
+def session(monkeypatch):
+    # 汇总写入使用 MySQL upsert，这里只记录监听器产生的增量
+    changes = []
+    monkeypatch.setattr(financial_rollups, 'apply_changes', lambda connection, rows: changes.extend(rows))
+    with app.app_context():
+        Transaction.__table__.create(db.engine)
+        try:
+            yield db.session, changes
+        finally:
+            db.session.remove()
+            Transaction.__table__.drop(db.engine)
+
+
+def test_update_expired_transaction_reverses_old_amount(session):
+    db_session, changes = session
+    transaction = Transaction(**_values())
+    db_session.add(transaction)
+    db_session.commit()
+    changes.clear()
+
+    # 提交后属性已过期，直接修改而不先读取
+    transaction.amount = Decimal('30.00')
+    assert _previous_values(transaction)['amount'] == Decimal('100.00')
+    db_session.commit()
+
+    key = (date(2024, 3, 5), 'income', '餐费', '')
+    assert changes == [(key, Decimal('-100.00'), -1), (key, Decimal('30.00'), 1)]
@@ -0,0 +1,57 @@
+from collections import namedtuple
+from decimal import Decimal
+
+from services.goods_receipt import _receipt_lines, receive_purchase_orders
+
+Item = namedtuple('Item', 'id ingredient_id quantity received_quantity')
+
+ITEMS = [
+    Item(1, 10, Decimal('5'), Decimal('0')),
+    Item(2, 11, Decimal('3'), Decimal('1')),
+    Item(3, 11, Decimal('4'), Decimal('0')),
+    Item(4, 12, Decimal('2'), Decimal('2'))
+]
+
+
+def _errors(requested):
+    return [error['error'] for error in _receipt_lines(7, ITEMS, requested)[1]]
+
+
+def test_receive_all_outstanding():
+    lines, errors = _receipt_lines(7, ITEMS, None)
+    assert [(item.id, quantity) for item, quantity, _ in lines] == [(1, Decimal('5')), (2, Decimal('2')), (3, Decimal('4'))]
+    assert errors == []
+
+
+def test_partial_receipt_by_item_and_ingredient():
+    lines, errors = _receipt_lines(7, ITEMS, [
+        {'ingredient_id': 10, 'quantity': '2.5'},
+        {'item_id': 3, 'quantity': 4},
+        {'item_id': 2}
+    ])
+    assert errors == []
+    assert [(item.id, quantity) for item, quantity, _ in lines] == [(1, Decimal('2.5')), (3, Decimal('4')), (2, Decimal('2'))]
+
+
+def test_ambiguous_ingredient_requires_item_id():
+    assert _errors([{'ingredient_id': 11, 'quantity': 1}]) == ['该食材对应多个采购项目，请提供item_id']
+
+
+def test_invalid_lines():
+    assert _errors('all') == ['items 必须为列表']
+    assert _errors([['item', 1], {'item_id': [1]}, {'ingredient_id': 99}]) == [
+        '收货行格式错误', '采购项目不存在', '采购项目不存在'
+    ]
+    assert _errors([{'item_id': 1, 'quantity': 'NaN'}, {'item_id': 1, 'quantity': 0}]) == ['数量格式错误', '数量必须大于0']
+
+
+def test_over_receipt_is_rejected():
+    assert _errors([{'item_id': 1, 'quantity': 3}, {'item_id': 1, 'quantity': 3}]) == ['收货数量超过未到货数量']
+    assert _errors([{'item_id': 4, 'quantity': 1}]) == ['收货数量超过未到货数量']
+
+
+def test_malformed_receipts_are_rejected_before_querying():
+    assert receive_purchase_orders(['1']) == ([], [{'error': '收货记录格式错误'}])
+    assert receive_purchase_orders([{'purchase_order_id': [1]}]) == ([], [{'error': '请提供采购单ID'}])
+    assert receive_purchase_orders([{'purchase_order_id': 1}, {'purchase_order_id': 1}]) == \
+        ([], [{'error': '同一采购单只能出现一次'}])
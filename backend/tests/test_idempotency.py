@@ -0,0 +1,39 @@
+from utils.idempotency import MemoryIdempotencyStore, NEW, DONE, IN_PROGRESS
+
+
+def test_first_request_is_new_then_in_progress():
+    store = MemoryIdempotencyStore()
+    assert store.begin('key', 'hash') == (NEW, None)
+    status, entry = store.begin('key', 'hash')
+    assert status == IN_PROGRESS
+    assert entry['request_hash'] == 'hash'
+
+
+def test_completed_request_is_replayed():
+    store = MemoryIdempotencyStore()
+    store.begin('key', 'hash')
+    store.complete('key', 201, '{"id": 1}')
+    status, entry = store.begin('key', 'hash')
+    assert status == DONE
+    assert (entry['status_code'], entry['body']) == (201, '{"id": 1}')
+
+
+def test_released_key_can_be_retried():
+    store = MemoryIdempotencyStore()
+    store.begin('key', 'hash')
+    store.release('key')
+    assert store.begin('key', 'hash') == (NEW, None)
+
+
+def test_expired_entries_are_ignored():
+    store = MemoryIdempotencyStore(ttl=-1)
+    store.begin('key', 'hash')
+    store.complete('key', 200, '{}')
+    assert store.begin('key', 'hash') == (NEW, None)
+
+
+def test_lru_limit():
+    store = MemoryIdempotencyStore(max_entries=2)
+    for key in ('a', 'b', 'c'):
+        store.begin(key, 'hash')
+    assert store.begin('a', 'hash') == (NEW, None)
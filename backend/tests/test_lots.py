@@ -0,0 +1,55 @@
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+
+from services.lots import aggregate, allocate, receive_lots
+
+Lot = namedtuple('Lot', 'id lot_number expiry_date quantity_remaining')
+
+
+def test_aggregate_merges_by_ingredient():
+    quantities, errors = aggregate([
+        {'ingredient_id': 1, 'quantity': '1.5'},
+        {'ingredient_id': 1, 'quantity': 2},
+        {'ingredient_id': 2, 'quantity': 4}
+    ])
+    assert quantities == {1: Decimal('3.5'), 2: Decimal('4')}
+    assert errors == []
+
+
+def test_aggregate_reports_invalid_items():
+    _, errors = aggregate([
+        {'ingredient_id': 1, 'quantity': 'NaN'},
+        {'ingredient_id': 1, 'quantity': 0},
+        {'quantity': 1},
+        'not-an-item',
+        None
+    ])
+    assert [error['index'] for error in errors] == [0, 1, 2, 3, 4]
+
+
+def test_allocate_first_expiring_first_out():
+    lots = {1: [
+        Lot(10, 'A', date(2025, 3, 1), Decimal('2')),
+        Lot(11, 'B', date(2025, 3, 5), Decimal('5'))
+    ]}
+    allocations, uncovered, updates = allocate({1: Decimal('4'), 2: Decimal('1')}, lots)
+    assert [(pick['lot_id'], pick['quantity']) for pick in allocations[1]] == [(10, Decimal('2')), (11, Decimal('2'))]
+    assert updates == [{'lot_id': 10, 'remaining': Decimal('0')}, {'lot_id': 11, 'remaining': Decimal('3')}]
+    # 没有批次的数量来自启用批次管理之前的库存
+    assert uncovered == {1: Decimal('0'), 2: Decimal('1')}
+
+
+def test_receive_lots_reports_malformed_receipts():
+    # 有错误时在写库之前返回
+    results, errors = receive_lots([
+        [1, 2],
+        None,
+        {'ingredient_id': 1, 'quantity': 'inf'},
+        {'ingredient_id': 1, 'quantity': 1, 'expiry_date': 20250301},
+        {'ingredient_id': 1, 'quantity': 1, 'expiry_date': '2025-03-01'}
+    ])
+    assert results == []
+    assert [error['index'] for error in errors] == [0, 1, 2, 3]
+    assert errors[0]['error'] == '入库记录格式错误'
+    assert errors[3]['error'] == '保质期格式错误，应为YYYY-MM-DD'
@@ -0,0 +1,78 @@
+from datetime import date, time
+from decimal import Decimal
+
+import pytest
+
+from services.order_writer import validate_order_payload, build_order_rows, item_row, parse_order_fields
+
+
+def _payload(**overrides):
+    data = {
+        'customer_id': 1,
+        'order_type': 'meal',
+        'delivery_date': '2025-03-01',
+        'items': [{'item_type': 'dish', 'item_id': 3, 'quantity': 2, 'unit_price': 18.5}]
+    }
+    data.update(overrides)
+    return data
+
+
+def test_valid_payload():
+    assert validate_order_payload(_payload()) is None
+
+
+def test_missing_fields():
+    assert validate_order_payload({'customer_id': 1}) == '请提供客户ID、订单类型和订单项目'
+    assert validate_order_payload(['not', 'a', 'dict']) == '请提供客户ID、订单类型和订单项目'
+
+
+def test_items_must_be_list_of_dicts():
+    assert validate_order_payload(_payload(items='dish')) == '订单项目必须为列表'
+    assert validate_order_payload(_payload(items={'item_type': 'dish'})) == '订单项目必须为列表'
+    assert validate_order_payload(_payload(items=[1, 2])) == '订单项信息不完整'
+    assert validate_order_payload(_payload(items=[{'item_type': 'dish'}])) == '订单项信息不完整'
+
+
+def test_date_fields():
+    assert validate_order_payload(_payload(delivery_date='2025-13-01')) == 'delivery_date 格式错误'
+    assert validate_order_payload(_payload(start_time=930)) == 'start_time 格式错误'
+    assert validate_order_payload(_payload(start_time='09:30', end_time='11:00')) is None
+
+
+def test_item_row_uses_decimal():
+    row = item_row({'item_type': 'dish', 'item_id': 3, 'quantity': 3, 'unit_price': 12.1})
+    assert row['quantity'] == Decimal('3')
+    assert row['unit_price'] == Decimal('12.1')
+    assert row['subtotal'] == Decimal('36.30')
+    # 与从数据库读出的 Decimal 小计相加不会出错
+    assert Decimal('20.00') - Decimal('5.50') + row['subtotal'] == Decimal('50.80')
+
+
+def test_item_row_rejects_invalid_numbers():
+    for quantity in ('abc', 'NaN', 'Infinity', [1], {'value': 1}):
+        with pytest.raises(ValueError):
+            item_row({'item_type': 'dish', 'item_id': 3, 'quantity': quantity, 'unit_price': 10})
+
+
+def test_parse_order_fields_converts_dates():
+    fields = parse_order_fields(_payload(start_time='09:30', end_time='11:00', notes='少盐'))
+    assert fields['delivery_date'] == date(2025, 3, 1)
+    assert fields['start_time'] == time(9, 30)
+    assert fields['end_time'] == time(11, 0)
+    assert fields['notes'] == '少盐'
+    assert 'items' not in fields
+
+
+def test_build_order_rows_totals_items():
+    order_row, item_rows = build_order_rows(_payload(items=[
+        {'item_type': 'dish', 'item_id': 3, 'quantity': 2, 'unit_price': 18.5},
+        {'item_type': 'dish', 'item_id': 4, 'quantity': '1', 'unit_price': '6.25'}
+    ]))
+    assert [row['subtotal'] for row in item_rows] == [Decimal('37.00'), Decimal('6.25')]
+    assert order_row['total_amount'] == Decimal('43.25')
+    assert order_row['delivery_date'] == date(2025, 3, 1)
+
+
+def test_build_order_rows_rejects_string_quantity():
+    with pytest.raises(ValueError):
+        build_order_rows(_payload(items=[{'item_type': 'dish', 'item_id': 3, 'quantity': 'two', 'unit_price': 18.5}]))
@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from utils.pagination import encode_cursor, decode_cursor
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(datetime(2025, 3, 1, 12, 30), 42)) == (datetime(2025, 3, 1, 12, 30), 42)
+
+
+def test_cursor_with_null_sort_value():
+    # order_date 为空的订单也能生成可解析的游标
+    assert decode_cursor(encode_cursor(None, 7)) == (None, 7)
+
+
+def test_invalid_cursor():
+    assert decode_cursor('not-a-cursor') is None
@@ -0,0 +1,18 @@
+from services.restriction_index import split_restrictions, iter_bits, to_bits, RestrictionIndex
+
+
+def test_split_restrictions_separators_and_case():
+    assert split_restrictions('花生, 海鲜，牛肉、Pork;PORK；') == ['花生', '海鲜', '牛肉', 'pork']
+    # 空白不再拆分多词禁忌
+    assert split_restrictions('peanut oil,shellfish') == ['peanut oil', 'shellfish']
+    assert split_restrictions(None) == []
+
+
+def test_bits_round_trip():
+    assert list(iter_bits(to_bits([5, 1, 64]))) == [1, 5, 64]
+
+
+def test_known_bits_accepts_string_ids():
+    index = RestrictionIndex()
+    index._dish_names = {1: '宫保鸡丁', 3: '清蒸鱼'}
+    assert index.known_bits(['1', 3, '2']) == to_bits([1, 3])
@@ -0,0 +1,28 @@
+from decimal import Decimal
+
+import pytest
+
+from services.stock_ledger import parse_movement, StockError
+
+
+def test_parse_movement():
+    assert parse_movement({'ingredient_id': 5, 'type': 'out', 'quantity': '2.5'}) == (5, 'out', Decimal('2.5'))
+    assert parse_movement({'type': 'in', 'quantity': 3}) == (None, 'in', Decimal('3'))
+
+
+@pytest.mark.parametrize('movement, message', [
+    (None, '请提供数量和操作类型（in或out）'),
+    (['in', 1], '请提供数量和操作类型（in或out）'),
+    ({'quantity': 1}, '请提供数量和操作类型（in或out）'),
+    ({'type': 'move', 'quantity': 1}, '操作类型必须是in或out'),
+    ({'type': 'in', 'quantity': 'abc'}, '数量格式错误'),
+    ({'type': 'in', 'quantity': 'NaN'}, '数量格式错误'),
+    ({'type': 'out', 'quantity': 'Infinity'}, '数量格式错误'),
+    ({'type': 'out', 'quantity': 0}, '数量必须大于0'),
+    ({'type': 'out', 'quantity': -1}, '数量必须大于0'),
+])
+def test_parse_movement_rejects_invalid(movement, message):
+    with pytest.raises(StockError) as error:
+        parse_movement(movement)
+    assert error.value.message == message
+    assert error.value.status_code == 400
@@ -0,0 +1,43 @@
+from decimal import Decimal
+from types import SimpleNamespace
+
+from services.supplier_scores import compute_metrics
+
+
+def _row(**counters):
+    values = {
+        'delivered_orders': 0, 'timed_orders': 0, 'on_time_orders': 0,
+        'ordered_quantity': Decimal('0'), 'first_received_quantity': Decimal('0'),
+        'price_changes': 0, 'price_change_square_sum': Decimal('0')
+    }
+    values.update(counters)
+    return SimpleNamespace(**values)
+
+
+def test_no_data_has_no_score():
+    assert compute_metrics(_row()) == {'on_time_rate': None, 'fill_rate': None, 'price_stability': None, 'score': None}
+
+
+def test_all_metrics_weighted():
+    metrics = compute_metrics(_row(
+        timed_orders=4, on_time_orders=3,
+        ordered_quantity=Decimal('100'), first_received_quantity=Decimal('80'),
+        price_changes=2, price_change_square_sum=Decimal('200')
+    ))
+    assert metrics['on_time_rate'] == Decimal('0.7500')
+    assert metrics['fill_rate'] == Decimal('0.8000')
+    # 涨跌幅均方根 10%，价格稳定性 1 - 10 / 20
+    assert metrics['price_stability'] == Decimal('0.5000')
+    assert metrics['score'] == Decimal('71.50')
+
+
+def test_missing_metrics_are_left_out_of_the_weighting():
+    metrics = compute_metrics(_row(timed_orders=2, on_time_orders=2))
+    assert metrics['score'] == Decimal('100.00')
+    assert metrics['fill_rate'] is None
+
+
+def test_volatile_prices_floor_at_zero():
+    metrics = compute_metrics(_row(price_changes=1, price_change_square_sum=Decimal('1000000')))
+    assert metrics['price_stability'] == Decimal('0.0000')
+    assert metrics['score'] == Decimal('0.00')
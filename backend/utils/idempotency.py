@@ -0,0 +1,208 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# 处理中的记录超过该时间仍未完成，视为进程已中断，允许重试接管
+IN_PROGRESS_TIMEOUT = 60
+
+NEW, DONE, IN_PROGRESS = 'new', 'done', 'in_progress'
+
+
+class MemoryIdempotencyStore:
+    """进程内存储：按 LRU 限制条目数，并按 TTL 过期，适用于单进程部署"""
+
+    def __init__(self, max_entries=10000, ttl=86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry['expires_at'] > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key]
+
+    def begin(self, key, request_hash):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry['expires_at'] <= now:
+                entry = None
+            if entry and entry['status_code'] is None and now - entry['started_at'] > IN_PROGRESS_TIMEOUT:
+                entry = None
+            if entry:
+                self._entries.move_to_end(key)
+                return (DONE if entry['status_code'] is not None else IN_PROGRESS), entry
+            self._entries[key] = {
+                'request_hash': request_hash,
+                'status_code': None,
+                'body': None,
+                'started_at': now,
+                'expires_at': now + self.ttl
+            }
+            self._evict(now)
+            return NEW, None
+
+    def complete(self, key, status_code, body):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                entry['status_code'] = status_code
+                entry['body'] = body
+
+    def release(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class DatabaseIdempotencyStore:
+    """数据库存储：多个进程共享，使用独立连接，不影响业务事务"""
+
+    def __init__(self, db, ttl=86400):
+        from models.system import IdempotencyRecord
+        self.db = db
+        self.ttl = ttl
+        self.table = IdempotencyRecord.__table__
+        self._calls = 0
+
+    def _read(self, conn, key):
+        row = conn.execute(select(self.table).where(self.table.c.key == key)).first()
+        if not row:
+            return None
+        return {
+            'request_hash': row.request_hash,
+            'status_code': row.status_code,
+            'body': row.response_body,
+            'started_at': row.created_at,
+            'expires_at': row.expires_at
+        }
+
+    def _purge_expired(self):
+        # 每处理一定数量的请求，顺带清理一批过期记录
+        self._calls += 1
+        if self._calls % 100:
+            return
+        with self.db.engine.begin() as conn:
+            conn.execute(
+                delete(self.table)
+                .where(self.table.c.expires_at < datetime.utcnow())
+                .with_dialect_options(mysql_limit=1000)
+            )
+
+    def begin(self, key, request_hash):
+        self._purge_expired()
+        now = datetime.utcnow()
+        with self.db.engine.begin() as conn:
+            entry = self._read(conn, key)
+            stale = entry and (
+                entry['expires_at'] <= now
+                or (entry['status_code'] is None
+                    and now - entry['started_at'] > timedelta(seconds=IN_PROGRESS_TIMEOUT))
+            )
+            if stale:
+                conn.execute(delete(self.table).where(self.table.c.key == key))
+            elif entry:
+                return (DONE if entry['status_code'] is not None else IN_PROGRESS), entry
+
+        try:
+            with self.db.engine.begin() as conn:
+                conn.execute(insert(self.table).values(
+                    key=key,
+                    request_hash=request_hash,
+                    created_at=now,
+                    expires_at=now + timedelta(seconds=self.ttl)
+                ))
+            return NEW, None
+        except IntegrityError:
+            # 另一个进程同时插入了相同的键
+            with self.db.engine.begin() as conn:
+                entry = self._read(conn, key)
+            if not entry:
+                return NEW, None
+            return (DONE if entry['status_code'] is not None else IN_PROGRESS), entry
+
+    def complete(self, key, status_code, body):
+        with self.db.engine.begin() as conn:
+            conn.execute(
+                update(self.table)
+                .where(self.table.c.key == key)
+                .values(status_code=status_code, response_body=body)
+            )
+
+    def release(self, key):
+        with self.db.engine.begin() as conn:
+            conn.execute(delete(self.table).where(self.table.c.key == key))
+
+
+def get_store():
+    """按配置创建并缓存幂等存储（IDEMPOTENCY_BACKEND: memory/database）"""
+    store = current_app.extensions.get('idempotency_store')
+    if store is None:
+        ttl = current_app.config.get('IDEMPOTENCY_TTL', 86400)
+        if current_app.config.get('IDEMPOTENCY_BACKEND', 'memory') == 'database':
+            from app import db
+            store = DatabaseIdempotencyStore(db, ttl=ttl)
+        else:
+            store = MemoryIdempotencyStore(
+                max_entries=current_app.config.get('IDEMPOTENCY_MAX_ENTRIES', 10000),
+                ttl=ttl
+            )
+        current_app.extensions['idempotency_store'] = store
+    return store
+
+
+def idempotent(view):
+    """支持 Idempotency-Key 请求头：首次响应被保存，重试时直接重放，不再执行业务逻辑
+
+    需放在 jwt_required 之后，键按用户、请求方法和路径隔离。
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not idempotency_key:
+            return view(*args, **kwargs)
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            return jsonify({'error': '幂等键过长'}), 400
+
+        scope = f'{get_jwt_identity()}:{request.method}:{request.path}:{idempotency_key}'
+        key = hashlib.sha256(scope.encode('utf-8')).hexdigest()
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+
+        store = get_store()
+        state, entry = store.begin(key, request_hash)
+        if state != NEW and entry['request_hash'] != request_hash:
+            return jsonify({'error': '幂等键已用于其他请求'}), 422
+        if state == IN_PROGRESS:
+            return jsonify({'error': '相同幂等键的请求正在处理中'}), 409
+        if state == DONE:
+            response = current_app.response_class(
+                entry['body'], status=entry['status_code'], mimetype='application/json'
+            )
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            store.release(key)
+            raise
+
+        # 服务端错误不保存，允许客户端重试
+        if response.status_code < 500:
+            store.complete(key, response.status_code, response.get_data(as_text=True))
+        else:
+            store.release(key)
+        return response
+
+    return wrapper
@@ -0,0 +1,60 @@
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(sort_value, row_id):
+    """将 (排序值, ID) 编码为不透明的游标字符串，排序值为空时编码为空字符串"""
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    elif sort_value is None:
+        sort_value = ''
+    raw = f'{sort_value}|{row_id}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析游标字符串，返回 (排序时间或 None, ID)，格式错误时返回 None"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        sort_value, row_id = raw.rsplit('|', 1)
+        return (datetime.fromisoformat(sort_value) if sort_value else None), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_filter(query, sort_column, id_column, cursor):
+    """按 (sort_column, id_column) 升序取游标之后的记录
+
+    MySQL 升序排序时 NULL 排在最前：游标位于 NULL 段时，之后是同为 NULL 且 ID 更大的记录和全部非 NULL 记录。
+    """
+    sort_value, row_id = cursor
+    if sort_value is None:
+        return query.filter(or_(
+            sort_column.isnot(None),
+            and_(sort_column.is_(None), id_column > row_id)
+        ))
+    return query.filter(or_(
+        sort_column > sort_value,
+        and_(sort_column == sort_value, id_column > row_id)
+    ))
+
+
+def iter_keyset_chunks(query, sort_column, id_column, chunk_size, limit=None):
+    """按键集逐块读取已排序的查询，每块是独立的查询，块之间可以执行其他查询"""
+    cursor = None
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        page_query = query if cursor is None else keyset_filter(query, sort_column, id_column, cursor)
+        rows = page_query.limit(size).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < size:
+            return
+        if remaining is not None:
+            remaining -= len(rows)
+        last = rows[-1]
+        cursor = (getattr(last, sort_column.key), getattr(last, id_column.key))
@@ -0,0 +1,18 @@
+from flask import Response, json, request, stream_with_context
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def wants_ndjson():
+    """客户端是否通过 Accept 头请求 NDJSON 流式响应"""
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+
+def ndjson_response(rows):
+    """将字典迭代器逐行输出为 NDJSON，整个过程中保持请求上下文"""
+    def generate():
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)